@@ -1,13 +1,16 @@
 import asyncio
 import nest_asyncio
+from collections import deque
+from dataclasses import dataclass
 from dotenv import load_dotenv
 from typing import List, Tuple, Optional
 
 import streamlit as st
-from ragbot.settings import build_settings
+from ragbot.resources import DEFAULT_CORPUS, UnknownCorpusError, get_index_registry, get_shared_resources
 from llama_index.core.settings import Settings
 from llama_index.core.schema import NodeWithScore
-from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from ragbot.memory import ConversationMemory
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, ANSWER_KEY
 from ragbot.workflows.rag_workflow import RAGWorkflow
 
 # Constants
@@ -17,29 +20,60 @@ LAYOUT = "centered"
 INPUT_PLACEHOLDER = "Enter your question here..."
 THINKING_MESSAGE = "Thinking..."
 MAX_PROMPT_LENGTH = 1000
+# Turns kept per session, the oldest are dropped first. The conversation
+# memory keeps its own summary of them for the LLM.
+MAX_HISTORY_TURNS = 100
+# Turns rendered per history page
+TURNS_PER_PAGE = 10
 
 # Initialize async
 nest_asyncio.apply()
 load_dotenv()
 
+@dataclass(frozen=True, slots=True)
+class SourceRecord:
+    """A retrieved source; its answer is looked up only when shown."""
+
+    node_id: str
+    question: str
+    answer_id: Optional[str]
+    score: Optional[float]
+
+@dataclass(frozen=True, slots=True)
+class ChatTurn:
+    """A question, its answer and the corpus and sources it was answered from."""
+
+    turn_id: int
+    question: str
+    answer: str
+    corpus: str
+    sources: Tuple[SourceRecord, ...]
+
 def initialize_session_state() -> None:
     """Initialize all session state variables."""
-    # Build settings first if not already initialized
-    if not st.session_state.get("settings_initialized", False):
-        build_settings()
-        st.session_state["settings_initialized"] = True
-
+    # Models and index are loaded once per process and shared by all sessions.
+    # They load in the background while the page renders; the first question
+    # waits for them if they aren't ready yet. Pick up a newly published index
+    # from ingest.py if there is one.
+    resources = get_shared_resources()
+    resources.warm_up()
+    get_index_registry().reload_if_stale()
+
+    # Factories, so nothing is constructed for keys that already exist
     initial_states = {
-        "container": st.container(),
-        "rag_workflow": RAGWorkflow(),
-        "messages": [],
-        "sources_history": [],
-        "is_loading": False
+        "container": st.container,
+        "rag_workflow": lambda: RAGWorkflow(resources=resources),
+        "history": lambda: deque(maxlen=MAX_HISTORY_TURNS),
+        "turn_count": lambda: 0,
+        # What the workflow remembers of the chat: recent turns and a summary
+        "memory": ConversationMemory,
+        "is_loading": lambda: False,
+        "corpus": lambda: DEFAULT_CORPUS,
     }
     
-    for key, value in initial_states.items():
+    for key, factory in initial_states.items():
         if key not in st.session_state:
-            st.session_state[key] = value
+            st.session_state[key] = factory()
 
 def setup_page_config() -> None:
     """Configure the Streamlit page settings."""
@@ -52,6 +86,16 @@ def setup_page_config() -> None:
     )
     st.title(PAGE_TITLE)
 
+def select_corpus() -> None:
+    """Let the user pick the FAQ corpus, if more than one is indexed."""
+    corpora = get_index_registry().corpora()
+    if len(corpora) > 1:
+        st.session_state["corpus"] = st.sidebar.selectbox(
+            "FAQ corpus",
+            corpora,
+            index=corpora.index(st.session_state["corpus"]) if st.session_state["corpus"] in corpora else 0,
+        )
+
 def validate_prompt(prompt: str) -> bool:
     """Validate user input prompt."""
     if not prompt.strip():
@@ -66,70 +110,87 @@ def set_loading_state(loading: bool) -> None:
     """Set the loading state of the application."""
     st.session_state["is_loading"] = loading
 
-def display_source(source: NodeWithScore, index: int) -> None:
-    """Display a single source with its details."""
-    with st.expander(f"Source {index}"):
-        st.markdown(f"**Text:** {source.text}")
-        st.markdown(f"**Answer:** {source.metadata.get('answer', 'No answer available')}")
-        if score := getattr(source, 'score', None):
-            st.markdown(f"**Relevance Score:** {score:.2f}")
+def source_record(source: NodeWithScore) -> SourceRecord:
+    """Keep what is needed to show ``source`` again, not the node itself."""
+    return SourceRecord(
+        node_id=source.node.node_id,
+        question=source.text,
+        answer_id=source.metadata.get(ANSWER_ID_KEY),
+        score=source.score,
+    )
 
-def display_source(source: NodeWithScore, index: int) -> None:
+def resolve_answer(record: SourceRecord, corpus: str) -> Optional[str]:
+    """Look up the answer of a source in the corpus's answer store, or its node in the docstore."""
+    try:
+        resources = get_index_registry().get(corpus)
+    except UnknownCorpusError:
+        return None
+    answer = resources.answer_store.get(record.answer_id) if record.answer_id else None
+    if answer is None:
+        # Indexes built before the answer store keep the answer on the node
+        node = resources.storage_context.docstore.get_node(record.node_id, raise_error=False)
+        answer = node.metadata.get(ANSWER_KEY) if node is not None else None
+    return answer
+
+def display_source(record: SourceRecord, corpus: str, index: int) -> None:
     """Display a single source with its details."""
     with st.expander(f"Source {index}"):
-        st.markdown(f"**Text:** {source.text}")
-        st.markdown(f"**Answer:** {source.metadata.get('answer', 'No answer available')}")
-        if score := getattr(source, 'score', None):
-            st.markdown(f"**Relevance Score:** {score:.2f}")
-
-def display_messages() -> None:
-    """Display all messages in the chat history with their sources."""
+        st.markdown(f"**Text:** {record.question}")
+        st.markdown(f"**Answer:** {resolve_answer(record, corpus) or 'No answer available'}")
+        if record.score is not None:
+            st.markdown(f"**Relevance Score:** {record.score:.2f}")
+
+@st.fragment
+def display_sources(turn: ChatTurn) -> None:
+    """Sources of one turn behind a toggle; toggling reruns only this turn."""
+    if st.toggle("📚 Show Sources", key=f"show_sources_{turn.turn_id}"):
+        st.markdown("**Retrieved Sources:**")
+        for s_idx, record in enumerate(turn.sources, 1):
+            display_source(record, turn.corpus, s_idx)
+
+def display_turn(turn: ChatTurn) -> None:
+    """Display one question and its answer with their sources."""
+    with st.chat_message("user"):
+        st.markdown(turn.question)
+    with st.chat_message("assistant"):
+        st.markdown(turn.answer)
+    if turn.sources:
+        display_sources(turn)
+
+def select_history_page() -> List[ChatTurn]:
+    """Turns of the history page picked in the sidebar; page 1 is the latest."""
+    turns = list(st.session_state.history)
+    pages = max(1, -(-len(turns) // TURNS_PER_PAGE))
+    page = 1
+    if pages > 1:
+        page = st.sidebar.number_input("History page", min_value=1, max_value=pages, value=1, step=1)
+    end = len(turns) - (page - 1) * TURNS_PER_PAGE
+    return turns[max(0, end - TURNS_PER_PAGE):end]
+
+def display_history() -> None:
+    """Display one page of the chat history with its sources."""
     try:
-        
-        for idx, message in enumerate(st.session_state.messages):
-            with st.chat_message(message.role):
-                st.markdown(message.content)
-                
-            if message.role == MessageRole.ASSISTANT:
-                source_idx = idx // 2
-                if (source_idx < len(st.session_state.sources_history) and 
-                        st.session_state.sources_history[source_idx]):  # Check if sources exist and not empty
-                    sources = st.session_state.sources_history[source_idx]
-                    
-                    # Store source visibility state in session_state
-                    source_key = f"show_sources_{idx}"
-                    if source_key not in st.session_state:
-                        st.session_state[source_key] = False
-                        
-                    if st.button("📚 Show Sources", key=f"button_{idx}"):
-                        st.session_state[source_key] = not st.session_state[source_key]
-                    
-                    if st.session_state[source_key]:
-                        st.markdown("**Retrieved Sources:**")
-                        for s_idx, src in enumerate(sources, 1):
-                            display_source(src, s_idx)
+        for turn in select_history_page():
+            display_turn(turn)
     except Exception as e:
         st.error(f"Error displaying messages: {str(e)}")
 
-async def add_message(message: ChatMessage) -> None:
-    """Add a new message to the chat history."""
-    try:
-        st.session_state.messages.append(message)
-    except Exception as e:
-        st.error(f"Error adding message: {str(e)}")
-
-async def add_sources(sources: List[NodeWithScore]) -> None:
-    """Add new sources to the sources history."""
-    try:
-        st.session_state.sources_history.append(sources)
-    except Exception as e:
-        st.error(f"Error adding sources: {str(e)}")
+def add_turn(question: str, answer: str, sources: List[NodeWithScore]) -> ChatTurn:
+    """Add a finished turn to the history, dropping the oldest past ``MAX_HISTORY_TURNS``."""
+    turn = ChatTurn(
+        turn_id=st.session_state.turn_count,
+        question=question,
+        answer=answer,
+        corpus=st.session_state["corpus"],
+        sources=tuple(source_record(source) for source in sources),
+    )
+    st.session_state.turn_count += 1
+    st.session_state.history.append(turn)
+    return turn
 
 async def process_user_input(prompt: str) -> None:
     """Process user input and generate response."""
     try:
-        await add_message(ChatMessage(role=MessageRole.USER, content=prompt))
-        
         with st.chat_message("user"):
             st.markdown(prompt)
 
@@ -137,27 +198,26 @@ async def process_user_input(prompt: str) -> None:
             with st.spinner(THINKING_MESSAGE):
                 stream, sources = await st.session_state["rag_workflow"].run(
                     question=prompt,
+                    corpus=st.session_state["corpus"],
+                    memory=st.session_state["memory"],
                 )
                 response = st.write_stream((token.delta async for token in stream))
 
-        await add_message(ChatMessage(role=MessageRole.ASSISTANT, content=str(response)))
-        await add_sources(sources)
-        st.rerun()  # Refresh the page to display new messages and sources
-        
+        # Shown in place rather than by rerunning the script, which would
+        # render the whole page a second time
+        turn = add_turn(prompt, str(response), sources)
+        if turn.sources:
+            display_sources(turn)
+
     except Exception as e:
         st.error(f"Error processing input: {str(e)}")
 
 async def main() -> None:
     """Main application loop."""
     try:
-        # Initialize settings if not already done
-        if st.session_state.get("settings_initialized", False) is False:
-            st.session_state["settings_initialized"] = True
-            build_settings()
-
         # Display existing messages
-        if st.session_state.messages:
-            display_messages()
+        if st.session_state.history:
+            display_history()
 
         # Handle new user input
         if prompt := st.chat_input(INPUT_PLACEHOLDER):
@@ -175,6 +235,7 @@ async def main() -> None:
 if __name__ == "__main__":
     initialize_session_state()
     setup_page_config()
+    select_corpus()
     asyncio.run(main())
 
 
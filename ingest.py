@@ -1,48 +1,261 @@
+import argparse
+import shutil
+from contextlib import nullcontext
+from itertools import islice
+
 from dotenv import load_dotenv
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
+from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, load_indices_from_storage
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import MetadataMode
+from llama_index.core.settings import Settings
+from tqdm import tqdm
+from ragbot.embeddings.batch_embedding import (
+    EmbeddingStats,
+    build_embedding_pool,
+    concatenate_embedding_files,
+    embed_texts_to_file,
+)
+from ragbot.embeddings.huggingface_embeddings import EMBED_BATCH_SIZE
 from ragbot.readers.data_faq_reader import DataFAQReader
+from ragbot.resources.index_registry import DEFAULT_CORPUS, corpus_dir
 from ragbot.settings import build_settings
-from ragbot.storage import build_storage_context, PERSIST_DIR
+from ragbot.storage import (
+    AnswerStore,
+    IVFVectorStore,
+    LexicalIndex,
+    PERSIST_DIR,
+    build_storage_context,
+    load_or_create_answer_store,
+    load_or_create_lexical_index,
+)
+from ragbot.storage.versioning import create_staging_dir, publish_storage
 
 DATA_DIR = "./data"
+DATA_EXTS = [".json", ".jsonl"]
+# Documents parsed, split and embedded per step. Bounds peak memory
+# independently of the size of the FAQ files.
+INGEST_BATCH_DOCS = 4096
+EMBEDDINGS_SCRATCH_FNAME = "ingest_embeddings.npy"
 
-def load_documents():
-    """Load documents from the input directory using the DataFAQReader for JSON files."""
-    print(f"Loading documents from {DATA_DIR}...")
+def iter_documents(data_dir=DATA_DIR):
+    """Stream documents from the input directory, one file item at a time."""
+    print(f"Loading documents from {data_dir}...")
 
-    file_extractor = {
-        ".json": DataFAQReader()
-    }
-    reader = SimpleDirectoryReader(
-        input_dir=DATA_DIR,
-        file_extractor=file_extractor
-    )
-    documents = reader.load_data(show_progress=True)
-    return documents
+    reader = SimpleDirectoryReader(input_dir=data_dir, required_exts=DATA_EXTS)
+    faq_reader = DataFAQReader()
+    seen = set()
+    for file in reader.input_files:
+        # Of the file metadata only the path is kept, it is copied to every node
+        for doc in faq_reader.lazy_load_data(file, extra_info={"file_path": str(file)}):
+            # Doc ids are content hashes, so repeated entries collapse into one
+            if doc.doc_id in seen:
+                continue
+            seen.add(doc.doc_id)
+            yield doc
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def add_documents(
+    index,
+    lexical_index,
+    answer_store,
+    documents,
+    work_dir,
+    batch_size=EMBED_BATCH_SIZE,
+    num_workers=1,
+    docs_per_batch=INGEST_BATCH_DOCS,
+):
+    """Split, embed and add documents to the vector and lexical indexes in bounded batches.
+
+    Answers are moved from the nodes into ``answer_store`` before they are
+    added to the docstore.
+
+    Each batch is embedded into its own scratch file; the files are joined
+    into one memory-mapped matrix at the end, so vectors never pile up in
+    Python memory. Returns the number of documents added.
+    """
+    node_ids, ref_doc_ids, parts = [], [], []
+    stats = EmbeddingStats(0, 0, 0.0)
+    num_docs = 0
+    pool = build_embedding_pool(num_workers, batch_size) if num_workers > 1 else nullcontext()
+    with pool as executor, tqdm(desc="Embedding") as progress:
+        for documents_batch in batched(documents, docs_per_batch):
+            num_docs += len(documents_batch)
+            for doc in documents_batch:
+                index.docstore.set_document_hash(doc.doc_id, doc.hash)
+            nodes = run_transformations(documents_batch, Settings.transformations)
+            answer_store.intern(nodes)
+
+            part = work_dir / f"ingest_embeddings-{len(parts)}.npy"
+            _, batch_stats = embed_texts_to_file(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes],
+                part,
+                embed_model=Settings.embed_model,
+                batch_size=batch_size,
+                num_workers=num_workers,
+                on_batch=progress.update,
+                executor=executor,
+            )
+            stats += batch_stats
+            if batch_stats.num_texts:
+                parts.append(part)
+
+            node_ids.extend(node.node_id for node in nodes)
+            ref_doc_ids.extend(node.ref_doc_id or "None" for node in nodes)
+            for node in nodes:
+                index.index_struct.add_node(node, text_id=node.node_id)
+            index.docstore.add_documents(nodes, allow_update=True)
+            lexical_index.add_nodes(nodes)
+    print(stats)
+    if num_workers <= 1 and hasattr(Settings.embed_model, "stats"):
+        cache_stats = Settings.embed_model.stats()
+        print(
+            f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%} hit rate)"
+        )
 
-def build_index(documents):
+    if node_ids:
+        embeddings = concatenate_embedding_files(parts, work_dir / EMBEDDINGS_SCRATCH_FNAME)
+        for part in parts:
+            part.unlink()
+        index.vector_store.add_embeddings(node_ids, ref_doc_ids, embeddings)
+    index.storage_context.index_store.add_index_struct(index.index_struct)
+    return num_docs
+
+def persist(storage_context, lexical_index, answer_store, persist_dir):
+    vector_store = storage_context.vector_store
+    # Incremental runs assign new rows to the existing centroids; --full retrains
+    if isinstance(vector_store, IVFVectorStore) and not vector_store.is_trained:
+        print("Training IVF index...")
+        vector_store.train()
+        print(f"IVF index: {vector_store.nlist} lists")
+    storage_context.persist(persist_dir=str(persist_dir))
+    lexical_index.persist(persist_dir)
+    answer_store.persist(persist_dir)
+    (persist_dir / EMBEDDINGS_SCRATCH_FNAME).unlink(missing_ok=True)
+
+def build_index(documents, persist_dir=PERSIST_DIR, batch_size=EMBED_BATCH_SIZE, num_workers=1):
     """Build and persist a VectorStoreIndex from the given documents."""
     print("Building index from documents...")
-    
-    storage_context = build_storage_context()
-    index = VectorStoreIndex.from_documents(
-        documents=documents,
-        storage_context= storage_context,
-        show_progress=True
-    )
-    storage_context.persist()
+
+    storage_context = build_storage_context(persist_dir)
+    index = VectorStoreIndex(nodes=[], storage_context=storage_context)
+    lexical_index = LexicalIndex()
+    answer_store = AnswerStore()
+    add_documents(
+        index, lexical_index, answer_store, documents, persist_dir,
+        batch_size=batch_size, num_workers=num_workers,
+    )
+    persist(storage_context, lexical_index, answer_store, persist_dir)
     return index
 
+def has_index(persist_dir=PERSIST_DIR):
+    """Check whether persist_dir holds a previously persisted index."""
+    return (persist_dir / "index_store.json").exists()
+
+def update_index(documents, source_dir, persist_dir, batch_size=EMBED_BATCH_SIZE, num_workers=1):
+    """Load the index in source_dir, embed only added documents, drop removed ones,
+    and persist the result to persist_dir. Returns False if nothing changed."""
+    storage_context = build_storage_context(source_dir)
+    index = load_indices_from_storage(storage_context=storage_context)[0]
+    docstore = storage_context.docstore
+    lexical_index = load_or_create_lexical_index(source_dir, docstore)
+    answer_store = load_or_create_answer_store(source_dir)
+
+    existing = docstore.get_all_ref_doc_info() or {}
+    current = set()
+
+    def added_documents():
+        for doc in documents:
+            current.add(doc.doc_id)
+            if doc.doc_id not in existing:
+                yield doc
+
+    num_added = add_documents(
+        index, lexical_index, answer_store, added_documents(), persist_dir,
+        batch_size=batch_size, num_workers=num_workers,
+    )
+    removed = [doc_id for doc_id in existing if doc_id not in current]
+    print(
+        f"{num_added} added, {len(removed)} removed, "
+        f"{len(current) - num_added} unchanged documents"
+    )
+    if not num_added and not removed:
+        return False
+
+    if removed:
+        node_ids = [node_id for doc_id in removed for node_id in existing[doc_id].node_ids]
+        answer_store.release(docstore.get_nodes(node_ids))
+        index.delete_nodes(node_ids, delete_from_docstore=True)
+        lexical_index.delete(node_ids)
+        for doc_id in removed:
+            docstore.delete_ref_doc(doc_id, raise_error=False)
+
+    persist(storage_context, lexical_index, answer_store, persist_dir)
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the RAGBot index.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-embed every document instead of only the added or changed ones.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Number of texts embedded per forward pass.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Embedding worker processes; use more than 1 on CPU-only hosts.",
+    )
+    parser.add_argument(
+        "--corpus",
+        default=DEFAULT_CORPUS,
+        help="Corpus to build; any but the default is stored under ./corpora/<corpus>.",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=DATA_DIR,
+        help="Directory of the corpus's FAQ files.",
+    )
+    return parser.parse_args()
+
 def main():
-    if PERSIST_DIR.exists():
-        import shutil
-        print(f"Removing existing persistence directory: {PERSIST_DIR}")
-        shutil.rmtree(PERSIST_DIR)
+    args = parse_args()
 
     load_dotenv()
+    persist_dir = PERSIST_DIR if args.corpus == DEFAULT_CORPUS else corpus_dir(args.corpus)
     build_settings()
-    documents = load_documents()
-    build_index(documents)
+    documents = iter_documents(args.data_dir)
+
+    # Build the next version next to the live index and swap it in at the
+    # end, so a running app never sees a half-written index.
+    staging_dir = create_staging_dir(persist_dir)
+    try:
+        embed_kwargs = {"batch_size": args.batch_size, "num_workers": args.workers}
+        if args.full or not has_index(persist_dir):
+            build_index(documents, persist_dir=staging_dir, **embed_kwargs)
+        elif not update_index(
+            documents, source_dir=persist_dir, persist_dir=staging_dir, **embed_kwargs
+        ):
+            print("Index is already up to date")
+            shutil.rmtree(staging_dir)
+            return
+        version = publish_storage(staging_dir, persist_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    # Running apps reload the index when they see a new version
+    print(f"Published index version {version}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
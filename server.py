@@ -0,0 +1,16 @@
+from dotenv import load_dotenv
+
+from ragbot.server import build_asgi_app
+
+HOST = "0.0.0.0"
+PORT = 8000
+
+load_dotenv()
+
+# Serve with: uvicorn server:app --host 0.0.0.0 --port 8000
+app = build_asgi_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=HOST, port=PORT)
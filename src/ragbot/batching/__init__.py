@@ -0,0 +1 @@
+from ragbot.batching.micro_batcher import BatchQueueFullError, MicroBatcher
\ No newline at end of file
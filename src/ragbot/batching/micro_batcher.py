@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Requests flushed together at most, and how long the first one waits for company
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 2.0
+# Requests queued behind the batch in progress before new ones are turned away
+DEFAULT_MAX_QUEUE_SIZE = 1024
+# An idle worker exits after this long, so a batcher nobody uses any more
+# (e.g. of an evicted index) can be garbage collected
+WORKER_IDLE_TIMEOUT_SECONDS = 60.0
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class BatchQueueFullError(RuntimeError):
+    """Raised when a request would have to queue behind too many others."""
+
+
+class BatchMetrics:
+    """Thread-safe counters for a ``MicroBatcher``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.errors = 0
+        self.queue_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_queue_depth = 0
+        self.size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def record_batch(self, size: int, queue_wait: float, run: float, failed: bool) -> None:
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), -1)
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.errors += failed
+            self.queue_wait_seconds += queue_wait
+            self.run_seconds += run
+            self.size_counts[bucket] += 1
+
+    def record_depth(self, depth: int) -> None:
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def record_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            labels = [f"le_{bound}" for bound in BATCH_SIZE_BUCKETS] + ["inf"]
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "mean_queue_wait_ms": 1000 * self.queue_wait_seconds / self.items if self.items else 0.0,
+                "mean_batch_ms": 1000 * self.run_seconds / self.batches if self.batches else 0.0,
+                "max_queue_depth": self.max_queue_depth,
+                "batch_sizes": dict(zip(labels, self.size_counts)),
+            }
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces concurrent async requests into calls of a batch function.
+
+    The first request of a batch waits up to ``max_wait_ms`` for others to
+    arrive, then up to ``max_batch_size`` requests are passed to
+    ``batch_fn`` in one call, which runs in a worker thread and must return
+    one result per request, in order. Requests that arrive while a batch
+    runs form the next one, so batches grow with load. Once
+    ``max_queue_size`` requests are queued, ``submit`` fails fast with
+    ``BatchQueueFullError``.
+
+    The queue belongs to the event loop of the first ``submit``; a batcher
+    used from a new loop (e.g. after ``asyncio.run`` returned) starts over.
+    The worker stops after ``WORKER_IDLE_TIMEOUT_SECONDS`` without requests
+    and is restarted by the next ``submit``.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], List[R]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.metrics = BatchMetrics()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.metrics.stats(), "queue_depth": self.queue_depth}
+
+    async def submit(self, item: T) -> R:
+        """Queue ``item`` for the next batch and wait for its result."""
+        queue = self._ensure_worker()
+        if queue.qsize() >= self.max_queue_size:
+            self.metrics.record_rejected()
+            raise BatchQueueFullError(f"{queue.qsize()} requests already queued")
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((item, future, time.perf_counter()))
+        self.metrics.record_depth(queue.qsize())
+        return await future
+
+    async def aclose(self) -> None:
+        """Stop the worker; requests still queued or in the running batch are cancelled."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        self._loop = self._queue = self._worker = None
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def _next_batch(self, queue: asyncio.Queue) -> Optional[List[Tuple[T, asyncio.Future, float]]]:
+        """The next batch, or None once the queue stayed empty for the idle timeout."""
+        try:
+            first = await asyncio.wait_for(queue.get(), WORKER_IDLE_TIMEOUT_SECONDS)
+        except TimeoutError:
+            # A request queued while the wait was being cancelled keeps us running
+            if queue.empty():
+                return None
+            first = queue.get_nowait()
+        batch = [first]
+        if queue.qsize() < self.max_batch_size - 1 and self.max_wait > 0:
+            await asyncio.sleep(self.max_wait)
+        while len(batch) < self.max_batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        # Callers that gave up while queued don't need a result
+        return [entry for entry in batch if not entry[1].done()]
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = await self._next_batch(queue)
+            if batch is None:
+                return
+            if not batch:
+                continue
+            start = time.perf_counter()
+            queue_wait = sum(start - queued_at for _, _, queued_at in batch)
+            try:
+                results = await asyncio.to_thread(self.batch_fn, [item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+            except asyncio.CancelledError:
+                # Stopped by aclose: the batch in progress is cancelled too
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.metrics.record_batch(len(batch), queue_wait, time.perf_counter() - start, failed=True)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch), queue_wait, time.perf_counter() - start, failed=False)
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1 @@
+from ragbot.cache.query_cache import QueryCache, CachedResponse
\ No newline at end of file
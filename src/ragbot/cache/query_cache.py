@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.schema import NodeWithScore
+
+from ragbot.transformations import clean_text
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL_SECONDS = 60 * 60
+# Cosine distance (1 - similarity) under which an earlier answer is reused
+DEFAULT_SEMANTIC_MAX_DISTANCE = 0.05
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A finished answer stream and the sources it was generated from."""
+
+    deltas: Tuple[str, ...]
+    sources: List[NodeWithScore]
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.deltas)
+
+    def replay(self) -> Tuple[AsyncGenerator[ChatResponse, None], List[NodeWithScore]]:
+        """Return a fresh ``(stream, sources)`` pair, same shape as an LLM answer."""
+        return replay_stream(self.deltas), self.sources
+
+
+async def replay_stream(deltas: Sequence[str]) -> AsyncGenerator[ChatResponse, None]:
+    """Stream stored deltas back as ``ChatResponse`` chunks."""
+    content = ""
+    for delta in deltas:
+        content += delta
+        yield ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=content),
+            delta=delta,
+        )
+
+
+class QueryCache:
+    """
+    Two-tier answer cache in front of the RAG workflow.
+
+    Tier one is an LRU with TTL keyed on the question normalized by
+    ``clean_text``. Tier two holds the query embeddings of the same entries
+    and returns an earlier answer when a new query embedding is within
+    ``semantic_max_distance`` cosine distance of one of them.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        semantic_max_distance: float = DEFAULT_SEMANTIC_MAX_DISTANCE,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.semantic_max_distance = semantic_max_distance
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._generation = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str) -> str:
+        return clean_text(question)
+
+    def get(self, question: str) -> Optional[CachedResponse]:
+        """Tier one lookup on the normalized question."""
+        key = self.key(question)
+        with self._lock:
+            entry = self._get_fresh(key)
+            if entry is not None:
+                self.exact_hits += 1
+            return entry
+
+    def get_semantic(self, query_embedding: Sequence[float]) -> Optional[CachedResponse]:
+        """
+        Tier two lookup on the query embedding, after ``get`` missed.
+
+        Counts a miss if nothing is close, so every lookup that misses both
+        tiers is counted once.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            matrix = self._semantic_matrix()
+            if matrix is not None:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if 1.0 - float(scores[best]) <= self.semantic_max_distance:
+                    entry = self._get_fresh(self._matrix_keys[best])
+                    if entry is not None:
+                        self.semantic_hits += 1
+                        return entry
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        question: str,
+        response: CachedResponse,
+        query_embedding: Optional[Sequence[float]] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        """Store an answer. Without ``query_embedding`` only tier one can hit it.
+
+        ``generation`` is the value of ``self.generation`` when the answer was
+        started; answers that began before the last ``clear`` are dropped.
+        """
+        key = self.key(question)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            if query_embedding is not None:
+                embedding = np.asarray(query_embedding, dtype=np.float32)
+                self._embeddings[key] = embedding / (np.linalg.norm(embedding) or 1.0)
+                self._matrix = None
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._drop_embedding(evicted)
+
+    def record(
+        self,
+        question: str,
+        stream: AsyncGenerator[ChatResponse, None],
+        sources: List[NodeWithScore],
+        query_embedding: Optional[Sequence[float]] = None,
+    ) -> AsyncGenerator[ChatResponse, None]:
+        """Wrap an LLM stream so the answer is cached once it was fully consumed."""
+        generation = self.generation
+
+        async def _recording_stream():
+            deltas = []
+            async for response in stream:
+                deltas.append(response.delta or "")
+                yield response
+            self.put(
+                question,
+                CachedResponse(deltas=tuple(deltas), sources=sources),
+                query_embedding=query_embedding,
+                generation=generation,
+            )
+
+        return _recording_stream()
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after the index was rebuilt."""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+            self._matrix = None
+            self._matrix_keys = []
+            self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters; ``misses`` counts queries that missed both tiers."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+    def _get_fresh(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            self._drop_embedding(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop_embedding(self, key: str) -> None:
+        if self._embeddings.pop(key, None) is not None:
+            self._matrix = None
+
+    def _semantic_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._embeddings:
+            self._matrix_keys = list(self._embeddings)
+            self._matrix = np.stack([self._embeddings[k] for k in self._matrix_keys])
+        return self._matrix
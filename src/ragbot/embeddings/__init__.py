@@ -1 +1,3 @@
-from ragbot.embeddings.huggingface_embeddings import build_huggingface_embeddings
\ No newline at end of file
+from ragbot.embeddings.huggingface_embeddings import build_huggingface_embeddings
+from ragbot.embeddings.embedding_cache import build_cached_embeddings
+from ragbot.embeddings.batched_embedding import build_batched_embeddings
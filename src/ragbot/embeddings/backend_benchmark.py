@@ -0,0 +1,118 @@
+"""
+Compare embedding backends against the fp32 reference.
+
+Reports the cosine drift of each backend's vectors from the fp32 vectors
+for the same texts, and the per-query embedding latency. Run with:
+
+    python -m ragbot.embeddings.backend_benchmark --backends torch torch-int8 onnx-int8
+"""
+import argparse
+import gc
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from ragbot.embeddings.huggingface_embeddings import (
+    EMBED_BACKENDS,
+    build_huggingface_embeddings,
+)
+
+REFERENCE_BACKEND = "torch"
+FAQ_DATA_PATH = "./data/faq_data.json"
+
+
+@dataclass
+class BackendReport:
+    backend: str
+    load_seconds: float
+    mean_cosine: float
+    min_cosine: float
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+
+
+def load_faq_questions(path: str = FAQ_DATA_PATH) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [question for item in json.load(f) for question in item.get("questions", [])]
+
+
+def embed_normalized(embed_model: BaseEmbedding, texts: Sequence[str]) -> np.ndarray:
+    vectors = np.asarray(embed_model.get_text_embedding_batch(list(texts)), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def query_latencies(embed_model: BaseEmbedding, queries: Sequence[str], warmup: int = 3) -> np.ndarray:
+    """Wall time in ms of embedding each query on its own, as at query time."""
+    for query in queries[:warmup]:
+        embed_model.get_query_embedding(query)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embed_model.get_query_embedding(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.asarray(latencies)
+
+
+def compare_backends(backends: Sequence[str], texts: Sequence[str]) -> List[BackendReport]:
+    """Embed ``texts`` with every backend and compare against the fp32 reference."""
+    reference = None
+    reports = []
+    for backend in [REFERENCE_BACKEND, *[b for b in backends if b != REFERENCE_BACKEND]]:
+        start = time.perf_counter()
+        embed_model = build_huggingface_embeddings(backend=backend)
+        load_seconds = time.perf_counter() - start
+
+        vectors = embed_normalized(embed_model, texts)
+        if reference is None:
+            reference = vectors
+        cosines = np.sum(vectors * reference, axis=1)
+        latencies = query_latencies(embed_model, texts)
+        reports.append(
+            BackendReport(
+                backend=backend,
+                load_seconds=load_seconds,
+                mean_cosine=float(cosines.mean()),
+                min_cosine=float(cosines.min()),
+                p50_ms=float(np.percentile(latencies, 50)),
+                p95_ms=float(np.percentile(latencies, 95)),
+                mean_ms=float(latencies.mean()),
+            )
+        )
+
+        # Only one model in memory at a time
+        del embed_model
+        gc.collect()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends against fp32.")
+    parser.add_argument("--backends", nargs="+", choices=EMBED_BACKENDS, default=list(EMBED_BACKENDS))
+    parser.add_argument("--data", default=FAQ_DATA_PATH, help="FAQ JSON file to take texts from.")
+    parser.add_argument("--limit", type=int, default=200, help="Maximum number of texts.")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    texts = load_faq_questions(args.data)[:args.limit]
+    reports = compare_backends(args.backends, texts)
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+
+    print(f"{len(texts)} texts, reference backend: {REFERENCE_BACKEND}")
+    print(f"{'backend':<12}{'load s':>8}{'mean cos':>10}{'min cos':>10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+    for r in reports:
+        print(
+            f"{r.backend:<12}{r.load_seconds:>8.1f}{r.mean_cosine:>10.4f}{r.min_cosine:>10.4f}"
+            f"{r.p50_ms:>9.1f}{r.p95_ms:>9.1f}{r.mean_ms:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
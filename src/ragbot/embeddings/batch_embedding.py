@@ -0,0 +1,212 @@
+import os
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from numpy.lib.format import open_memmap
+
+from ragbot.embeddings.embedding_cache import CachedEmbedding, build_cached_embeddings
+from ragbot.embeddings.huggingface_embeddings import (
+    EMBED_BATCH_SIZE,
+    EMBED_MODEL_NAME,
+    build_huggingface_embeddings,
+    get_embed_backend,
+)
+
+# Batches handed to each worker process at a time. Keeps result memory
+# bounded instead of queueing the whole corpus.
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+
+@dataclass
+class EmbeddingStats:
+    num_texts: int
+    num_tokens: int
+    seconds: float
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.num_texts / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.num_tokens / self.seconds if self.seconds else 0.0
+
+    def __add__(self, other: "EmbeddingStats") -> "EmbeddingStats":
+        return EmbeddingStats(
+            self.num_texts + other.num_texts,
+            self.num_tokens + other.num_tokens,
+            self.seconds + other.seconds,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"Embedded {self.num_texts} texts ({self.num_tokens} tokens) "
+            f"in {self.seconds:.1f}s: {self.docs_per_sec:.1f} docs/sec, "
+            f"{self.tokens_per_sec:.1f} tokens/sec"
+        )
+
+
+def length_sorted_batches(texts: Sequence[str], batch_size: int) -> List[np.ndarray]:
+    """Split text indices into batches of similar length to minimise padding."""
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def count_tokens(embed_model: BaseEmbedding, texts: Sequence[str]) -> int:
+    """Token count with the model's own tokenizer; whitespace words if it has none."""
+    if isinstance(embed_model, CachedEmbedding):
+        embed_model = embed_model.embed_model
+    tokenizer = getattr(getattr(embed_model, "_model", None), "tokenizer", None)
+    if tokenizer is None:
+        return sum(len(text.split()) for text in texts)
+    return sum(len(ids) for ids in tokenizer(list(texts))["input_ids"])
+
+
+def embed_batch(embed_model: BaseEmbedding, texts: Sequence[str]) -> Tuple[np.ndarray, int]:
+    """Embed one batch and return L2-normalized float32 rows and its token count."""
+    embeddings = np.asarray(embed_model.get_text_embedding_batch(list(texts)), dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms, count_tokens(embed_model, texts)
+
+
+_worker_embed_model: Optional[BaseEmbedding] = None
+
+
+def _init_worker(num_threads: int, batch_size: int) -> None:
+    global _worker_embed_model
+    import torch
+
+    torch.set_num_threads(num_threads)
+    backend = get_embed_backend()
+    _worker_embed_model = build_cached_embeddings(
+        build_huggingface_embeddings(embed_batch_size=batch_size, backend=backend),
+        model_id=f"{EMBED_MODEL_NAME}:{backend}",
+    )
+
+
+def _embed_in_worker(texts: List[str]) -> Tuple[np.ndarray, int]:
+    return embed_batch(_worker_embed_model, texts)
+
+
+def build_embedding_pool(num_workers: int, batch_size: int = EMBED_BATCH_SIZE) -> ProcessPoolExecutor:
+    """Worker pool for ``embed_texts_to_file``; reuse it across calls to load the model once."""
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads, batch_size),
+    )
+
+
+def embed_texts_to_file(
+    texts: Sequence[str],
+    output_path: Path,
+    embed_model: Optional[BaseEmbedding] = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    num_workers: int = 1,
+    on_batch: Optional[Callable[[int], None]] = None,
+    executor: Optional[ProcessPoolExecutor] = None,
+) -> Tuple[np.ndarray, EmbeddingStats]:
+    """
+    Embed ``texts`` into a ``.npy`` file at ``output_path``, row i for text i.
+
+    Texts are embedded in length-sorted batches and each batch is written to
+    the memory-mapped output as soon as it is done, so the corpus is never
+    held as Python lists. With ``num_workers > 1`` batches are sharded over a
+    process pool, each worker loading its own copy of the embedding model and
+    using an equal share of the CPU cores; pass ``executor`` from
+    ``build_embedding_pool`` to reuse one pool across calls. Otherwise
+    ``embed_model`` is used in-process. Returns the read-only memmap and
+    throughput stats.
+    """
+    start = time.perf_counter()
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32), EmbeddingStats(0, 0, 0.0)
+    batches = length_sorted_batches(texts, batch_size)
+    output = None
+    num_tokens = 0
+
+    def _write(indices: np.ndarray, embeddings: np.ndarray) -> None:
+        nonlocal output
+        if output is None:
+            output = open_memmap(
+                output_path, mode="w+", dtype=np.float32,
+                shape=(len(texts), embeddings.shape[1]),
+            )
+        output[indices] = embeddings
+        if on_batch is not None:
+            on_batch(len(indices))
+
+    if num_workers <= 1:
+        if embed_model is None:
+            raise ValueError("embed_model is required when num_workers <= 1")
+        for indices in batches:
+            embeddings, tokens = embed_batch(embed_model, [texts[i] for i in indices])
+            num_tokens += tokens
+            _write(indices, embeddings)
+    else:
+        pool = nullcontext(executor) if executor else build_embedding_pool(num_workers, batch_size)
+        with pool as executor:
+            for indices, (embeddings, tokens) in _bounded_map(
+                executor, batches, texts, num_workers * MAX_IN_FLIGHT_PER_WORKER
+            ):
+                num_tokens += tokens
+                _write(indices, embeddings)
+
+    output.flush()
+    stats = EmbeddingStats(len(texts), num_tokens, time.perf_counter() - start)
+    return np.load(output_path, mmap_mode="r"), stats
+
+
+def concatenate_embedding_files(paths: Sequence[Path], output_path: Path) -> np.ndarray:
+    """Concatenate ``.npy`` embedding files row-wise into one memory-mapped file.
+
+    Parts are copied one at a time, so memory stays bounded by the largest
+    part. Returns the result as a read-only memmap.
+    """
+    parts = [np.load(path, mmap_mode="r") for path in paths]
+    parts = [part for part in parts if part.shape[0]]
+    if not parts:
+        return np.empty((0, 0), dtype=np.float32)
+    output = open_memmap(
+        output_path, mode="w+", dtype=np.float32,
+        shape=(sum(part.shape[0] for part in parts), parts[0].shape[1]),
+    )
+    row = 0
+    for part in parts:
+        output[row:row + part.shape[0]] = part
+        row += part.shape[0]
+    output.flush()
+    del output
+    return np.load(output_path, mmap_mode="r")
+
+
+def _bounded_map(
+    executor: ProcessPoolExecutor,
+    batches: List[np.ndarray],
+    texts: Sequence[str],
+    max_in_flight: int,
+) -> Iterator[Tuple[np.ndarray, Tuple[np.ndarray, int]]]:
+    pending = {}
+    remaining = iter(batches)
+    while True:
+        while len(pending) < max_in_flight:
+            indices = next(remaining, None)
+            if indices is None:
+                break
+            future = executor.submit(_embed_in_worker, [texts[i] for i in indices])
+            pending[future] = indices
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
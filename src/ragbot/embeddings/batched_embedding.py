@@ -0,0 +1,82 @@
+from typing import Any, Dict, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from ragbot.batching import MicroBatcher
+from ragbot.batching.micro_batcher import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_WAIT_MS,
+)
+from ragbot.embeddings.embedding_cache import embed_queries
+
+
+class BatchedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that embeds concurrent async queries together.
+
+    ``aget_query_embedding`` calls arriving within a few milliseconds of
+    each other are encoded in one forward pass by a ``MicroBatcher``, off
+    the event loop. Sync calls and text embeddings go straight to the
+    wrapped model.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _batcher: MicroBatcher = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, batcher: MicroBatcher, **kwargs: Any):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._batcher = batcher
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """The wrapped model."""
+        return self._embed_model
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        return self._batcher
+
+    def stats(self) -> Dict[str, float]:
+        return self._batcher.stats()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._batcher.submit(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed_model.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._embed_model.aget_text_embedding_batch(texts)
+
+
+def build_batched_embeddings(
+    embed_model: BaseEmbedding,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+    max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+) -> BatchedEmbedding:
+    """Wrap ``embed_model`` so concurrent async queries are embedded in batches."""
+    batcher = MicroBatcher(
+        lambda queries: embed_queries(embed_model, queries),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        max_queue_size=max_queue_size,
+    )
+    return BatchedEmbedding(embed_model, batcher)
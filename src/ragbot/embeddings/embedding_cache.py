@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+EMBED_CACHE_PATH = "./models/embedding_cache.sqlite"
+EMBED_CACHE_MAX_ENTRIES = 1_000_000
+# On overflow, evict down to this fraction of the limit so eviction is rare
+EVICT_TO_FRACTION = 0.9
+# Cache hits refresh their entry's last use in memory; the new times are
+# written in one transaction once this many are waiting or they are this old
+TOUCH_FLUSH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 30.0
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_for_key(text: str) -> str:
+    """Normalization that never changes what the model sees in a meaningful way."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embed_queries(embed_model: BaseEmbedding, queries: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in as few forward passes as the model allows.
+
+    ``BaseEmbedding`` only batches texts, so queries, which carry their own
+    instruction, are sent through the model's batched encode where it has one.
+    """
+    if isinstance(embed_model, CachedEmbedding):
+        return embed_model.get_query_embedding_batch(queries)
+    if hasattr(embed_model, "_embed"):
+        return embed_model._embed(queries, prompt_name="query")
+    return [embed_model.get_query_embedding(query) for query in queries]
+
+
+class EmbeddingStore:
+    """
+    Size-bounded, content-addressed embedding store in a single SQLite file.
+
+    Vectors are stored as float32 BLOBs. The least recently used entries are
+    evicted once ``max_entries`` is exceeded. Rows are counted only when an
+    upper bound of the count, kept as entries are added, passes the limit,
+    and the last use of hits is written in batches, so neither costs a
+    query per lookup. Safe to share between threads, and between processes
+    through SQLite's own locking; each process bounds only its own inserts.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        # Upper bound of the rows: counted on open, plus every row put since
+        self._max_count = self._count()
+        self._touched: Dict[bytes, float] = {}
+        self._touched_since = time.monotonic()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                found.update(
+                    (key, np.frombuffer(vector, dtype=np.float32).tolist())
+                    for key, vector in rows
+                )
+            if found:
+                if not self._touched:
+                    self._touched_since = time.monotonic()
+                now = time.time()
+                self._touched.update((key, now) for key in found)
+                if (
+                    len(self._touched) >= TOUCH_FLUSH_SIZE
+                    or time.monotonic() - self._touched_since >= TOUCH_FLUSH_SECONDS
+                ):
+                    self._flush_touched()
+                    self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[bytes, Sequence[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+            # Replaced rows are counted too, so this only ever overestimates
+            self._max_count += len(items)
+            # Written with the new rows, in the same transaction
+            self._flush_touched()
+            self._conn.commit()
+            if self._max_count > self.max_entries:
+                self._evict()
+
+    def flush(self) -> None:
+        """Write the last use of recent hits now."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key, now in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        count = self._count()
+        if count > self.max_entries:
+            excess = count - int(self.max_entries * EVICT_TO_FRACTION)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+            count -= excess
+        self._max_count = count
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that serves repeated texts from an ``EmbeddingStore``.
+
+    Entries are keyed on the model id, the instruction prefix the model
+    prepends for queries or texts, and a hash of the normalized text, so
+    switching model, backend or instruction never returns stale vectors.
+    The async methods run the store's disk I/O in a worker thread, off the
+    event loop.
+    """
+
+    model_id: str
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        store: EmbeddingStore,
+        model_id: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(
+            model_name=embed_model.model_name,
+            model_id=model_id or embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._store = store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """The wrapped model."""
+        return self._embed_model
+
+    def stats(self) -> Dict[str, float]:
+        with self._store._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def cache_key(self, text: str, kind: str) -> bytes:
+        """Key for a "query" or "text" embedding of ``text``."""
+        identity = "\x1f".join(
+            [self.model_id, kind, self._instruction(kind), normalize_for_key(text)]
+        )
+        return hashlib.sha256(identity.encode("utf-8")).digest()
+
+    def _instruction(self, kind: str) -> str:
+        prompts = getattr(getattr(self._embed_model, "_model", None), "prompts", None) or {}
+        return prompts.get(kind) or ""
+
+    def _lookup(self, texts: List[str], kind: str):
+        keys = [self.cache_key(text, kind) for text in texts]
+        found = self._store.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        # The sync, async and batch paths all count, from several threads
+        with self._store._lock:
+            self._hits += len(texts) - len(missing)
+            self._misses += len(missing)
+        return keys, found, missing
+
+    def _merge(self, keys, found, missing, computed) -> List[List[float]]:
+        # Round through float32 so a miss returns exactly what a later hit will
+        new_items = {
+            keys[i]: np.asarray(vector, dtype=np.float32).tolist()
+            for i, vector in zip(missing, computed)
+        }
+        self._store.put_many(new_items)
+        found.update(new_items)
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        keys, found, missing = self._lookup([query], "query")
+        computed = [self._embed_model.get_query_embedding(query)] if missing else []
+        return self._merge(keys, found, missing, computed)[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, [query], "query")
+        if not missing:
+            return found[keys[0]]
+        computed = [await self._embed_model.aget_query_embedding(query)]
+        return (await asyncio.to_thread(self._merge, keys, found, missing, computed))[0]
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, computing only the cache misses, in one batch."""
+        keys, found, missing = self._lookup(queries, "query")
+        computed = embed_queries(self._embed_model, [queries[i] for i in missing]) if missing else []
+        return self._merge(keys, found, missing, computed)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts, "text")
+        computed = (
+            self._embed_model.get_text_embedding_batch([texts[i] for i in missing])
+            if missing else []
+        )
+        return self._merge(keys, found, missing, computed)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts, "text")
+        if not missing:
+            return [found[key] for key in keys]
+        computed = await self._embed_model.aget_text_embedding_batch([texts[i] for i in missing])
+        return await asyncio.to_thread(self._merge, keys, found, missing, computed)
+
+
+def build_cached_embeddings(
+    embed_model: BaseEmbedding,
+    model_id: Optional[str] = None,
+    path: str = EMBED_CACHE_PATH,
+    max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+) -> CachedEmbedding:
+    """Wrap ``embed_model`` with the persistent on-disk embedding cache."""
+    return CachedEmbedding(embed_model, EmbeddingStore(path, max_entries), model_id=model_id)
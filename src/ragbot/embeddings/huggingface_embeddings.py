@@ -1,12 +1,102 @@
-import torch
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-def build_huggingface_embeddings() -> HuggingFaceEmbedding:
+if TYPE_CHECKING:
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
-    embed_model = HuggingFaceEmbedding(
-        model_name = "intfloat/multilingual-e5-large-instruct",
-        device="cuda" if torch.cuda.is_available() else "cpu",
-        cache_folder= "./models"
-    )
+EMBED_MODEL_NAME = "intfloat/multilingual-e5-large-instruct"
+EMBED_CACHE_FOLDER = "./models"
+EMBED_BATCH_SIZE = 32
 
-    return embed_model
\ No newline at end of file
+# Embedding backends, selected per deployment with the EMBED_BACKEND env var:
+# - "torch":      fp32 PyTorch, on GPU when available
+# - "torch-int8": PyTorch with Linear layers dynamically quantized to int8 (CPU)
+# - "onnx":       ONNX Runtime export of the fp32 model (CPU)
+# - "onnx-int8":  dynamically int8-quantized ONNX export (CPU)
+# The ONNX backends need `pip install sentence-transformers[onnx]`.
+EMBED_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+DEFAULT_EMBED_BACKEND = "torch"
+
+# Target instruction set for the quantized ONNX model: "avx2" runs on any
+# x86-64 server, "avx512_vnni" is faster on recent Xeons, "arm64" for ARM.
+ONNX_QUANTIZATION_CONFIG = "avx2"
+# optimum quantizes avx2 to unsigned int8 and the other targets to signed int8
+ONNX_INT8_FILE_NAME = (
+    f"onnx/model_{'quint8' if ONNX_QUANTIZATION_CONFIG == 'avx2' else 'qint8'}"
+    f"_{ONNX_QUANTIZATION_CONFIG}.onnx"
+)
+
+def get_embed_backend() -> str:
+    backend = os.getenv("EMBED_BACKEND", DEFAULT_EMBED_BACKEND)
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r}, expected one of {EMBED_BACKENDS}")
+    return backend
+
+def onnx_int8_model_dir(model_name: str = EMBED_MODEL_NAME, cache_folder: str = EMBED_CACHE_FOLDER) -> Path:
+    return Path(cache_folder) / "onnx-int8" / model_name.replace("/", "--")
+
+def export_onnx_int8_model(model_name: str = EMBED_MODEL_NAME, cache_folder: str = EMBED_CACHE_FOLDER) -> Path:
+    """Export and quantize the ONNX model once, keeping it in the local model cache."""
+    model_dir = onnx_int8_model_dir(model_name, cache_folder)
+    if (model_dir / ONNX_INT8_FILE_NAME).exists():
+        return model_dir
+
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_folder, backend="onnx")
+    model.save(str(model_dir))
+    export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION_CONFIG, str(model_dir))
+    return model_dir
+
+def build_huggingface_embeddings(
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    backend: Optional[str] = None,
+) -> "HuggingFaceEmbedding":
+    # torch and sentence-transformers take seconds to import, so only the
+    # processes that build the model pay for them
+    import torch
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    backend = backend or get_embed_backend()
+
+    if backend == "torch":
+        return HuggingFaceEmbedding(
+            model_name = EMBED_MODEL_NAME,
+            device="cuda" if torch.cuda.is_available() else "cpu",
+            cache_folder= EMBED_CACHE_FOLDER,
+            embed_batch_size= embed_batch_size,
+        )
+
+    if backend == "torch-int8":
+        embed_model = HuggingFaceEmbedding(
+            model_name = EMBED_MODEL_NAME,
+            device="cpu",
+            cache_folder= EMBED_CACHE_FOLDER,
+            embed_batch_size= embed_batch_size,
+        )
+        torch.quantization.quantize_dynamic(
+            embed_model._model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return embed_model
+
+    if backend == "onnx":
+        return HuggingFaceEmbedding(
+            model_name = EMBED_MODEL_NAME,
+            device="cpu",
+            cache_folder= EMBED_CACHE_FOLDER,
+            embed_batch_size= embed_batch_size,
+            backend="onnx",
+        )
+
+    if backend == "onnx-int8":
+        return HuggingFaceEmbedding(
+            model_name = str(export_onnx_int8_model(EMBED_MODEL_NAME, EMBED_CACHE_FOLDER)),
+            device="cpu",
+            cache_folder= EMBED_CACHE_FOLDER,
+            embed_batch_size= embed_batch_size,
+            backend="onnx",
+            model_kwargs={"file_name": ONNX_INT8_FILE_NAME},
+        )
+
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBED_BACKENDS}")
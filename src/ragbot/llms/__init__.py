@@ -1 +1,4 @@
-from ragbot.llms.openrouter_llm import build_openrouter_llm
\ No newline at end of file
+from ragbot.llms.openrouter_llm import build_hedged_openrouter_llm, build_openrouter_llm
+from ragbot.llms.concurrency import LLMConcurrencyLimiter, LLMOverloadedError
+from ragbot.llms.hedged_llm import HedgedLLM, LLMUnavailableError, build_hedged_llm
+from ragbot.llms.mock_llm import build_mock_llm
\ No newline at end of file
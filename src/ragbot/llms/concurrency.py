@@ -0,0 +1,62 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when an LLM call would have to wait behind too many others."""
+
+
+class LLMConcurrencyLimiter:
+    """
+    Bounds the number of LLM calls in flight, with a bounded wait queue.
+
+    A streamed call holds its slot until the stream is exhausted or closed.
+    Calls beyond ``max_in_flight`` wait for a slot; once ``max_waiting``
+    calls are already waiting, new calls fail fast with
+    ``LLMOverloadedError`` instead of queueing without bound.
+    """
+
+    def __init__(self, max_in_flight: int, max_waiting: int):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self._waiting >= self.max_waiting:
+            raise LLMOverloadedError(
+                f"{self._in_flight} LLM calls in flight and {self._waiting} waiting"
+            )
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def wrap(self, stream: AsyncGenerator[T, None]) -> AsyncGenerator[T, None]:
+        """Hold a slot from the first chunk of ``stream`` until it ends."""
+        async with self.slot():
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
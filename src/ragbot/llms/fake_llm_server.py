@@ -0,0 +1,218 @@
+"""
+Local OpenAI-compatible chat server that streams made-up answers.
+
+Serves ``POST /v1/chat/completions``, streamed or not, for any model
+name, so the OpenRouter client can be pointed at it to test timeouts,
+hedging and fallbacks without network or API key. Each request waits
+``--ttft`` seconds for its first token; ``--slow-rate`` of them wait
+``--slow-ttft`` seconds instead and ``--error-rate`` of them fail with a
+500. Clients that hang up before the first token are counted. Run with:
+
+    python -m ragbot.llms.fake_llm_server --port 8090 --slow-rate 0.05
+    OPENROUTER_API_BASE=http://127.0.0.1:8090/v1 uvicorn server:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ragbot.llms.mock_llm import MOCK_NUM_TOKENS, MOCK_TOKEN_DELAY_SECONDS, MOCK_TTFT_SECONDS
+
+FAKE_SLOW_TTFT_SECONDS = 10.0
+
+
+@dataclass
+class FakeModel:
+    """How one model of the fake server answers."""
+
+    ttft_seconds: float = MOCK_TTFT_SECONDS
+    token_delay_seconds: float = MOCK_TOKEN_DELAY_SECONDS
+    num_tokens: int = MOCK_NUM_TOKENS
+    slow_rate: float = 0.0
+    slow_ttft_seconds: float = FAKE_SLOW_TTFT_SECONDS
+    error_rate: float = 0.0
+
+
+class FakeLLMServer:
+    """
+    Streams answers made of the words of the last user message.
+
+    ``models`` sets the behavior per model name, ``default`` that of every
+    other model. ``requests`` counts requests per model and ``outcomes``
+    counts them as completed, failed or disconnected.
+    """
+
+    def __init__(self, models: Optional[Dict[str, FakeModel]] = None, default: Optional[FakeModel] = None, seed: int = 0):
+        self.models = models or {}
+        self.default = default or FakeModel()
+        self.requests = Counter()
+        self.outcomes = Counter()
+        self._rng = random.Random(seed)
+        self._server: Optional[asyncio.Server] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeLLMServer":
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> "FakeLLMServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, headers, body = await read_request(reader)
+            if method != "POST" or not path.endswith("/chat/completions"):
+                await respond(writer, 404, {"error": {"message": "Not found"}})
+                return
+            payload = json.loads(body)
+            model_name = payload.get("model", "")
+            model = self.models.get(model_name, self.default)
+            self.requests[model_name] += 1
+
+            roll = self._rng.random()
+            if roll < model.error_rate:
+                self.outcomes["failed"] += 1
+                await respond(writer, 500, {"error": {"message": "Fake upstream error"}})
+                return
+            slow = roll < model.error_rate + model.slow_rate
+            if not await sleep_unless_closed(reader, model.slow_ttft_seconds if slow else model.ttft_seconds):
+                self.outcomes["disconnected"] += 1
+                return
+
+            tokens = answer_tokens(payload.get("messages", []), model.num_tokens)
+            if payload.get("stream"):
+                await self._stream(writer, model_name, model, tokens)
+            else:
+                await respond(writer, 200, completion(model_name, "".join(tokens)))
+            self.outcomes["completed"] += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.outcomes["disconnected"] += 1
+        finally:
+            writer.close()
+
+    async def _stream(self, writer: asyncio.StreamWriter, model_name: str, model: FakeModel, tokens: List[str]) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(model.token_delay_seconds)
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            writer.write(server_sent_event(chunk(chunk_id, model_name, delta, None)))
+            await writer.drain()
+        writer.write(server_sent_event(chunk(chunk_id, model_name, {}, "stop")))
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+
+async def read_request(reader: asyncio.StreamReader):
+    method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+async def sleep_unless_closed(reader: asyncio.StreamReader, seconds: float) -> bool:
+    """Wait ``seconds``; False if the client closed the connection first."""
+    try:
+        return await asyncio.wait_for(reader.read(1), timeout=seconds) != b""
+    except TimeoutError:
+        return True
+
+
+async def respond(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+
+
+def answer_tokens(messages: List[Dict[str, Any]], num_tokens: int) -> List[str]:
+    user = [m.get("content") for m in messages if m.get("role") == "user" and isinstance(m.get("content"), str)]
+    words = (user[-1] if user else "").split() or ["token"]
+    return [f"{words[i % len(words)]} " for i in range(num_tokens)]
+
+
+def chunk(chunk_id: str, model_name: str, delta: Dict[str, str], finish_reason: Optional[str]) -> Dict[str, Any]:
+    return {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model_name,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def completion(model_name: str, text: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model_name,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    }
+
+
+def server_sent_event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n"
+
+
+async def serve(host: str, port: int, model: FakeModel, seed: int) -> None:
+    server = await FakeLLMServer(default=model, seed=seed).start(host, port)
+    print(f"Fake LLM server on {server.base_url}")
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible server streaming fake answers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--ttft", type=float, default=MOCK_TTFT_SECONDS, help="Seconds to the first token.")
+    parser.add_argument("--token-delay", type=float, default=MOCK_TOKEN_DELAY_SECONDS, help="Seconds per token.")
+    parser.add_argument("--tokens", type=int, default=MOCK_NUM_TOKENS, help="Tokens per answer.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests with a slow first token.")
+    parser.add_argument("--slow-ttft", type=float, default=FAKE_SLOW_TTFT_SECONDS, help="Their seconds to the first token.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail with a 500.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    model = FakeModel(args.ttft, args.token_delay, args.tokens, args.slow_rate, args.slow_ttft, args.error_rate)
+    try:
+        asyncio.run(serve(args.host, args.port, model, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import LLM
+
+from ragbot.observability import METRICS
+from ragbot.observability.metrics import LLM_MODEL_TTFT_SECONDS
+
+# Send another request when the first token takes longer than this
+LLM_HEDGE_AFTER_SECONDS = 2.0
+# Give up on a request that hasn't streamed a token after this long
+LLM_FIRST_TOKEN_TIMEOUT_SECONDS = 15.0
+# Requests per call, the first one included: hedges and retries after failures
+LLM_MAX_ATTEMPTS = 3
+# Failures in a row that open a model's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when the circuit of every model is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a model that keeps failing.
+
+    After ``failure_threshold`` failures in a row the circuit opens and
+    requests are refused for ``reset_seconds``. Then it lets one trial
+    request through: its success closes the circuit, its failure opens it
+    again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opens = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; a half-open circuit allows one at a time."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def record_cancel(self) -> None:
+        """A request that was cancelled before it succeeded or failed."""
+        with self._lock:
+            self._trial = False
+
+
+class HedgedLLM(LLM):
+    """
+    The primary LLM with fallbacks, hedging requests whose first token is slow.
+
+    ``llms`` are the primary model and its fallbacks, in order. A stream
+    call goes to the primary; when it has no first token after
+    ``hedge_after`` seconds, another request goes to the next model in the
+    list (the same one if there is only one), and so on every
+    ``hedge_after`` seconds. A request that fails, or has no first token
+    after ``first_token_timeout`` seconds, is replaced right away. At most
+    ``max_attempts`` requests are sent per call. The first to stream a
+    token wins and the others are cancelled. Once a token is out the
+    answer can't switch models, so later errors are raised.
+
+    Each model has a ``CircuitBreaker`` and is skipped while its circuit
+    is open. Non-streaming async calls race the same way; sync calls only
+    fall back after failures.
+    """
+
+    hedge_after: float = Field(
+        default=LLM_HEDGE_AFTER_SECONDS,
+        description="Seconds without a first token before sending another request.",
+    )
+    first_token_timeout: float = Field(
+        default=LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+        description="Seconds without a first token before a request counts as failed.",
+    )
+    max_attempts: int = Field(default=LLM_MAX_ATTEMPTS, description="Requests per call at most.")
+
+    _llms: List[LLM] = PrivateAttr()
+    _names: List[str] = PrivateAttr()
+    _breakers: List[CircuitBreaker] = PrivateAttr()
+    _events: Counter = PrivateAttr()
+    _failures: Counter = PrivateAttr()
+    _counter_lock: threading.Lock = PrivateAttr()
+
+    def __init__(
+        self,
+        llms: Sequence[LLM],
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        **kwargs: Any,
+    ):
+        if not llms:
+            raise ValueError("HedgedLLM needs at least one LLM")
+        super().__init__(**kwargs)
+        self._llms = list(llms)
+        names = [llm.metadata.model_name for llm in self._llms]
+        # The same model twice, e.g. from two providers, gets a suffix
+        self._names = [
+            name if names.count(name) == 1 else f"{name}#{names[:i].count(name) + 1}"
+            for i, name in enumerate(names)
+        ]
+        self._breakers = [CircuitBreaker(failure_threshold, reset_seconds, clock) for _ in self._llms]
+        self._events = Counter()
+        self._failures = Counter()
+        self._counter_lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HedgedLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        # Prompts are sized for the primary, but must fit every fallback
+        return self._llms[0].metadata.model_copy(
+            update={"context_window": min(llm.metadata.context_window for llm in self._llms)}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            events, failures = dict(self._events), dict(self._failures)
+        return {
+            "events": events,
+            "models": {
+                name: {"state": breaker.state, "failures": failures.get(name, 0), "opens": breaker.opens}
+                for name, breaker in zip(self._names, self._breakers)
+            },
+        }
+
+    def model_failures(self) -> Dict[str, int]:
+        with self._counter_lock:
+            return {name: self._failures.get(name, 0) for name in self._names}
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return self._astream(lambda llm: llm.astream_chat(messages, **kwargs))
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        return self._astream(lambda llm: llm.astream_complete(prompt, formatted=formatted, **kwargs))
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        response = ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=""))
+        async for response in await self.astream_chat(messages, **kwargs):
+            pass
+        return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        response = CompletionResponse(text="")
+        async for response in await self.astream_complete(prompt, formatted=formatted, **kwargs):
+            pass
+        return response
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._call(lambda llm: llm.chat(messages, **kwargs))
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._call(lambda llm: llm.complete(prompt, formatted=formatted, **kwargs))
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self._call(lambda llm: peek(llm.stream_chat(messages, **kwargs)))
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self._call(lambda llm: peek(llm.stream_complete(prompt, formatted=formatted, **kwargs)))
+
+    async def _astream(self, start: Callable[[LLM], Awaitable[AsyncGenerator[T, None]]]) -> AsyncGenerator[T, None]:
+        # Nothing is sent before the stream is first iterated, like the
+        # underlying LLMs, so a concurrency limiter around it still holds
+        i, stream, first = await self._race(start)
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            self._fail(i, "failed", e)
+            raise
+        finally:
+            await stream.aclose()
+
+    async def _race(
+        self,
+        start: Callable[[LLM], Awaitable[AsyncGenerator[T, None]]],
+    ) -> Tuple[int, AsyncGenerator[T, None], Optional[T]]:
+        """Send requests until one streams a chunk; returns its model, its stream and the chunk."""
+        loop = asyncio.get_running_loop()
+        # Request -> (model, start time, why it was sent)
+        pending: Dict[asyncio.Task, Tuple[int, float, str]] = {}
+        sent = 0
+        last_sent = 0.0
+        exhausted = False
+        last_error: Optional[BaseException] = None
+
+        async def first_chunk(llm: LLM):
+            stream = await start(llm)
+            try:
+                return stream, await anext(stream, None)
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        def send(event: str) -> None:
+            nonlocal sent, last_sent, exhausted
+            i = self._next_model(sent)
+            if i is None:
+                exhausted = True
+                self._count("rejected")
+                return
+            sent += 1
+            last_sent = loop.time()
+            pending[asyncio.create_task(first_chunk(self._llms[i]))] = (i, last_sent, event)
+            self._count(event)
+
+        def can_send() -> bool:
+            return not exhausted and sent < self.max_attempts
+
+        send("sent")
+        try:
+            while pending:
+                wake = min(started + self.first_token_timeout for _, started, _ in pending.values())
+                if can_send():
+                    wake = min(wake, last_sent + self.hedge_after)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, wake - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner = None
+                failed = 0
+                for task in done:
+                    i, started, event = pending.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        last_error = error
+                        failed += 1
+                        self._fail(i, "failed", error)
+                    elif winner is None:
+                        winner = (i, started, event, *task.result())
+                    else:
+                        # Lost to a request that finished at the same time
+                        await task.result()[0].aclose()
+                        self._breakers[i].record_cancel()
+                        self._count("cancelled")
+                if winner is not None:
+                    i, started, event, stream, first = winner
+                    LLM_MODEL_TTFT_SECONDS.observe(loop.time() - started, self._names[i])
+                    self._breakers[i].record_success()
+                    self._count("won" if event == "sent" else f"won_by_{event}")
+                    return i, stream, first
+
+                now = loop.time()
+                for task, (i, started, _) in list(pending.items()):
+                    if now - started >= self.first_token_timeout:
+                        del pending[task]
+                        task.cancel()
+                        failed += 1
+                        last_error = TimeoutError(f"No first token from {self._names[i]} in {self.first_token_timeout}s")
+                        self._fail(i, "timeout", last_error)
+                for _ in range(failed):
+                    if can_send():
+                        send("retry")
+                if pending and can_send() and now - last_sent >= self.hedge_after:
+                    send("hedge")
+        finally:
+            await self._cancel(pending)
+        if last_error is not None:
+            raise last_error
+        raise LLMUnavailableError(f"Circuits of all models are open: {', '.join(self._names)}")
+
+    async def _cancel(self, pending: Dict[asyncio.Task, Tuple[int, float, str]]) -> None:
+        for task, (i, _, _) in pending.items():
+            task.cancel()
+            self._breakers[i].record_cancel()
+            self._count("cancelled")
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, tuple):
+                await result[0].aclose()
+
+    def _call(self, call: Callable[[LLM], T]) -> T:
+        """``call`` on the first model that doesn't fail, sending at most ``max_attempts`` requests."""
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            i = self._next_model(attempt)
+            if i is None:
+                self._count("rejected")
+                break
+            self._count("sent" if attempt == 0 else "retry")
+            try:
+                result = call(self._llms[i])
+            except Exception as e:
+                last_error = e
+                self._fail(i, "failed", e)
+                continue
+            self._breakers[i].record_success()
+            self._count("won" if attempt == 0 else "won_by_retry")
+            return result
+        if last_error is not None:
+            raise last_error
+        raise LLMUnavailableError(f"Circuits of all models are open: {', '.join(self._names)}")
+
+    def _next_model(self, attempt: int) -> Optional[int]:
+        """Model of the ``attempt``-th request: the next in order whose circuit lets it through."""
+        for offset in range(len(self._llms)):
+            i = (attempt + offset) % len(self._llms)
+            if self._breakers[i].allow():
+                return i
+        return None
+
+    def _fail(self, i: int, event: str, error: BaseException) -> None:
+        self._breakers[i].record_failure()
+        with self._counter_lock:
+            self._events[event] += 1
+            self._failures[self._names[i]] += 1
+        logger.warning("LLM request to %s %s: %r", self._names[i], event, error)
+
+    def _count(self, event: str) -> None:
+        with self._counter_lock:
+            self._events[event] += 1
+
+
+def peek(stream: Iterator[T]) -> Iterator[T]:
+    """``stream`` with its first item already pulled, so errors before it are raised here."""
+    first = next(stream, None)
+    return stream if first is None else itertools.chain([first], stream)
+
+
+def build_hedged_llm(
+    llms: Sequence[LLM],
+    hedge_after: float = LLM_HEDGE_AFTER_SECONDS,
+    first_token_timeout: float = LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+    failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds: float = CIRCUIT_RESET_SECONDS,
+) -> HedgedLLM:
+    """Put ``llms``, the primary model first, behind one ``HedgedLLM`` and export its counters."""
+    llm = HedgedLLM(
+        llms,
+        failure_threshold=failure_threshold,
+        reset_seconds=reset_seconds,
+        hedge_after=hedge_after,
+        first_token_timeout=first_token_timeout,
+        max_attempts=max_attempts,
+    )
+    METRICS.counter_callback(
+        "ragbot_llm_dispatch_events_total",
+        "LLM requests sent, hedged and retried, races won, and requests cancelled, failed, timed out or refused.",
+        "event",
+        lambda: llm.stats()["events"],
+    )
+    METRICS.counter_callback(
+        "ragbot_llm_model_failures_total",
+        "Failed and timed out LLM requests, by model.",
+        "model",
+        llm.model_failures,
+    )
+    return llm
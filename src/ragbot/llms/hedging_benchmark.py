@@ -0,0 +1,163 @@
+"""
+Tail latency and errors of LLM calls with and without hedging and fallback.
+
+Starts ``ragbot.llms.fake_llm_server`` in process with a primary model
+that has ``--slow-rate`` slow first tokens and ``--error-rate`` errors,
+and a slower but reliable fallback model. Then streams ``--calls``
+answers, ``--concurrency`` at a time, through the OpenRouter client
+three ways: the primary alone, with the client's own retries, as before;
+``HedgedLLM`` over the primary alone; and ``HedgedLLM`` over the primary
+and the fallback. Reports time to first token, failed calls and the
+requests each call sent. Run with:
+
+    python -m ragbot.llms.hedging_benchmark --calls 400 --hedge-after 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional, Sequence
+
+import httpx
+import numpy as np
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.llms import LLM
+
+from ragbot.llms.fake_llm_server import FakeLLMServer, FakeModel
+from ragbot.llms.hedged_llm import LLM_HEDGE_AFTER_SECONDS, build_hedged_llm
+from ragbot.llms.openrouter_llm import build_openrouter_llm
+
+PRIMARY_MODEL = "fake/primary"
+FALLBACK_MODEL = "fake/fallback"
+SETUPS = ("single", "hedged", "fallback")
+
+
+@dataclass
+class HedgingReport:
+    setup: str
+    calls: int
+    error_rate: float
+    requests_per_call: float
+    ttft_ms: Dict[str, float]
+    end_to_end_ms: Dict[str, float]
+    events: Dict[str, int] = field(default_factory=dict)
+
+
+def percentiles_ms(values: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+async def stream_call(llm: LLM, question: str) -> Optional[float]:
+    """Seconds to the first token of one streamed answer; None if the call failed."""
+    start = time.perf_counter()
+    ttft = None
+    try:
+        async for _ in await llm.astream_chat([ChatMessage(role=MessageRole.USER, content=question)]):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+    except Exception:
+        return None
+    return ttft
+
+
+def build_setup(setup: str, http_client: httpx.AsyncClient, hedge_after: float) -> LLM:
+    if setup == "single":
+        return build_openrouter_llm(http_client, model=PRIMARY_MODEL)
+    models = [PRIMARY_MODEL] if setup == "hedged" else [PRIMARY_MODEL, FALLBACK_MODEL]
+    return build_hedged_llm(
+        [build_openrouter_llm(http_client, model=model, max_retries=0) for model in models],
+        hedge_after=hedge_after,
+    )
+
+
+async def run_setup(setup: str, args: argparse.Namespace) -> HedgingReport:
+    # The same draws of slow and failing requests for every setup
+    server = FakeLLMServer(
+        models={
+            PRIMARY_MODEL: FakeModel(
+                ttft_seconds=args.ttft,
+                token_delay_seconds=args.token_delay,
+                num_tokens=args.tokens,
+                slow_rate=args.slow_rate,
+                slow_ttft_seconds=args.slow_ttft,
+                error_rate=args.error_rate,
+            ),
+            FALLBACK_MODEL: FakeModel(
+                ttft_seconds=args.fallback_ttft,
+                token_delay_seconds=args.token_delay,
+                num_tokens=args.tokens,
+            ),
+        },
+        seed=args.seed,
+    )
+    async with server, httpx.AsyncClient(limits=httpx.Limits(max_connections=4 * args.concurrency)) as http_client:
+        os.environ["OPENROUTER_API_BASE"] = server.base_url
+        llm = build_setup(setup, http_client, args.hedge_after)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                ttft = await stream_call(llm, f"question {i} about diabetes")
+                return ttft, time.perf_counter() - start
+
+        results = await asyncio.gather(*(bounded(i) for i in range(args.calls)))
+    ok = [(ttft, seconds) for ttft, seconds in results if ttft is not None]
+    return HedgingReport(
+        setup=setup,
+        calls=args.calls,
+        error_rate=1 - len(ok) / args.calls,
+        requests_per_call=sum(server.requests.values()) / args.calls,
+        ttft_ms=percentiles_ms([ttft for ttft, _ in ok]),
+        end_to_end_ms=percentiles_ms([seconds for _, seconds in ok]),
+        events=llm.stats()["events"] if hasattr(llm, "stats") else {},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM tail latency with and without hedging and fallback.")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--hedge-after", type=float, default=LLM_HEDGE_AFTER_SECONDS, help="Seconds before hedging.")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Primary's usual seconds to the first token.")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Primary's share of slow first tokens.")
+    parser.add_argument("--slow-ttft", type=float, default=8.0, help="Their seconds to the first token.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Primary's share of failed requests.")
+    parser.add_argument("--fallback-ttft", type=float, default=0.5, help="Fallback's seconds to the first token.")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds per token.")
+    parser.add_argument("--tokens", type=int, default=16, help="Tokens per answer.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    # The fake server takes any key
+    os.environ.setdefault("OPENROUTER_API_KEY", "fake")
+    reports = [asyncio.run(run_setup(setup, args)) for setup in SETUPS]
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+    print(f"{'setup':<10}{'errors':>8}{'req/call':>10}{'TTFT p50':>10}{'p95':>9}{'p99':>9}{'max':>9}")
+    for r in reports:
+        ttft = r.ttft_ms
+        print(
+            f"{r.setup:<10}{r.error_rate:>8.3f}{r.requests_per_call:>10.2f}"
+            f"{ttft['p50']:>10.0f}{ttft['p95']:>9.0f}{ttft['p99']:>9.0f}{ttft['max']:>9.0f}"
+        )
+    for r in reports:
+        if r.events:
+            print(f"{r.setup}: {r.events}")
+
+
+if __name__ == "__main__":
+    main()
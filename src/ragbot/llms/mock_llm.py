@@ -0,0 +1,99 @@
+import asyncio
+import time
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+
+# Roughly a hosted small model: a few hundred ms to the first token, then ~50 tokens/s
+MOCK_TTFT_SECONDS = 0.3
+MOCK_TOKEN_DELAY_SECONDS = 0.02
+MOCK_NUM_TOKENS = 64
+
+
+class StreamingMockLLM(CustomLLM):
+    """
+    Deterministic local stand-in for the chat LLM, for benchmarks.
+
+    Streams ``num_tokens`` words taken from the last user message, after
+    ``ttft_seconds`` and then one every ``token_delay_seconds``. The async
+    stream sleeps without blocking the event loop, so concurrent calls
+    overlap like real network-bound calls do.
+    """
+
+    ttft_seconds: float = MOCK_TTFT_SECONDS
+    token_delay_seconds: float = MOCK_TOKEN_DELAY_SECONDS
+    num_tokens: int = MOCK_NUM_TOKENS
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StreamingMockLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_chat_model=True, model_name=self.class_name())
+
+    def _tokens(self, messages: Sequence[ChatMessage]):
+        user = [m.content for m in messages if m.role == MessageRole.USER and m.content]
+        words = (user[-1] if user else "").split() or ["token"]
+        return [f"{words[i % len(words)]} " for i in range(self.num_tokens)]
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        def gen() -> ChatResponseGen:
+            content = ""
+            for i, token in enumerate(self._tokens(messages)):
+                time.sleep(self.ttft_seconds if i == 0 else self.token_delay_seconds)
+                content += token
+                yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content), delta=token)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        async def gen() -> ChatResponseAsyncGen:
+            content = ""
+            for i, token in enumerate(self._tokens(messages)):
+                await asyncio.sleep(self.ttft_seconds if i == 0 else self.token_delay_seconds)
+                content += token
+                yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content), delta=token)
+
+        return gen()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text = "".join(self._tokens([ChatMessage(role=MessageRole.USER, content=prompt)]))
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for token in self._tokens([ChatMessage(role=MessageRole.USER, content=prompt)]):
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+
+def build_mock_llm(
+    ttft_seconds: float = MOCK_TTFT_SECONDS,
+    token_delay_seconds: float = MOCK_TOKEN_DELAY_SECONDS,
+    num_tokens: int = MOCK_NUM_TOKENS,
+) -> StreamingMockLLM:
+    """Build the local LLM stand-in used by ``ragbot.workflows.rag_benchmark``."""
+    return StreamingMockLLM(
+        ttft_seconds=ttft_seconds,
+        token_delay_seconds=token_delay_seconds,
+        num_tokens=num_tokens,
+    )
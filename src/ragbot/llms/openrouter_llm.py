@@ -1,12 +1,37 @@
 import os
-from llama_index.llms.openrouter import OpenRouter
-from transformers import AutoTokenizer
+from typing import TYPE_CHECKING, List, Optional
 
+import httpx
+
+from ragbot.llms.hedged_llm import HedgedLLM, build_hedged_llm
+
+if TYPE_CHECKING:
+    from llama_index.llms.openrouter import OpenRouter
+
+OPENROUTER_MODEL = "meta-llama/llama-3.2-3b-instruct"
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
+# The client's own retries; HedgedLLM retries across models instead
+OPENROUTER_MAX_RETRIES = 5
+
+
+def get_openrouter_models() -> List[str]:
+    """The primary model, then the fallbacks listed in OPENROUTER_FALLBACK_MODELS, comma separated."""
+    fallbacks = [model.strip() for model in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",")]
+    return [os.getenv("OPENROUTER_MODEL", OPENROUTER_MODEL), *(model for model in fallbacks if model)]
+
+
+def build_openrouter_llm(
+    async_http_client: Optional[httpx.AsyncClient] = None,
+    model: Optional[str] = None,
+    max_retries: int = OPENROUTER_MAX_RETRIES,
+) -> "OpenRouter":
+    """Build the LLM; pass ``async_http_client`` to share one connection pool."""
+    # Imports transformers, which takes seconds
+    from llama_index.llms.openrouter import OpenRouter
 
-def build_openrouter_llm() -> OpenRouter:
     api_key = os.getenv("OPENROUTER_API_KEY")
 
-    model = "meta-llama/llama-3.2-3b-instruct"
+    model = model or os.getenv("OPENROUTER_MODEL", OPENROUTER_MODEL)
 
     llm = OpenRouter(
         model = model,
@@ -14,10 +39,18 @@ def build_openrouter_llm() -> OpenRouter:
         temperature= 0.1,
         context_window= 4096,
         api_key= api_key,
+        # OPENROUTER_API_BASE can point at ragbot.llms.fake_llm_server for tests
+        api_base= os.getenv("OPENROUTER_API_BASE", OPENROUTER_API_BASE),
+        max_retries= max_retries,
+        async_http_client= async_http_client,
     )
 
-    # tokenizer = AutoTokenizer.from_pretrained(
-    #     model,
-    #     cache_dir="./models",
-    # )
-    return llm
\ No newline at end of file
+    return llm
+
+
+def build_hedged_openrouter_llm(async_http_client: Optional[httpx.AsyncClient] = None, **hedge_kwargs) -> HedgedLLM:
+    """The primary OpenRouter model and its fallbacks behind one ``HedgedLLM``."""
+    return build_hedged_llm(
+        [build_openrouter_llm(async_http_client, model=model, max_retries=0) for model in get_openrouter_models()],
+        **hedge_kwargs,
+    )
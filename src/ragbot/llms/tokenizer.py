@@ -0,0 +1,42 @@
+import logging
+import os
+from functools import partial
+from typing import Callable, List, Optional
+
+from llama_index.core.utils import get_tokenizer
+
+# Hugging Face repo of the OpenRouter model's tokenizer. It is gated: accept
+# the license on the Hub and set HF_TOKEN, or point LLM_TOKENIZER at a copy.
+LLM_TOKENIZER_NAME = "meta-llama/Llama-3.2-3B-Instruct"
+TOKENIZER_CACHE_FOLDER = "./models"
+
+logger = logging.getLogger(__name__)
+
+
+def build_llm_tokenizer(
+    name: Optional[str] = None,
+    cache_folder: str = TOKENIZER_CACHE_FOLDER,
+) -> Callable[[str], List[int]]:
+    """
+    Token encoder of the chat LLM, for ``Settings.tokenizer``.
+
+    The tokenizer is loaded from the local cache and only downloaded once.
+    When it can't be loaded, falls back to LlamaIndex's default tiktoken
+    encoding, whose counts for English text are close to Llama 3's.
+    """
+    name = name or os.getenv("LLM_TOKENIZER", LLM_TOKENIZER_NAME)
+    token = os.getenv("HF_TOKEN")
+    try:
+        from transformers import AutoTokenizer
+
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=cache_folder, local_files_only=True)
+        except OSError:
+            # The gated default can't be downloaded without a token; don't wait on retries
+            if name == LLM_TOKENIZER_NAME and not token:
+                raise
+            tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=cache_folder, token=token)
+    except Exception as e:
+        logger.warning("Could not load tokenizer %s (%s); counting tokens with tiktoken", name, e)
+        return get_tokenizer()
+    return partial(tokenizer.encode, add_special_tokens=False)
@@ -0,0 +1 @@
+from ragbot.memory.conversation_memory import ConversationMemory
\ No newline at end of file
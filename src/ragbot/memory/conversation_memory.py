@@ -0,0 +1,182 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable, List, Optional
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.llms import LLM
+from llama_index.core.prompts import PromptTemplate
+from llama_index.core.settings import Settings
+
+from ragbot.observability.metrics import timed
+from ragbot.prompts import CONVERSATION_SUMMARY_PROMPT
+
+# Tokens of recent turns kept verbatim in the prompt; older turns are summarized
+MEMORY_TOKEN_LIMIT = 512
+# Length the running summary is asked to stay within
+SUMMARY_MAX_WORDS = 120
+# Tokens of earlier questions put in front of a follow-up to retrieve with
+QUERY_CONTEXT_TOKENS = 64
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Turn:
+    question: str
+    answer: str
+    tokens: int
+
+    def messages(self) -> List[ChatMessage]:
+        return [
+            ChatMessage(role=MessageRole.USER, content=self.question),
+            ChatMessage(role=MessageRole.ASSISTANT, content=self.answer),
+        ]
+
+
+class ConversationMemory:
+    """
+    One conversation: its recent turns verbatim and a summary of the rest.
+
+    ``record`` adds a turn once its answer has been streamed. When the
+    recent turns exceed ``token_limit`` tokens, the oldest ones are moved
+    out, all but the latest turn if need be, and summarized by ``llm``
+    (``Settings.llm`` by default) in a background thread, so no answer
+    waits for a summary. Turns waiting to be summarized are still returned
+    by ``messages``. Without a ``token_limit`` nothing is summarized.
+    """
+
+    def __init__(
+        self,
+        token_limit: Optional[int] = MEMORY_TOKEN_LIMIT,
+        llm: Optional[LLM] = None,
+        tokenizer: Optional[Callable[[str], List]] = None,
+        summary_max_words: int = SUMMARY_MAX_WORDS,
+        query_context_tokens: int = QUERY_CONTEXT_TOKENS,
+    ):
+        self.token_limit = token_limit
+        self.summary_max_words = summary_max_words
+        self.query_context_tokens = query_context_tokens
+        self._llm = llm
+        self._tokenizer = tokenizer
+        self._summary_prompt = PromptTemplate(CONVERSATION_SUMMARY_PROMPT)
+        self._lock = threading.Lock()
+        self._summary = ""
+        self._summary_tokens = 0
+        # Moved out of the recent turns, oldest first, not yet in the summary
+        self._pending: List[Turn] = []
+        self._recent: List[Turn] = []
+        self._summarizer: Optional[threading.Thread] = None
+        self._idle = threading.Event()
+        self._idle.set()
+        self.summarized_turns = 0
+
+    def __len__(self) -> int:
+        """Turns so far, summarized or not."""
+        with self._lock:
+            return self.summarized_turns + len(self._pending) + len(self._recent)
+
+    def count_tokens(self, text: str) -> int:
+        return len((self._tokenizer or Settings.tokenizer)(text))
+
+    @property
+    def summary(self) -> str:
+        with self._lock:
+            return self._summary
+
+    @property
+    def tokens(self) -> int:
+        """Tokens of the summary and the turns ``messages`` returns."""
+        with self._lock:
+            return self._summary_tokens + sum(turn.tokens for turn in (*self._pending, *self._recent))
+
+    def messages(self) -> List[ChatMessage]:
+        """The turns not in the summary, oldest first, as user and assistant messages."""
+        with self._lock:
+            turns = [*self._pending, *self._recent]
+        return [message for turn in turns for message in turn.messages()]
+
+    def standalone_query(self, question: str) -> str:
+        """
+        ``question`` with the latest earlier questions in front, to retrieve with.
+
+        A follow-up like "what about fruit?" retrieves little by itself;
+        the questions before it say what it is about.
+        """
+        with self._lock:
+            earlier = [turn.question for turn in reversed([*self._pending, *self._recent])]
+        context: List[str] = []
+        used = 0
+        for previous in earlier:
+            used += self.count_tokens(previous)
+            if context and used > self.query_context_tokens:
+                break
+            context.insert(0, previous)
+        return " ".join([*context, question])
+
+    def put(self, question: str, answer: str) -> None:
+        """Add a finished turn, summarizing the oldest turns if the recent ones are over the limit."""
+        turn = Turn(question, answer, self.count_tokens(question) + self.count_tokens(answer))
+        with self._lock:
+            self._recent.append(turn)
+            if self.token_limit is None:
+                return
+            total = sum(t.tokens for t in self._recent)
+            while len(self._recent) > 1 and total > self.token_limit:
+                oldest = self._recent.pop(0)
+                self._pending.append(oldest)
+                total -= oldest.tokens
+            if not self._pending or self._summarizer is not None:
+                return
+            self._idle.clear()
+            self._summarizer = threading.Thread(target=self._summarize_pending, daemon=True)
+            self._summarizer.start()
+
+    def record(
+        self,
+        question: str,
+        stream: AsyncGenerator[ChatResponse, None],
+    ) -> AsyncGenerator[ChatResponse, None]:
+        """Wrap an answer stream so the turn is added once it was fully consumed."""
+
+        async def _recording_stream():
+            deltas = []
+            async for response in stream:
+                deltas.append(response.delta or "")
+                yield response
+            self.put(question, "".join(deltas))
+
+        return _recording_stream()
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> bool:
+        """Block until no turns are waiting to be summarized; False on timeout."""
+        return self._idle.wait(timeout)
+
+    def _summarize_pending(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._summarizer = None
+                    self._idle.set()
+                    return
+                summary, turns = self._summary, list(self._pending)
+            try:
+                with timed("summarize"):
+                    summary = self._summarize(summary, turns)
+            except Exception:
+                # Drop the turns rather than let the prompt grow without bound
+                logger.exception("Could not summarize %d conversation turns", len(turns))
+            summary_tokens = self.count_tokens(summary)
+            with self._lock:
+                self._summary, self._summary_tokens = summary, summary_tokens
+                del self._pending[:len(turns)]
+                self.summarized_turns += len(turns)
+
+    def _summarize(self, summary: str, turns: List[Turn]) -> str:
+        prompt = self._summary_prompt.format(
+            max_words=self.summary_max_words,
+            summary=summary or "(none)",
+            turns="\n".join(f"User: {turn.question}\nAssistant: {turn.answer}" for turn in turns),
+        )
+        response = (self._llm or Settings.llm).chat([ChatMessage(role=MessageRole.USER, content=prompt)])
+        return (response.message.content or "").strip()
@@ -0,0 +1,194 @@
+"""
+Prompt tokens and latency per turn, with and without conversation memory.
+
+Indexes the FAQ with the last paraphrase of each entry held out, then
+runs ``--conversations`` conversations of ``--turns`` held-out questions
+through ``RAGWorkflow`` with the streaming LLM stand-in, three ways:
+without memory, with the whole history in every prompt, and with
+``ConversationMemory`` limited to ``--token-limit`` tokens. Every turn
+calls the LLM. Reports the prompt tokens per turn, time to first token,
+and the time memory adds: building its messages, retrieving again with
+earlier questions, and summarizing. Summaries are waited for after each
+turn, outside its timing, so the next turn sees them. Run with:
+
+    python -m ragbot.memory.memory_benchmark --turns 12 --token-limit 256
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.settings import Settings
+
+from ragbot.llms import build_mock_llm
+from ragbot.llms.mock_llm import MOCK_NUM_TOKENS, MOCK_TOKEN_DELAY_SECONDS, MOCK_TTFT_SECONDS
+from ragbot.memory.conversation_memory import MEMORY_TOKEN_LIMIT, ConversationMemory
+from ragbot.observability import METRICS
+from ragbot.resources import SharedResources
+from ragbot.workflows.rag_benchmark import FAQ_DATA_PATH, Query, build_eval_index, percentiles_ms, split_faq
+from ragbot.workflows.rag_workflow import RAGWorkflow
+
+MODES = ("none", "full", "memory")
+MEMORY_STAGES = ("memory_messages", "memory_retrieve", "summarize")
+
+
+@dataclass
+class MemoryReport:
+    mode: str
+    conversations: int
+    turns: int
+    mean_prompt_tokens: float
+    max_prompt_tokens: int
+    # Mean over conversations, by turn
+    prompt_tokens_by_turn: List[float]
+    mrr: float
+    no_result_rate: float
+    # {"ttft" | "end_to_end" | "stage:<name>": {"p50": ms, ...}}
+    latency_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+def build_memory(mode: str, token_limit: int) -> Optional[ConversationMemory]:
+    if mode == "none":
+        return None
+    return ConversationMemory(token_limit=None if mode == "full" else token_limit)
+
+
+async def run_conversation(
+    workflow: RAGWorkflow,
+    conversation: Sequence[Query],
+    memory: Optional[ConversationMemory],
+    stage_seconds: Dict[str, List[float]],
+) -> List[dict]:
+    turns = []
+    for question, answer in conversation:
+        with METRICS.record_samples() as samples:
+            start = time.perf_counter()
+            ttft = None
+            stream, sources = await workflow.run(question=question, memory=memory)
+            async for _ in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+            seconds = time.perf_counter() - start
+            if memory is not None:
+                memory.wait_for_summary()
+        for stage, values in samples.get("ragbot_stage_seconds", {}).items():
+            if stage in MEMORY_STAGES:
+                stage_seconds.setdefault(stage, []).extend(values)
+        rank = next(
+            (i for i, source in enumerate(sources, start=1) if source.metadata.get("answer") == answer),
+            None,
+        )
+        turns.append({
+            "prompt_tokens": sum(samples.get("ragbot_context_tokens", {}).get("prompt", [])),
+            "ttft": ttft,
+            "seconds": seconds,
+            "rank": rank,
+            "no_result": not sources,
+        })
+    return turns
+
+
+async def benchmark(
+    workflow: RAGWorkflow,
+    conversations: Sequence[Sequence[Query]],
+    token_limit: int,
+) -> List[MemoryReport]:
+    # Load models outside of the measured runs
+    await run_conversation(workflow, conversations[0][:1], None, {})
+    reports = []
+    for mode in MODES:
+        stage_seconds: Dict[str, List[float]] = {}
+        runs = [
+            await run_conversation(workflow, conversation, build_memory(mode, token_limit), stage_seconds)
+            for conversation in conversations
+        ]
+        turns = [turn for run in runs for turn in run]
+        tokens = np.array([[turn["prompt_tokens"] for turn in run] for run in runs], dtype=np.float64)
+        latency = {
+            "ttft": percentiles_ms([turn["ttft"] for turn in turns if turn["ttft"] is not None]),
+            "end_to_end": percentiles_ms([turn["seconds"] for turn in turns]),
+        }
+        for stage in MEMORY_STAGES:
+            if stage in stage_seconds:
+                latency[f"stage:{stage}"] = percentiles_ms(stage_seconds[stage])
+        reports.append(MemoryReport(
+            mode=mode,
+            conversations=len(runs),
+            turns=len(turns),
+            mean_prompt_tokens=float(tokens.mean()),
+            max_prompt_tokens=int(tokens.max()),
+            prompt_tokens_by_turn=tokens.mean(axis=0).tolist(),
+            mrr=sum(1 / turn["rank"] for turn in turns if turn["rank"] is not None) / len(turns),
+            no_result_rate=sum(turn["no_result"] for turn in turns) / len(turns),
+            latency_ms=latency,
+        ))
+    return reports
+
+
+def print_reports(reports: Sequence[MemoryReport]) -> None:
+    print(f"{'mode':<8}{'tokens':>8}{'max':>7}{'last':>7}{'MRR':>7}{'none':>7}{'TTFT p50':>10}{'p95 ms':>8}")
+    for r in reports:
+        ttft = r.latency_ms["ttft"]
+        print(
+            f"{r.mode:<8}{r.mean_prompt_tokens:>8.0f}{r.max_prompt_tokens:>7}{r.prompt_tokens_by_turn[-1]:>7.0f}"
+            f"{r.mrr:>7.3f}{r.no_result_rate:>7.3f}{ttft['p50']:>10.1f}{ttft['p95']:>8.1f}"
+        )
+    print("\nPrompt tokens by turn:")
+    print(f"{'turn':>6}" + "".join(f"{r.mode:>8}" for r in reports))
+    for turn in range(len(reports[0].prompt_tokens_by_turn)):
+        print(f"{turn + 1:>6}" + "".join(f"{r.prompt_tokens_by_turn[turn]:>8.0f}" for r in reports))
+    print("\nTime memory adds (ms):")
+    for r in reports:
+        for name, stats in r.latency_ms.items():
+            if name.startswith("stage:"):
+                print(f"  {r.mode:<8}{name[6:]:<18}p50 {stats['p50']:>8.2f}  p95 {stats['p95']:>8.2f}  n {stats['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens and latency per turn with and without memory.")
+    parser.add_argument("--data", type=Path, default=Path(FAQ_DATA_PATH), help="FAQ JSON file.")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=12, help="Questions per conversation.")
+    parser.add_argument("--token-limit", type=int, default=MEMORY_TOKEN_LIMIT, help="Memory tokens kept verbatim.")
+    parser.add_argument("--ttft", type=float, default=MOCK_TTFT_SECONDS, help="Mock LLM seconds to first token.")
+    parser.add_argument("--token-delay", type=float, default=MOCK_TOKEN_DELAY_SECONDS, help="Mock LLM seconds per token.")
+    parser.add_argument("--tokens", type=int, default=MOCK_NUM_TOKENS, help="Mock LLM tokens per answer.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        train, queries = split_faq(json.load(f))
+    rng = np.random.default_rng(args.seed)
+    conversations = [
+        [queries[i] for i in rng.choice(len(queries), size=args.turns, replace=args.turns > len(queries))]
+        for _ in range(args.conversations)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        resources = SharedResources(persist_dir=Path(tmp))
+        resources.ensure_settings()
+        Settings.llm = build_mock_llm(args.ttft, args.token_delay, args.tokens)
+        build_eval_index(train, Path(tmp))
+        workflow = RAGWorkflow(
+            timeout=None,
+            verbose=False,
+            resources=resources,
+            use_cache=False,
+            direct_answer_threshold=None,
+        )
+        reports = asyncio.run(benchmark(workflow, conversations, args.token_limit))
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+    print_reports(reports)
+
+
+if __name__ == "__main__":
+    main()
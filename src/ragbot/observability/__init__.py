@@ -0,0 +1 @@
+from ragbot.observability.metrics import METRICS, MetricsRegistry, Histogram, timed
\ No newline at end of file
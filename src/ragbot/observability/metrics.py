@@ -0,0 +1,244 @@
+"""
+Dependency-free latency histograms, exposed in the Prometheus text format.
+
+Stages are timed with ``timed``; ``METRICS.render()`` returns the text a
+Prometheus server scrapes, e.g. from ``GET /metrics`` of the ASGI app.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncGenerator, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from a cache hit to a slow LLM answer
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 40, 80, 160, 320, 640)
+# Model loads and index loads, once per process
+STARTUP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one label."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], label_name: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_name = label_name
+        self._lock = threading.Lock()
+        # label value -> (bucket counts incl. +Inf, sum)
+        self._series: Dict[Optional[str], Tuple[List[int], List[float]]] = {}
+        # Raw observations per label, kept only while a benchmark records them
+        self._samples: Optional[Dict[Optional[str], List[float]]] = None
+
+    def observe(self, value: float, label: Optional[str] = None) -> None:
+        bucket = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._series.setdefault(label, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bucket] += 1
+            total[0] += value
+            if self._samples is not None:
+                self._samples.setdefault(label, []).append(value)
+
+    def stats(self) -> Dict[Optional[str], Dict[str, float]]:
+        """Count, mean and bucket-estimated p50/p95 per label value."""
+        with self._lock:
+            series = {label: (list(counts), total[0]) for label, (counts, total) in self._series.items()}
+        return {
+            label: {
+                "count": sum(counts),
+                "mean": total / sum(counts) if sum(counts) else 0.0,
+                "p50": self._quantile(counts, 0.5),
+                "p95": self._quantile(counts, 0.95),
+            }
+            for label, (counts, total) in series.items()
+        }
+
+    def _quantile(self, counts: List[int], q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, like ``histogram_quantile``."""
+        rank, seen = q * sum(counts), 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                ((label, list(counts), total[0]) for label, (counts, total) in self._series.items()),
+                key=lambda item: item[0] or "",
+            )
+        for label, counts, total in series:
+            base = [(self.label_name, label)] if self.label_name and label is not None else []
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(base + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(base)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(base)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named histograms plus callbacks that contribute counters at render time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Tuple[str, str, Callable[[], Mapping[str, float]]]] = {}
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        label_name: Optional[str] = None,
+    ) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, documentation, buckets, label_name)
+            return self._histograms[name]
+
+    def counter_callback(
+        self,
+        name: str,
+        documentation: str,
+        label_name: str,
+        read: Callable[[], Mapping[str, float]],
+    ) -> None:
+        """Render ``read()``, a mapping of label value to count, as a counter."""
+        with self._lock:
+            self._counters[name] = (documentation, label_name, read)
+
+    @contextmanager
+    def record_samples(self) -> Iterator[Dict[str, Dict[Optional[str], List[float]]]]:
+        """
+        Keep every observation made inside the ``with`` block.
+
+        Yields a dict that is filled on exit with ``{metric: {label: [values]}}``,
+        for exact percentiles where bucket estimates are too coarse.
+        """
+        with self._lock:
+            histograms = list(self._histograms.values())
+        for histogram in histograms:
+            with histogram._lock:
+                histogram._samples = {}
+        samples: Dict[str, Dict[Optional[str], List[float]]] = {}
+        try:
+            yield samples
+        finally:
+            for histogram in histograms:
+                with histogram._lock:
+                    samples[histogram.name], histogram._samples = histogram._samples, None
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = list(self._histograms.values())
+            counters = list(self._counters.items())
+        lines = []
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        for name, (documentation, label_name, read) in counters:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} counter")
+            for label, value in sorted(read().items()):
+                lines.append(f"{name}{_labels([(label_name, label)])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "ragbot_stage_seconds",
+    "Latency of each pipeline stage: cache lookups, embedding, search, post-processing, prompt building.",
+    label_name="stage",
+)
+STEP_SECONDS = METRICS.histogram(
+    "ragbot_workflow_step_seconds",
+    "Time spent in each RAGWorkflow step.",
+    label_name="step",
+)
+LLM_TTFT_SECONDS = METRICS.histogram(
+    "ragbot_llm_time_to_first_token_seconds",
+    "Time from starting an LLM call to its first streamed token.",
+)
+LLM_MODEL_TTFT_SECONDS = METRICS.histogram(
+    "ragbot_llm_model_time_to_first_token_seconds",
+    "Time from sending a request to a model to its first streamed token, for requests that won the race.",
+    label_name="model",
+)
+LLM_TOKENS_PER_SECOND = METRICS.histogram(
+    "ragbot_llm_tokens_per_second",
+    "LLM output tokens per second after the first token.",
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+CONTEXT_TOKENS = METRICS.histogram(
+    "ragbot_context_tokens",
+    "Tokens of packed context, of context saved by packing, of conversation memory, and of the whole prompt sent to the LLM.",
+    buckets=TOKEN_BUCKETS,
+    label_name="part",
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "ragbot_request_seconds",
+    "End-to-end HTTP request latency, up to the last streamed token.",
+    label_name="status",
+)
+STARTUP_SECONDS = METRICS.histogram(
+    "ragbot_startup_seconds",
+    "Time to build each model and load each part of the index.",
+    buckets=STARTUP_BUCKETS,
+    label_name="component",
+)
+
+
+@contextmanager
+def timed(label: str, histogram: Histogram = STAGE_SECONDS) -> Iterator[None]:
+    """Observe the wall time of the ``with`` block, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, label)
+
+
+async def instrument_llm_stream(
+    stream: AsyncGenerator,
+    started: float,
+    count_tokens: Callable[[str], int],
+) -> AsyncGenerator:
+    """Pass ``stream`` through, recording time to first token and output tokens/sec."""
+    first_token_at = None
+    text = []
+    try:
+        async for chunk in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                LLM_TTFT_SECONDS.observe(first_token_at - started)
+            text.append(chunk.delta or "")
+            yield chunk
+    finally:
+        await stream.aclose()
+    # Only streams that ran to the end tell the generation rate
+    elapsed = time.perf_counter() - first_token_at if first_token_at is not None else 0.0
+    if elapsed > 0:
+        LLM_TOKENS_PER_SECOND.observe(count_tokens("".join(text)) / elapsed)
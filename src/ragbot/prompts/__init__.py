@@ -1,4 +1,7 @@
 from ragbot.prompts.default_prompt import (
+    CONVERSATION_SUMMARY_PROMPT,
+    CONVERSATION_SUMMARY_SECTION,
     DIABETES_FAQ_RAG_SYSTEM_PROMPT,
     NO_FAQ_RESULT_SYSTEM_PROMPT,
-)
\ No newline at end of file
+)
+from ragbot.prompts.context_packer import ContextPacker, PackedContext
\ No newline at end of file
@@ -0,0 +1,121 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.settings import Settings
+
+from ragbot.retrievers.answer_group_retriever import answer_group_key
+
+# Tokens of FAQ context per prompt, if the LLM's window leaves room for it
+CONTEXT_TOKEN_BUDGET = 1024
+# An answer cut below this many tokens is left out rather than truncated
+MIN_TRUNCATED_ANSWER_TOKENS = 16
+
+ENTRY_SEPARATOR = "\n\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def format_entry(idx: int, question: str, answer: Optional[str]) -> str:
+    return f"Q{idx}. {question}\n A{idx}. {answer}"
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    # Tokens the unbounded context would have had
+    unpacked_tokens: int
+    entries: int
+    truncated: int
+    dropped: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.unpacked_tokens - self.tokens
+
+
+class ContextPacker:
+    """
+    Packs retrieved FAQ entries into a token budget for the synthesis prompt.
+
+    Entries are taken in rank order, one per distinct answer, and added
+    whole while they fit. An entry that doesn't fit has its answer cut at
+    the last sentence boundary that fits; entries that can't keep at least
+    ``min_answer_tokens`` of their answer are dropped, and later, shorter
+    ones may still fit. Tokens are counted per entry with ``tokenizer``,
+    ``Settings.tokenizer`` by default.
+    """
+
+    def __init__(
+        self,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        tokenizer: Optional[Callable[[str], List]] = None,
+        min_answer_tokens: int = MIN_TRUNCATED_ANSWER_TOKENS,
+    ):
+        self.budget = budget
+        self._tokenizer = tokenizer
+        self.min_answer_tokens = min_answer_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len((self._tokenizer or Settings.tokenizer)(text))
+
+    def pack(self, results: Sequence[NodeWithScore], budget: Optional[int] = None) -> PackedContext:
+        budget = self.budget if budget is None else min(budget, self.budget)
+        separator_tokens = self.count_tokens(ENTRY_SEPARATOR)
+        entries: List[str] = []
+        used = unpacked = unique = truncated = dropped = 0
+        seen_answers = set()
+        for result in results:
+            group = answer_group_key(result)
+            if group in seen_answers:
+                continue
+            seen_answers.add(group)
+            question, answer = result.text, result.metadata.get("answer")
+            idx = len(entries) + 1
+            entry = format_entry(idx, question, answer)
+            entry_tokens = self.count_tokens(entry)
+            unpacked += entry_tokens + (separator_tokens if unique else 0)
+            unique += 1
+
+            overhead = separator_tokens if entries else 0
+            available = budget - used - overhead
+            if entry_tokens > available:
+                cut = self._truncate(idx, question, answer, available)
+                if cut is None:
+                    dropped += 1
+                    continue
+                entry, entry_tokens = cut
+                truncated += 1
+            entries.append(entry)
+            used += entry_tokens + overhead
+        return PackedContext(
+            text=ENTRY_SEPARATOR.join(entries),
+            tokens=used,
+            unpacked_tokens=unpacked,
+            entries=len(entries),
+            truncated=truncated,
+            dropped=dropped,
+        )
+
+    def _truncate(self, idx: int, question: str, answer: Optional[str], available: int) -> Optional[Tuple[str, int]]:
+        """The entry with the longest sentence prefix of ``answer`` that fits, and its tokens."""
+        head_tokens = self.count_tokens(format_entry(idx, question, ""))
+        if available - head_tokens < self.min_answer_tokens:
+            return None
+        sentences = split_sentences(answer or "")
+        best = None
+        for end in range(1, len(sentences)):
+            entry = format_entry(idx, question, " ".join(sentences[:end]))
+            tokens = self.count_tokens(entry)
+            if tokens > available:
+                break
+            best = (entry, tokens)
+        if best is None or best[1] - head_tokens < self.min_answer_tokens:
+            return None
+        return best
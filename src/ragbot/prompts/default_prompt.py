@@ -49,4 +49,26 @@ further assistance."
 - Do not make up answers or provide general knowledge.
 
 Always follow these instructions exactly.
-"""
\ No newline at end of file
+"""
+
+# Appended to the system prompt once older turns have been summarized
+CONVERSATION_SUMMARY_SECTION = """
+Summary of the earlier conversation with the user:
+{summary}
+"""
+
+
+CONVERSATION_SUMMARY_PROMPT = """
+Summarize the conversation between a user and a diabetes FAQ assistant \
+below, so the assistant can answer follow-up questions.
+
+Keep the topics the user asked about, facts the user shared about \
+themselves, and the key points of the answers. Write plain sentences, \
+at most {max_words} words, without any preamble.
+
+Summary so far:
+{summary}
+
+New turns:
+{turns}
+"""
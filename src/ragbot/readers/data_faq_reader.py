@@ -1,45 +1,188 @@
+import hashlib
+import itertools
 import json
-from typing import List
+import re
+from typing import Any, Dict, Iterator, List
 from llama_index.core import Document
 from llama_index.core.schema import MediaResource
 from llama_index.core.readers.base import BaseReader
 
+from ragbot.transformations import clean_text
+
+ANSWER_KEY = "answer"
+ANSWER_ID_KEY = "answer_id"
+# Characters read per step when streaming a JSON array
+STREAM_CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_STRUCTURAL = re.compile(r'["\[\]{},]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_DELIMITER = re.compile(r'\s*[,\]]')
+
 
 def is_json_file(file_path: str) -> bool:
     """Check if the given file is a JSON file by extension."""
     return isinstance(file_path, str) and file_path.lower().endswith('.json')
 
-def load_json(file_path: str):
-    """Load and return data from a JSON file."""
-    if not is_json_file(file_path):
-        raise ValueError("Provided file is not a JSON file.")
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        raise ValueError(f"Failed to load JSON file: {e}")
+def is_jsonl_file(file_path: str) -> bool:
+    """Check if the given file is a JSON Lines file by extension."""
+    return isinstance(file_path, str) and file_path.lower().endswith('.jsonl')
+
+def answer_group_id(answer: str) -> str:
+    """Stable id shared by every paraphrase that carries the same answer."""
+    return hashlib.sha1(clean_text(answer).encode("utf-8")).hexdigest()[:16]
+
+def question_doc_id(question: str, answer: str) -> str:
+    """Deterministic doc id from the content that gets embedded and answered."""
+    content = f"{question}\x1f{answer}".encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+def iter_json_array(f, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the items of a top-level JSON array one at a time.
+
+    Only the item being parsed and one read chunk are held in memory. An
+    item that doesn't parse in the buffer is read up to the ',' or ']'
+    that ends it, so an invalid item is reported as soon as it was read.
+    """
+    buffer = ""
+    pos = 0
+
+    def fill() -> bool:
+        nonlocal buffer, pos
+        chunk = f.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return bool(chunk)
+
+    def more(i: int) -> int:
+        """Read the next chunk; returns ``i`` in the refilled buffer."""
+        shift = pos
+        if not fill():
+            raise ValueError("Unexpected end of file inside JSON array.")
+        return i - shift
+
+    def skip_whitespace() -> bool:
+        """Move to the next non-whitespace character; False at the end of the file."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return True
+            if not fill():
+                return False
+
+    def item_end() -> int:
+        """Index of the ',' or ']' after the item at ``pos``, outside strings and nested values."""
+        i, depth, in_string = pos, 0, False
+        while True:
+            match = (_STRING_SPECIAL if in_string else _STRUCTURAL).search(buffer, i)
+            if match is None:
+                i = more(len(buffer))
+                continue
+            i = match.start()
+            char = buffer[i]
+            if in_string:
+                if char == "\\":
+                    if i + 1 == len(buffer):
+                        i = more(i)
+                        continue
+                    i += 1
+                else:
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif char in "]}" and depth:
+                depth -= 1
+            elif char != "}" and not depth:
+                return i
+            i += 1
+
+    if not skip_whitespace() or buffer[pos] != "[":
+        raise ValueError("Expected a JSON array at the top level.")
+    pos += 1
+    if not skip_whitespace():
+        raise ValueError("Unexpected end of file inside JSON array.")
+    if buffer[pos] == "]":
+        pos += 1
+    else:
+        for index in itertools.count():
+            if not skip_whitespace():
+                raise ValueError("Unexpected end of file inside JSON array.")
+            # Fast path: a value followed by ',' or ']' is the whole item
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+                delimiter = _DELIMITER.match(buffer, end)
+            except json.JSONDecodeError:
+                delimiter = None
+            if delimiter is not None:
+                end = delimiter.end() - 1
+            else:
+                # Cut off by the end of the buffer, or invalid: read the whole item
+                end = item_end()
+                try:
+                    # Empty for "[1,]" or "[1,,2]", which is an error too
+                    item = _decoder.decode(buffer[pos:end])
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON in array item {index}: {e}") from e
+            yield item
+            pos = end + 1
+            if buffer[end] == "]":
+                break
+    if skip_whitespace():
+        raise ValueError("Unexpected data after the JSON array.")
+
+def iter_jsonl(f) -> Iterator[Any]:
+    """Yield one JSON value per non-empty line."""
+    for line_number, line in enumerate(f, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+
+def iter_json_items(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Stream FAQ items from a JSON array or JSON Lines file."""
+    if is_jsonl_file(file_path):
+        parse = iter_jsonl
+    elif is_json_file(file_path):
+        parse = iter_json_array
+    else:
+        raise ValueError("Provided file is not a JSON or JSON Lines file.")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from parse(f)
 
 class DataFAQReader(BaseReader):
+    """
+    One Document per question in a FAQ JSON array or JSON Lines file.
+
+    The answer and its id are metadata. Only the question is embedded.
+    """
+
     def load_data(self, file, extra_info = None):
-        documents = []
-        data = load_json(str(file))
+        return list(self.lazy_load_data(file, extra_info))
+
+    def lazy_load_data(self, file, extra_info = None) -> Iterator[Document]:
+        """Yield Documents while streaming the file, without loading it whole."""
         extra_info = extra_info or {}
 
-        for item in data:
+        for item in iter_json_items(str(file)):
             questions = item.get("questions", [])
             answer = item.get("answer", "")
             doc_info = {
                 **extra_info,
-                "answer": answer,
+                ANSWER_KEY: answer,
+                ANSWER_ID_KEY: answer_group_id(answer),
             }
             
             for question in questions:
-                documents.append(
-                    Document(
-                        text_resource = MediaResource(text=question),
-                        extra_info=doc_info
-                    )
+                yield Document(
+                    id_=question_doc_id(question, answer),
+                    text_resource = MediaResource(text=question),
+                    extra_info=doc_info,
+                    excluded_embed_metadata_keys=list(doc_info),
+                    excluded_llm_metadata_keys=[ANSWER_KEY, ANSWER_ID_KEY],
                 )
-        
-        return documents
 
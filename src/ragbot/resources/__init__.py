@@ -0,0 +1,7 @@
+from ragbot.resources.shared_resources import SharedResources, get_shared_resources
+from ragbot.resources.index_registry import (
+    DEFAULT_CORPUS,
+    IndexRegistry,
+    UnknownCorpusError,
+    get_index_registry,
+)
\ No newline at end of file
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.settings import Settings
+
+from ragbot.embeddings import build_batched_embeddings
+from ragbot.observability import METRICS
+from ragbot.resources.shared_resources import SharedResources, ensure_settings, get_shared_resources
+
+# Corpus served when a request names none, from ragbot.storage.PERSIST_DIR
+DEFAULT_CORPUS = "default"
+# Every other corpus is indexed into its own directory here, e.g.
+# `python ingest.py --corpus de --data-dir ./data/de` writes ./corpora/de
+CORPORA_DIR = Path("./corpora")
+# Indexes kept loaded besides the default one, by their size on disk.
+# The least recently used are unloaded first.
+MAX_LOADED_INDEX_BYTES = 2 * 1024 ** 3
+
+_CORPUS_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownCorpusError(KeyError):
+    """Raised for a corpus that is neither registered nor indexed under the corpora directory."""
+
+
+def corpus_dir(corpus: str, corpora_dir: Path = CORPORA_DIR) -> Path:
+    """Persist directory of ``corpus`` under ``corpora_dir``."""
+    # Corpus names come from requests, never let them escape the directory
+    if not _CORPUS_NAME.match(corpus) or corpus.endswith("_versions"):
+        raise UnknownCorpusError(corpus)
+    return corpora_dir / corpus
+
+
+def estimate_index_bytes(persist_dir: Path) -> int:
+    """Size of the persisted index files, a proxy for its memory once loaded."""
+    return sum(path.stat().st_size for path in persist_dir.iterdir() if path.is_file())
+
+
+class IndexRegistry:
+    """
+    Maps corpus names to indexes and keeps the recently used ones loaded.
+
+    The default corpus is the ``default`` resources and is always loaded.
+    Any other corpus is either registered with ``register`` or found as a
+    directory under ``corpora_dir``, and is loaded into its own
+    ``SharedResources`` on first ``get``. All corpora share the process's
+    models. Once the loaded indexes exceed ``max_loaded_bytes`` on disk,
+    the least recently used ones are dropped from the registry; requests
+    still using them finish first, then they are freed.
+    """
+
+    def __init__(
+        self,
+        default: Optional[SharedResources] = None,
+        corpora_dir: Path = CORPORA_DIR,
+        max_loaded_bytes: int = MAX_LOADED_INDEX_BYTES,
+    ):
+        self.default = default or SharedResources()
+        self.corpora_dir = corpora_dir
+        self.max_loaded_bytes = max_loaded_bytes
+        self._lock = threading.Lock()
+        self._corpora: Dict[str, Path] = {}
+        # corpus -> (resources, estimated bytes), least recently used first
+        self._loaded: "OrderedDict[str, Tuple[SharedResources, int]]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._batching: Optional[Dict[str, Any]] = None
+        self._batched_embed_model: Optional[BaseEmbedding] = None
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, corpus: str, persist_dir: Path) -> None:
+        """Serve ``corpus`` from ``persist_dir`` instead of the corpora directory."""
+        if corpus == DEFAULT_CORPUS:
+            raise ValueError(f"{DEFAULT_CORPUS!r} is served from the default resources")
+        corpus_dir(corpus)
+        with self._lock:
+            self._corpora[corpus] = persist_dir
+
+    def corpora(self) -> List[str]:
+        """Names of every corpus that can be served."""
+        found = set()
+        if self.corpora_dir.is_dir():
+            for path in self.corpora_dir.iterdir():
+                if path.is_dir() and _CORPUS_NAME.match(path.name) and not path.name.endswith("_versions"):
+                    found.add(path.name)
+        with self._lock:
+            found.update(self._corpora)
+        return [DEFAULT_CORPUS, *sorted(found - {DEFAULT_CORPUS})]
+
+    def persist_dir_for(self, corpus: str) -> Path:
+        with self._lock:
+            persist_dir = self._corpora.get(corpus)
+        if persist_dir is None:
+            persist_dir = corpus_dir(corpus, self.corpora_dir)
+        if not persist_dir.is_dir():
+            raise UnknownCorpusError(corpus)
+        return persist_dir
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return [DEFAULT_CORPUS, *self._loaded]
+
+    def get(self, corpus: Optional[str] = None) -> SharedResources:
+        """Resources of ``corpus``, loading its index if it isn't loaded. Blocks while loading."""
+        resources = self._lookup(corpus)
+        if resources is not None:
+            return resources
+        persist_dir = self.persist_dir_for(corpus)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(corpus, threading.Lock())
+        # One load per corpus at a time; other corpora stay available meanwhile
+        with load_lock:
+            resources = self._lookup(corpus)
+            if resources is not None:
+                return resources
+            resources = SharedResources(persist_dir=persist_dir)
+            with self._lock:
+                batching, embed_model = self._batching, self._batched_embed_model
+            if batching is not None:
+                resources.enable_query_batching(embed_model=embed_model, **batching)
+            # Load the index here, not in the request that first needs it
+            resources.index
+            size = estimate_index_bytes(persist_dir)
+            with self._lock:
+                self._loaded[corpus] = (resources, size)
+                self.loads += 1
+                evicted = self._evict(keep=corpus)
+        logger.info("Loaded corpus %r from %s (%d bytes)", corpus, persist_dir, size)
+        for name in evicted:
+            logger.info("Unloaded corpus %r", name)
+        return resources
+
+    async def aget(self, corpus: Optional[str] = None) -> SharedResources:
+        """Like ``get``, but loads in a worker thread."""
+        resources = self._lookup(corpus)
+        if resources is not None:
+            return resources
+        return await asyncio.to_thread(self.get, corpus)
+
+    def enable_query_batching(self, **batcher_kwargs: Any) -> None:
+        """Micro-batch queries of every corpus, with one shared query embedding batcher."""
+        ensure_settings()
+        embed_model = build_batched_embeddings(Settings.embed_model, **batcher_kwargs)
+        with self._lock:
+            self._batching = batcher_kwargs
+            self._batched_embed_model = embed_model
+            resources = [self.default, *(entry[0] for entry in self._loaded.values())]
+        for r in resources:
+            r.enable_query_batching(embed_model=embed_model, **batcher_kwargs)
+
+    def reload_if_stale(self) -> List[str]:
+        """Reload every loaded corpus ingest published a newer version of; returns their names."""
+        with self._lock:
+            loaded = [(DEFAULT_CORPUS, self.default), *((name, entry[0]) for name, entry in self._loaded.items())]
+        return [name for name, resources in loaded if resources.reload_if_stale()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": [DEFAULT_CORPUS, *self._loaded],
+                "loaded_bytes": sum(size for _, size in self._loaded.values()),
+                "max_loaded_bytes": self.max_loaded_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def _lookup(self, corpus: Optional[str]) -> Optional[SharedResources]:
+        if corpus is None or corpus == DEFAULT_CORPUS:
+            return self.default
+        with self._lock:
+            entry = self._loaded.get(corpus)
+            if entry is None:
+                return None
+            self._loaded.move_to_end(corpus)
+            self.hits += 1
+            return entry[0]
+
+    def _evict(self, keep: str) -> List[str]:
+        """Drop least recently used corpora until the rest fit; call with the lock held."""
+        evicted = []
+        total = sum(size for _, size in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.max_loaded_bytes:
+                break
+            # The corpus just loaded stays, even if it alone is over budget
+            if name == keep:
+                continue
+            _, size = self._loaded.pop(name)
+            total -= size
+            self.evictions += 1
+            evicted.append(name)
+        return evicted
+
+
+_index_registry: Optional[IndexRegistry] = None
+_index_registry_lock = threading.Lock()
+
+
+def get_index_registry() -> IndexRegistry:
+    """Return the process-wide ``IndexRegistry``, serving the shared resources as the default corpus."""
+    global _index_registry
+    if _index_registry is None:
+        with _index_registry_lock:
+            if _index_registry is None:
+                registry = IndexRegistry(default=get_shared_resources())
+                METRICS.counter_callback(
+                    "ragbot_index_registry_events_total",
+                    "Corpus lookups served from a loaded index, index loads and evictions.",
+                    "event",
+                    lambda: {"hit": registry.hits, "load": registry.loads, "eviction": registry.evictions},
+                )
+                _index_registry = registry
+    return _index_registry
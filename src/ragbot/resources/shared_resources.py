@@ -0,0 +1,311 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from llama_index.core import load_indices_from_storage
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.settings import Settings
+from llama_index.core.storage import StorageContext
+
+from ragbot.batching import MicroBatcher
+from ragbot.cache import QueryCache
+from ragbot.embeddings import build_batched_embeddings
+from ragbot.observability.metrics import STARTUP_SECONDS, timed
+from ragbot.retrievers import (
+    AnswerGroupRetriever,
+    BM25Retriever,
+    CANDIDATES_PER_GROUP,
+    HybridRetriever,
+)
+from ragbot.settings import build_settings
+from ragbot.storage import (
+    AnswerStore,
+    LexicalIndex,
+    PERSIST_DIR,
+    build_storage_context,
+    load_or_create_answer_store,
+    load_or_create_lexical_index,
+)
+from ragbot.storage.storage_context import read_index_version
+
+logger = logging.getLogger(__name__)
+
+_settings_built = False
+_settings_lock = threading.Lock()
+
+
+def ensure_settings(llm_http_client: Optional[httpx.AsyncClient] = None) -> None:
+    """Build the global LlamaIndex ``Settings`` once per process."""
+    global _settings_built
+    if _settings_built:
+        return
+    with _settings_lock:
+        if not _settings_built:
+            build_settings(llm_http_client)
+            _settings_built = True
+
+
+class SharedResources:
+    """
+    Process-wide holder for the models, storage context, index and retrievers.
+
+    Everything is built lazily on first use and then shared read-only by
+    every session and workflow in the process. ``reload`` swaps in a freshly
+    loaded index; callers that already hold the old one keep using it until
+    their request finishes.
+    """
+
+    def __init__(self, persist_dir: Path = PERSIST_DIR):
+        self.persist_dir = persist_dir
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._storage_context: Optional[StorageContext] = None
+        self._index: Optional[BaseIndex] = None
+        self._lexical_index: Optional[LexicalIndex] = None
+        self._answer_store: Optional[AnswerStore] = None
+        self._retrievers: Dict[tuple, BaseRetriever] = {}
+        self._index_version: Optional[str] = None
+        self._reload_callbacks: List[Callable[[], None]] = []
+        self._batching: Optional[Dict[str, Any]] = None
+        self._batched_embed_model: Optional[BaseEmbedding] = None
+        self._query_batcher: Optional[MicroBatcher] = None
+        self._warm_up_thread: Optional[threading.Thread] = None
+
+        # Cached answers refer to the loaded index, drop them when it changes
+        self.query_cache = QueryCache()
+        self.on_reload(self.query_cache.clear)
+
+    def ensure_settings(self, llm_http_client: Optional[httpx.AsyncClient] = None) -> None:
+        """Build the global LlamaIndex ``Settings`` once per process."""
+        ensure_settings(llm_http_client)
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Build the models and load the index in a background thread; idempotent.
+
+        Lets a UI render while they load. Requests that need them before the
+        warm-up is done wait for it rather than loading them a second time.
+        """
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=self._warm_up, name="ragbot-warm-up", daemon=True)
+                self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    def enable_query_batching(
+        self,
+        embed_model: Optional[BaseEmbedding] = None,
+        **batcher_kwargs: Any,
+    ) -> None:
+        """
+        Micro-batch query embeddings and vector searches across concurrent requests.
+
+        Only pays off with many requests on one event loop, as in the ASGI
+        server. ``batcher_kwargs`` are passed to ``MicroBatcher``. Pass a
+        batched ``embed_model`` to share its batches with other indexes.
+        """
+        with self._lock:
+            self._batching = batcher_kwargs
+            self._batched_embed_model = embed_model
+            self._retrievers = {}
+            if self._storage_context is not None:
+                self._attach_query_batcher(self._storage_context)
+
+    def batching_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        if self._batched_embed_model is not None:
+            stats["embed"] = self._batched_embed_model.stats()
+        if self._query_batcher is not None:
+            stats["vector_search"] = self._query_batcher.stats()
+        return stats
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        self.ensure_settings()
+        if self._batching is None:
+            return Settings.embed_model
+        with self._lock:
+            if self._batched_embed_model is None:
+                self._batched_embed_model = build_batched_embeddings(Settings.embed_model, **self._batching)
+            return self._batched_embed_model
+
+    @property
+    def storage_context(self) -> StorageContext:
+        self._ensure_index()
+        return self._storage_context
+
+    @property
+    def index(self) -> BaseIndex:
+        self._ensure_index()
+        return self._index
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        self._ensure_index()
+        return self._lexical_index
+
+    @property
+    def answer_store(self) -> AnswerStore:
+        self._ensure_index()
+        return self._answer_store
+
+    @property
+    def index_version(self) -> Optional[str]:
+        return self._index_version
+
+    def get_retriever(self, similarity_top_k: int = 5) -> BaseRetriever:
+        """Return the shared retriever for ``similarity_top_k``, building it on first use."""
+        key = ("vector", similarity_top_k)
+        retriever = self._retrievers.get(key)
+        if retriever is not None:
+            return retriever
+        with self._lock:
+            index = self.index
+            retriever = self._retrievers.get(key)
+            if retriever is None:
+                retriever = index.as_retriever(similarity_top_k=similarity_top_k)
+                self._retrievers[key] = retriever
+            return retriever
+
+    def get_hybrid_retriever(self, similarity_top_k: int = 5) -> BaseRetriever:
+        """Return the shared BM25 + dense retriever for ``similarity_top_k``."""
+        key = ("hybrid", similarity_top_k)
+        retriever = self._retrievers.get(key)
+        if retriever is not None:
+            return retriever
+        dense_retriever = self.get_retriever(similarity_top_k)
+        lexical_retriever = BM25Retriever(
+            self.lexical_index,
+            self.storage_context.docstore,
+            similarity_top_k=similarity_top_k,
+        )
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is None:
+                retriever = HybridRetriever(
+                    dense_retriever,
+                    lexical_retriever,
+                    self.embed_model,
+                    self.storage_context.vector_store,
+                    similarity_top_k=similarity_top_k,
+                )
+                self._retrievers[key] = retriever
+            return retriever
+
+    def get_grouped_retriever(
+        self,
+        similarity_top_k: int = 5,
+        score_mode: str = "max",
+    ) -> BaseRetriever:
+        """Return the shared retriever for the top-k distinct FAQ answers."""
+        key = ("grouped", similarity_top_k, score_mode)
+        retriever = self._retrievers.get(key)
+        if retriever is not None:
+            return retriever
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is None:
+                retriever = AnswerGroupRetriever(
+                    self.get_hybrid_retriever(similarity_top_k * CANDIDATES_PER_GROUP),
+                    similarity_top_k=similarity_top_k,
+                    score_mode=score_mode,
+                    answer_store=self.answer_store,
+                )
+                self._retrievers[key] = retriever
+            return retriever
+
+    def on_reload(self, callback: Callable[[], None]) -> None:
+        """Register a callback that runs after every index reload."""
+        with self._lock:
+            self._reload_callbacks.append(callback)
+
+    def reload(self) -> None:
+        """Load the persisted index again and swap it in for new requests."""
+        with self._reload_lock:
+            self.ensure_settings()
+            version = read_index_version(self.persist_dir)
+            storage_context, index, lexical_index, answer_store = self._load()
+            with self._lock:
+                self._storage_context = storage_context
+                self._index = index
+                self._lexical_index = lexical_index
+                self._answer_store = answer_store
+                self._retrievers = {}
+                self._index_version = version
+                callbacks = list(self._reload_callbacks)
+        for callback in callbacks:
+            callback()
+
+    def reload_if_stale(self) -> bool:
+        """Reload if ingest published a newer index version. Returns True on reload."""
+        if self._index is None:
+            return False
+        if read_index_version(self.persist_dir) == self._index_version:
+            return False
+        self.reload()
+        return True
+
+    def _ensure_index(self) -> None:
+        if self._index is not None:
+            return
+        with self._reload_lock:
+            if self._index is not None:
+                return
+            self.ensure_settings()
+            version = read_index_version(self.persist_dir)
+            storage_context, index, lexical_index, answer_store = self._load()
+            with self._lock:
+                self._storage_context = storage_context
+                self._index = index
+                self._lexical_index = lexical_index
+                self._answer_store = answer_store
+                self._index_version = version
+
+    def _warm_up(self) -> None:
+        try:
+            self._ensure_index()
+        except Exception:
+            # The first request that needs the index tries again and reports the error
+            logger.exception("Warm-up failed")
+
+    def _load(self):
+        with timed("storage_context", STARTUP_SECONDS):
+            storage_context = build_storage_context(self.persist_dir)
+        with timed("index", STARTUP_SECONDS):
+            index = load_indices_from_storage(storage_context=storage_context)[0]
+        with timed("lexical_index", STARTUP_SECONDS):
+            lexical_index = load_or_create_lexical_index(self.persist_dir, storage_context.docstore)
+        with timed("answer_store", STARTUP_SECONDS):
+            answer_store = load_or_create_answer_store(self.persist_dir)
+        if self._batching is not None:
+            self._attach_query_batcher(storage_context)
+        return storage_context, index, lexical_index, answer_store
+
+    def _attach_query_batcher(self, storage_context: StorageContext) -> None:
+        vector_store = storage_context.vector_store
+        if not hasattr(vector_store, "query_batch"):
+            return
+        # Metrics carry over a reload, the batcher is rebuilt for the new store
+        batcher = MicroBatcher(vector_store.query_batch, **self._batching)
+        if self._query_batcher is not None:
+            batcher.metrics = self._query_batcher.metrics
+        vector_store.set_query_batcher(batcher)
+        self._query_batcher = batcher
+
+
+_shared_resources: Optional[SharedResources] = None
+_shared_resources_lock = threading.Lock()
+
+
+def get_shared_resources() -> SharedResources:
+    """Return the process-wide ``SharedResources`` instance."""
+    global _shared_resources
+    if _shared_resources is None:
+        with _shared_resources_lock:
+            if _shared_resources is None:
+                _shared_resources = SharedResources()
+    return _shared_resources
@@ -0,0 +1,108 @@
+"""
+Where cold start time goes: module imports, model builds and index loads.
+
+Imports ``--modules`` in a fresh interpreter with ``-X importtime`` and
+sums the import time by top-level package. Then builds the settings and
+loads the index at ``--persist-dir`` in this process, timing each
+component; a builder's time includes importing its heavy dependencies
+(torch, transformers), which the package only imports when a model is
+built. Run with:
+
+    python -m ragbot.resources.startup_benchmark
+    python -m ragbot.resources.startup_benchmark --imports-only --modules ragbot.settings
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from dotenv import load_dotenv
+
+from ragbot.observability import METRICS
+from ragbot.resources import SharedResources
+from ragbot.storage import PERSIST_DIR
+
+# What app.py, server.py and ingest.py import before doing any work
+STARTUP_MODULES = ("ragbot.resources", "ragbot.workflows.rag_workflow", "ragbot.server")
+TOP_PACKAGES = 12
+
+# "import time:  self [us] | cumulative | imported package"
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+@dataclass
+class StartupReport:
+    modules: List[str]
+    import_seconds: float
+    # Import time by top-level package, slowest first
+    import_seconds_by_package: Dict[str, float] = field(default_factory=dict)
+    # Build and load time by component, in load order
+    component_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+def measure_imports(modules: Sequence[str]) -> Dict[str, float]:
+    """Self import time in seconds by top-level package, in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    by_package = defaultdict(float)
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            by_package[match.group(2).split(".")[0]] += int(match.group(1)) / 1e6
+    return dict(sorted(by_package.items(), key=lambda item: item[1], reverse=True))
+
+
+def measure_components(persist_dir: Path) -> Dict[str, float]:
+    """Seconds to build each model and load each part of the index, in this process."""
+    with METRICS.record_samples() as samples:
+        start = time.perf_counter()
+        resources = SharedResources(persist_dir=persist_dir)
+        resources.ensure_settings()
+        resources.index
+        total = time.perf_counter() - start
+    components = {label: sum(values) for label, values in samples.get("ragbot_startup_seconds", {}).items()}
+    return {**components, "total": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start time by import and by component.")
+    parser.add_argument("--modules", nargs="+", default=list(STARTUP_MODULES), help="Modules to import.")
+    parser.add_argument("--persist-dir", type=Path, default=PERSIST_DIR, help="Index to load.")
+    parser.add_argument("--imports-only", action="store_true", help="Don't build models or load the index.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    by_package = measure_imports(args.modules)
+    report = StartupReport(
+        modules=args.modules,
+        import_seconds=sum(by_package.values()),
+        import_seconds_by_package=by_package,
+        component_seconds={} if args.imports_only else measure_components(args.persist_dir),
+    )
+
+    if args.json:
+        print(json.dumps(asdict(report), indent=2))
+        return
+
+    print(f"Importing {', '.join(report.modules)}: {report.import_seconds:.2f}s")
+    for package, seconds in list(report.import_seconds_by_package.items())[:TOP_PACKAGES]:
+        print(f"  {package:<32}{seconds:>8.2f}s")
+    if report.component_seconds:
+        print("\nBuilding and loading, including their imports:")
+        for component, seconds in report.component_seconds.items():
+            print(f"  {component:<32}{seconds:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from ragbot.retrievers.answer_group_retriever import (
+    AnswerGroupRetriever,
+    CANDIDATES_PER_GROUP,
+)
+from ragbot.retrievers.hybrid_retriever import BM25Retriever, HybridRetriever
\ No newline at end of file
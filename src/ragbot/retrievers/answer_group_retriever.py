@@ -0,0 +1,88 @@
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, ANSWER_KEY
+
+if TYPE_CHECKING:
+    from ragbot.storage.answer_store import AnswerStore
+
+# The FAQ data has about five paraphrases per answer, so fetch this many
+# candidates per requested group to still find top_k distinct answers.
+CANDIDATES_PER_GROUP = 5
+
+GroupScoreMode = Literal["max", "mean"]
+
+
+def answer_group_key(node: NodeWithScore) -> str:
+    """Group key of a retrieved node; falls back for indexes built without answer ids."""
+    metadata = node.node.metadata
+    return metadata.get(ANSWER_ID_KEY) or metadata.get(ANSWER_KEY) or node.node.node_id
+
+
+def group_by_answer(
+    nodes: List[NodeWithScore],
+    similarity_top_k: int,
+    score_mode: GroupScoreMode = "max",
+) -> List[NodeWithScore]:
+    """
+    Collapse paraphrase hits into one node per answer group.
+
+    Each group is represented by its best-scoring node, rescored with the
+    group's max or mean similarity, and the top ``similarity_top_k`` groups
+    are returned best first.
+    """
+    groups: Dict[str, List[NodeWithScore]] = defaultdict(list)
+    for node in nodes:
+        groups[answer_group_key(node)].append(node)
+
+    grouped = []
+    for members in groups.values():
+        scores = [member.score or 0.0 for member in members]
+        best = members[scores.index(max(scores))]
+        if score_mode == "max":
+            score = max(scores)
+        elif score_mode == "mean":
+            score = sum(scores) / len(scores)
+        else:
+            raise ValueError(f"Unknown group score mode: {score_mode}")
+        grouped.append(NodeWithScore(node=best.node, score=score))
+
+    grouped.sort(key=lambda node: node.score, reverse=True)
+    return grouped[:similarity_top_k]
+
+
+class AnswerGroupRetriever(BaseRetriever):
+    """
+    Retriever that returns the top-k distinct FAQ answers instead of top-k paraphrases.
+
+    With an ``answer_store``, the returned nodes get their answer back in
+    their metadata.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        similarity_top_k: int = 5,
+        score_mode: GroupScoreMode = "max",
+        answer_store: Optional["AnswerStore"] = None,
+    ):
+        super().__init__()
+        self.retriever = retriever
+        self.similarity_top_k = similarity_top_k
+        self.score_mode = score_mode
+        self.answer_store = answer_store
+
+    def _group(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        grouped = group_by_answer(nodes, self.similarity_top_k, self.score_mode)
+        if self.answer_store is not None:
+            self.answer_store.hydrate(grouped)
+        return grouped
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._group(self.retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._group(await self.retriever.aretrieve(query_bundle))
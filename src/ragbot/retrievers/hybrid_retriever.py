@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore.types import BaseDocumentStore
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery
+
+from ragbot.observability.metrics import timed
+from ragbot.storage.lexical_index import LexicalIndex, STOPWORDS, tokenize
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper
+RRF_K = 60
+
+# A query is keyword-style when it has at most this many content words and
+# at least this share of its words are content words ("metformin dose")
+KEYWORD_QUERY_MAX_TERMS = 4
+KEYWORD_QUERY_MIN_CONTENT_RATIO = 0.75
+# Lexical top hit coverage at which a keyword query skips dense retrieval
+LEXICAL_CONFIDENT_COVERAGE = 1.0
+
+
+def is_keyword_query(query: str) -> bool:
+    tokens = tokenize(query)
+    content = [token for token in tokens if token not in STOPWORDS]
+    return (
+        0 < len(content) <= KEYWORD_QUERY_MAX_TERMS
+        and len(content) / len(tokens) >= KEYWORD_QUERY_MIN_CONTENT_RATIO
+    )
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[List[NodeWithScore]],
+    k: int = RRF_K,
+) -> List[NodeWithScore]:
+    """
+    Fuse ranked lists by summing ``1 / (k + rank)`` per node.
+
+    Nodes come back in fused order with the score of the first list that
+    ranked them: fusion only reorders, it does not make up new scores.
+    """
+    fused: Dict[str, float] = {}
+    first: Dict[str, NodeWithScore] = {}
+    for ranked in ranked_lists:
+        for rank, node in enumerate(ranked, start=1):
+            node_id = node.node.node_id
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+            first.setdefault(node_id, node)
+    order = sorted(fused, key=fused.get, reverse=True)
+    return [first[node_id] for node_id in order]
+
+
+class BM25Retriever(BaseRetriever):
+    """Retriever over a ``LexicalIndex``; node scores are the query coverage."""
+
+    def __init__(
+        self,
+        lexical_index: LexicalIndex,
+        docstore: BaseDocumentStore,
+        similarity_top_k: int = 5,
+    ):
+        super().__init__()
+        self.lexical_index = lexical_index
+        self.docstore = docstore
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        hits = self.lexical_index.search(query_bundle.query_str, self.similarity_top_k)
+        nodes = self.docstore.get_nodes([node_id for node_id, _, _ in hits])
+        return [
+            NodeWithScore(node=node, score=coverage)
+            for node, (_, _, coverage) in zip(nodes, hits)
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 and dense retrieval with reciprocal rank fusion.
+
+    The lexical ranking only reorders the results: every returned node is
+    scored with its cosine similarity to the query, so similarity cutoffs
+    keep their meaning. Nodes only the lexical side found are scored
+    against their stored vectors in ``vector_store``.
+
+    Keyword-style queries whose best lexical hit matches every query term
+    skip the dense search and are ranked by the lexical index alone. The
+    query is embedded first if ``query_bundle.embedding`` is not set, so
+    callers can reuse the embedding after retrieval.
+    """
+
+    def __init__(
+        self,
+        dense_retriever: BaseRetriever,
+        lexical_retriever: BM25Retriever,
+        embed_model: BaseEmbedding,
+        vector_store: BasePydanticVectorStore,
+        similarity_top_k: int = 5,
+    ):
+        super().__init__()
+        self.dense_retriever = dense_retriever
+        self.lexical_retriever = lexical_retriever
+        self.embed_model = embed_model
+        self.vector_store = vector_store
+        self.similarity_top_k = similarity_top_k
+        self._counts = {"lexical_only": 0, "hybrid": 0}
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def _lexical_only(self, query_bundle: QueryBundle, lexical: List[NodeWithScore]) -> bool:
+        if (
+            lexical
+            and lexical[0].score >= LEXICAL_CONFIDENT_COVERAGE
+            and is_keyword_query(query_bundle.query_str)
+        ):
+            self._counts["lexical_only"] += 1
+            return True
+        self._counts["hybrid"] += 1
+        return False
+
+    def _unscored_query(self, query_bundle: QueryBundle, nodes: List[NodeWithScore], dense: List[NodeWithScore]) -> Optional[VectorStoreQuery]:
+        known = {node.node.node_id for node in dense}
+        node_ids = [node.node.node_id for node in nodes if node.node.node_id not in known]
+        if not node_ids:
+            return None
+        return VectorStoreQuery(
+            query_embedding=query_bundle.embedding,
+            similarity_top_k=len(node_ids),
+            node_ids=node_ids,
+        )
+
+    def _rescore(self, nodes: List[NodeWithScore], dense: List[NodeWithScore], scores: Dict[str, float]) -> List[NodeWithScore]:
+        scores = {**scores, **{node.node.node_id: node.score for node in dense}}
+        return [NodeWithScore(node=node.node, score=scores.get(node.node.node_id, 0.0)) for node in nodes]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with timed("lexical_search"):
+            lexical = self.lexical_retriever.retrieve(query_bundle)
+        if query_bundle.embedding is None:
+            with timed("embed"):
+                query_bundle.embedding = self.embed_model.get_query_embedding(query_bundle.query_str)
+        dense: List[NodeWithScore] = []
+        if self._lexical_only(query_bundle, lexical):
+            nodes = lexical[:self.similarity_top_k]
+        else:
+            with timed("vector_search"):
+                dense = self.dense_retriever.retrieve(query_bundle)
+            nodes = reciprocal_rank_fusion([dense, lexical])[:self.similarity_top_k]
+        scores = {}
+        if (query := self._unscored_query(query_bundle, nodes, dense)) is not None:
+            result = self.vector_store.query(query)
+            scores = dict(zip(result.ids, result.similarities))
+        return self._rescore(nodes, dense, scores)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with timed("lexical_search"):
+            lexical = await self.lexical_retriever.aretrieve(query_bundle)
+        if query_bundle.embedding is None:
+            with timed("embed"):
+                query_bundle.embedding = await self.embed_model.aget_query_embedding(query_bundle.query_str)
+        dense: List[NodeWithScore] = []
+        if self._lexical_only(query_bundle, lexical):
+            nodes = lexical[:self.similarity_top_k]
+        else:
+            with timed("vector_search"):
+                dense = await self.dense_retriever.aretrieve(query_bundle)
+            nodes = reciprocal_rank_fusion([dense, lexical])[:self.similarity_top_k]
+        scores = {}
+        if (query := self._unscored_query(query_bundle, nodes, dense)) is not None:
+            result = await self.vector_store.aquery(query)
+            scores = dict(zip(result.ids, result.similarities))
+        return self._rescore(nodes, dense, scores)
@@ -0,0 +1 @@
+from ragbot.server.asgi_app import RAGBotASGIApp, build_asgi_app
\ No newline at end of file
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.settings import Settings
+
+from ragbot.batching import BatchQueueFullError
+from ragbot.llms import (
+    HedgedLLM,
+    LLMConcurrencyLimiter,
+    LLMOverloadedError,
+    LLMUnavailableError,
+)
+from ragbot.observability import METRICS
+from ragbot.observability.metrics import REQUEST_SECONDS
+from ragbot.resources import (
+    IndexRegistry,
+    SharedResources,
+    UnknownCorpusError,
+    get_index_registry,
+)
+from ragbot.workflows.rag_workflow import RAGWorkflow
+
+# LLM streams in flight at once, and how many more may wait for a slot
+# before new chats are turned away with 503
+MAX_CONCURRENT_LLM_CALLS = 64
+MAX_WAITING_LLM_CALLS = 256
+# Whole request, from retrieval to the last streamed token
+REQUEST_TIMEOUT_SECONDS = 60.0
+# One keep-alive connection pool to the LLM API for the whole process
+LLM_MAX_CONNECTIONS = MAX_CONCURRENT_LLM_CALLS
+LLM_KEEPALIVE_SECONDS = 30.0
+LLM_CONNECT_TIMEOUT_SECONDS = 5.0
+# Micro-batching of query embeddings and vector searches across requests
+QUERY_BATCHING = True
+QUERY_BATCH_MAX_SIZE = 32
+QUERY_BATCH_MAX_WAIT_MS = 2.0
+QUERY_BATCH_MAX_QUEUE = 1024
+# How often to check for an index published by ingest.py
+INDEX_POLL_SECONDS = 5.0
+MAX_BODY_BYTES = 16 * 1024
+MAX_QUESTION_LENGTH = 1000
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def source_to_dict(source: NodeWithScore) -> Dict[str, Any]:
+    return {
+        "question": source.text,
+        "answer": source.metadata.get("answer"),
+        "score": source.score,
+    }
+
+
+def build_llm_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+class RAGBotASGIApp:
+    """
+    Headless ASGI app serving the RAG workflow as a streaming HTTP API.
+
+    ``POST /chat`` with ``{"question": "..."}`` streams newline-delimited
+    JSON: ``{"delta": "..."}`` per token, then ``{"sources": [...]}``. An
+    optional ``"corpus"`` picks the FAQ corpus to answer from (see
+    ``IndexRegistry``). ``GET /health`` reports LLM concurrency, batching,
+    loaded corpora and the circuit of each LLM model, and ``GET /metrics``
+    serves latency histograms to Prometheus. One ``RAGWorkflow``, one
+    pooled LLM HTTP client and one ``LLMConcurrencyLimiter`` are shared by
+    all requests, and concurrent retrievals are micro-batched unless
+    ``query_batching`` is off.
+    """
+
+    def __init__(
+        self,
+        resources: Optional[SharedResources] = None,
+        max_concurrent_llm_calls: int = MAX_CONCURRENT_LLM_CALLS,
+        max_waiting_llm_calls: int = MAX_WAITING_LLM_CALLS,
+        request_timeout: float = REQUEST_TIMEOUT_SECONDS,
+        query_batching: bool = QUERY_BATCHING,
+        registry: Optional[IndexRegistry] = None,
+    ):
+        if registry is None:
+            registry = IndexRegistry(default=resources) if resources is not None else get_index_registry()
+        self.registry = registry
+        self.resources = registry.default
+        self.request_timeout = request_timeout
+        self.query_batching = query_batching
+        self.limiter = LLMConcurrencyLimiter(max_concurrent_llm_calls, max_waiting_llm_calls)
+        self.workflow: Optional[RAGWorkflow] = None
+        self.llm: Optional[HedgedLLM] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._startup_lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def startup(self) -> None:
+        """Load models and index and build the shared client; idempotent."""
+        async with self._startup_lock:
+            if self.workflow is not None:
+                return
+            # The LLM is built once, by the settings, on the shared connection pool
+            self._http_client = build_llm_http_client()
+            await asyncio.to_thread(self.resources.ensure_settings, self._http_client)
+            if isinstance(Settings.llm, HedgedLLM):
+                self.llm = Settings.llm
+            if self.query_batching:
+                self.registry.enable_query_batching(
+                    max_batch_size=QUERY_BATCH_MAX_SIZE,
+                    max_wait_ms=QUERY_BATCH_MAX_WAIT_MS,
+                    max_queue_size=QUERY_BATCH_MAX_QUEUE,
+                )
+            # Load the index now rather than on the first request
+            await asyncio.to_thread(lambda: self.resources.index)
+            self.workflow = RAGWorkflow(
+                timeout=self.request_timeout,
+                verbose=False,
+                registry=self.registry,
+                llm_limiter=self.limiter,
+            )
+            self._poll_task = asyncio.create_task(self._poll_index())
+
+    async def shutdown(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+    async def _poll_index(self) -> None:
+        while True:
+            await asyncio.sleep(INDEX_POLL_SECONDS)
+            await asyncio.to_thread(self.registry.reload_if_stale)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route = (scope["method"], scope["path"])
+        try:
+            if route == ("GET", "/health"):
+                await send_json(send, 200, {
+                    "status": "ok" if self.workflow is not None else "starting",
+                    "llm_in_flight": self.limiter.in_flight,
+                    "llm_waiting": self.limiter.waiting,
+                    "batching": self.resources.batching_stats(),
+                    "corpora": self.registry.stats(),
+                    "llm": self.llm.stats() if self.llm is not None else None,
+                })
+            elif route == ("GET", "/metrics"):
+                await send_text(send, 200, METRICS.render(), b"text/plain; version=0.0.4")
+            elif route == ("POST", "/chat"):
+                await self._timed_chat(receive, send)
+            else:
+                raise HTTPError(404, "Not found")
+        except HTTPError as e:
+            await send_json(send, e.status, {"error": e.detail})
+
+    async def _timed_chat(self, receive: Receive, send: Send) -> None:
+        started = time.perf_counter()
+        status = 200
+        try:
+            question, corpus = parse_chat_request(await read_body(receive))
+            await self.startup()
+            if corpus is not None:
+                try:
+                    await self.registry.aget(corpus)
+                except UnknownCorpusError:
+                    raise HTTPError(404, f"Unknown corpus {corpus!r}")
+            await self._chat(question, corpus, receive, send)
+        except HTTPError as e:
+            status = e.status
+            raise
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, str(status))
+
+    async def _chat(self, question: str, corpus: Optional[str], receive: Receive, send: Send) -> None:
+        # Stop generating (and free the LLM slot) as soon as the client leaves
+        chat = asyncio.create_task(self._stream_answer(question, corpus, send))
+        disconnect = asyncio.create_task(wait_for_disconnect(receive))
+        done, _ = await asyncio.wait({chat, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in (chat, disconnect):
+            if task not in done:
+                task.cancel()
+        if chat in done:
+            chat.result()
+
+    async def _stream_answer(self, question: str, corpus: Optional[str], send: Send) -> None:
+        started = False
+        stream = None
+        try:
+            async with asyncio.timeout(self.request_timeout):
+                stream, sources = await self.workflow.run(question=question, corpus=corpus)
+                # Pull the first token before answering 200, so overload and
+                # upstream errors still get a proper status code
+                first = await anext(stream, None)
+                await send({
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")],
+                })
+                started = True
+                if first is not None:
+                    await send_line(send, {"delta": first.delta})
+                    async for chunk in stream:
+                        await send_line(send, {"delta": chunk.delta})
+                await send_line(send, {"sources": [source_to_dict(s) for s in sources]})
+        except (LLMOverloadedError, BatchQueueFullError):
+            raise HTTPError(503, "Too many concurrent requests, retry later")
+        except LLMUnavailableError:
+            raise HTTPError(503, "The LLM is unavailable, retry later")
+        except TimeoutError:
+            if not started:
+                raise HTTPError(504, "Request timed out")
+            await send_line(send, {"error": "Request timed out"})
+        except Exception:
+            logger.exception("Failed to answer %r", question)
+            if not started:
+                raise HTTPError(502, "Failed to generate an answer")
+            await send_line(send, {"error": "Failed to generate an answer"})
+        finally:
+            if stream is not None:
+                await stream.aclose()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body", False):
+            return body
+
+
+def parse_chat_request(body: bytes) -> Tuple[str, Optional[str]]:
+    """The question and the optional corpus of a chat request body."""
+    try:
+        payload = json.loads(body)
+        question, corpus = payload.get("question"), payload.get("corpus")
+    except (ValueError, AttributeError):
+        raise HTTPError(400, "Body must be a JSON object")
+    if corpus is not None and not isinstance(corpus, str):
+        raise HTTPError(400, "Corpus must be a string")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPError(400, "Missing question")
+    if len(question) > MAX_QUESTION_LENGTH:
+        raise HTTPError(400, f"Question is longer than {MAX_QUESTION_LENGTH} characters")
+    return question, corpus
+
+
+async def wait_for_disconnect(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def send_line(send: Send, payload: Dict[str, Any]) -> None:
+    await send({
+        "type": "http.response.body",
+        "body": json.dumps(payload).encode("utf-8") + b"\n",
+        "more_body": True,
+    })
+
+
+async def send_text(send: Send, status: int, text: str, content_type: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type)],
+    })
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+async def send_json(send: Send, status: int, payload: Dict[str, Any]) -> None:
+    await send_text(send, status, json.dumps(payload), b"application/json")
+
+
+def build_asgi_app(**kwargs: Any) -> RAGBotASGIApp:
+    """Build the ASGI app; serve it with any ASGI server, e.g. uvicorn."""
+    return RAGBotASGIApp(**kwargs)
@@ -1,23 +1,37 @@
-import tiktoken
+from typing import TYPE_CHECKING, Optional
+
 from llama_index.core.settings import Settings
 
-from ragbot.llms import build_openrouter_llm
-from ragbot.embeddings import build_huggingface_embeddings
+from ragbot.llms import build_hedged_openrouter_llm
+from ragbot.llms.tokenizer import build_llm_tokenizer
+from ragbot.embeddings import build_cached_embeddings, build_huggingface_embeddings
+from ragbot.embeddings.huggingface_embeddings import EMBED_MODEL_NAME, get_embed_backend
+from ragbot.observability.metrics import STARTUP_SECONDS, timed
 from ragbot.transformations import build_text_cleaner
 from ragbot.node_parsers import build_sentence_splitter
 
-from transformers import AutoTokenizer
+if TYPE_CHECKING:
+    import httpx
 
-def build_settings() -> None:
-    Settings.embed_model = build_huggingface_embeddings()
-    Settings.llm = build_openrouter_llm()
-    Settings.transformations = [
-        build_sentence_splitter(),
-        build_text_cleaner()
-    ]
+def build_settings(llm_http_client: Optional["httpx.AsyncClient"] = None) -> None:
+    """Build the global settings; ``llm_http_client`` is the LLM's connection pool, if shared."""
+    # Heavy dependencies (torch, transformers) are imported by the builders,
+    # so their import time is part of each component's startup time
+    backend = get_embed_backend()
+    with timed("embed_model", STARTUP_SECONDS):
+        Settings.embed_model = build_cached_embeddings(
+            build_huggingface_embeddings(backend=backend),
+            model_id=f"{EMBED_MODEL_NAME}:{backend}",
+        )
+    with timed("llm", STARTUP_SECONDS):
+        # The OpenRouter model and its fallbacks, hedged when the first token is slow
+        Settings.llm = build_hedged_openrouter_llm(async_http_client=llm_http_client)
+    with timed("transformations", STARTUP_SECONDS):
+        Settings.transformations = [
+            build_sentence_splitter(),
+            build_text_cleaner()
+        ]
 
-    # Must set the suitable tokenizer for the LLM
-    # Skipping this to avoid adding huggingface api key
-    # to add the tokenizer (gated behind a HuggingFace API key)
-    # Default tokenizer is tiktoken (gpt models)
-    # Settings.tokenizer = tiktoken
+    # Token counts for the context budget use the LLM's own tokenizer
+    with timed("tokenizer", STARTUP_SECONDS):
+        Settings.tokenizer = build_llm_tokenizer()
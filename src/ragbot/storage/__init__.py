@@ -1 +1,5 @@
-from ragbot.storage.storage_context import build_storage_context, PERSIST_DIR
\ No newline at end of file
+from ragbot.storage.storage_context import build_storage_context, PERSIST_DIR
+from ragbot.storage.numpy_vector_store import NumpyVectorStore
+from ragbot.storage.lexical_index import LexicalIndex, load_or_create_lexical_index
+from ragbot.storage.ivf_vector_store import IVFVectorStore
+from ragbot.storage.answer_store import AnswerStore, load_or_create_answer_store
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Recall@k and latency of the IVF vector store against exact search.
+
+Queries are stored vectors with Gaussian noise added, so every query has
+near neighbours like a paraphrased question does. Run against the
+persisted index, or a synthetic clustered corpus:
+
+    python -m ragbot.storage.ann_benchmark --nprobe 1 4 16 64
+    python -m ragbot.storage.ann_benchmark --synthetic 1000000 --dim 1024
+"""
+import argparse
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.vector_stores.simple import DEFAULT_VECTOR_STORE, NAMESPACE_SEP
+from llama_index.core.vector_stores.types import DEFAULT_PERSIST_FNAME, VectorStoreQuery
+
+from ragbot.storage.ivf_vector_store import IVFVectorStore
+from ragbot.storage.numpy_vector_store import NumpyVectorStore, _normalize_rows
+from ragbot.storage.storage_context import PERSIST_DIR
+
+DEFAULT_NPROBES = (1, 2, 4, 8, 16, 32, 64)
+QUERY_NOISE = 0.05
+
+
+@dataclass
+class ANNReport:
+    nprobe: Optional[int]  # None for exact search
+    recall: float
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+
+
+def synthetic_store(num_rows: int, dim: int, num_clusters: int = 1000, seed: int = 0) -> IVFVectorStore:
+    """Unit vectors scattered around random cluster centres, like groups of paraphrases."""
+    rng = np.random.default_rng(seed)
+    centres = _normalize_rows(rng.standard_normal((num_clusters, dim), dtype=np.float32))
+    embeddings = np.empty((num_rows, dim), dtype=np.float32)
+    for start in range(0, num_rows, 65536):
+        stop = min(start + 65536, num_rows)
+        labels = rng.integers(num_clusters, size=stop - start)
+        noise = rng.standard_normal((stop - start, dim), dtype=np.float32) * 0.5 / np.sqrt(dim)
+        embeddings[start:stop] = _normalize_rows(centres[labels] + noise)
+    return IVFVectorStore(embeddings=embeddings, node_ids=[str(i) for i in range(num_rows)])
+
+
+def sample_queries(store: NumpyVectorStore, num_queries: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    matrix = store.embeddings
+    rows = rng.choice(matrix.shape[0], min(num_queries, matrix.shape[0]), replace=False)
+    queries = np.asarray(matrix[np.sort(rows)], dtype=np.float32)
+    noise = rng.standard_normal(queries.shape, dtype=np.float32) * QUERY_NOISE / np.sqrt(queries.shape[1])
+    return _normalize_rows(queries + noise)
+
+
+def run_queries(search, queries: np.ndarray, k: int):
+    """Return the top-k id sets and per-query latencies in ms."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = search(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k))
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(result.ids))
+    return results, np.asarray(latencies)
+
+
+def make_report(nprobe, results, exact, latencies, k) -> ANNReport:
+    recall = np.mean([len(found & truth) / min(k, len(truth) or 1) for found, truth in zip(results, exact)])
+    return ANNReport(
+        nprobe=nprobe,
+        recall=float(recall),
+        p50_ms=float(np.percentile(latencies, 50)),
+        p95_ms=float(np.percentile(latencies, 95)),
+        mean_ms=float(latencies.mean()),
+    )
+
+
+def compare_nprobes(
+    store: IVFVectorStore,
+    nprobes: Sequence[int],
+    k: int = 10,
+    num_queries: int = 200,
+) -> List[ANNReport]:
+    """Recall@k and latency for each nprobe, with exact search as the first report."""
+    if not store.is_trained:
+        store.train()
+    queries = sample_queries(store, num_queries)
+    exact, latencies = run_queries(lambda q: NumpyVectorStore.query(store, q), queries, k)
+    reports = [make_report(None, exact, exact, latencies, k)]
+    for nprobe in nprobes:
+        results, latencies = run_queries(lambda q: store.query(q, nprobe=nprobe), queries, k)
+        reports.append(make_report(nprobe, results, exact, latencies, k))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of IVF search vs exact search.")
+    parser.add_argument("--persist-dir", type=Path, default=PERSIST_DIR, help="Index to load.")
+    parser.add_argument("--synthetic", type=int, help="Benchmark N synthetic vectors instead.")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimension of synthetic vectors.")
+    parser.add_argument("--nlist", type=int, help="Lists to train; default about 4 * sqrt(N).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=list(DEFAULT_NPROBES))
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries.")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        store = synthetic_store(args.synthetic, args.dim)
+    else:
+        persist_fname = f"{DEFAULT_VECTOR_STORE}{NAMESPACE_SEP}{DEFAULT_PERSIST_FNAME}"
+        store = IVFVectorStore.from_persist_path(args.persist_dir / persist_fname)
+    if args.nlist or not store.is_trained:
+        start = time.perf_counter()
+        store.train(nlist=args.nlist)
+        print(f"Trained {store.nlist} lists in {time.perf_counter() - start:.1f}s")
+    reports = compare_nprobes(store, args.nprobe, k=args.k, num_queries=args.queries)
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+
+    print(f"{len(store.node_ids)} vectors, {store.nlist} lists, recall@{args.k} over {args.queries} queries")
+    print(f"{'nprobe':>8}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+    for r in reports:
+        label = "exact" if r.nprobe is None else str(r.nprobe)
+        print(f"{label:>8}{r.recall:>9.3f}{r.p50_ms:>9.2f}{r.p95_ms:>9.2f}{r.mean_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
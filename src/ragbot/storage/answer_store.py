@@ -0,0 +1,97 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+from llama_index.core.schema import BaseNode, NodeWithScore
+
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, ANSWER_KEY, answer_group_id
+
+ANSWER_STORE_FNAME = "answers.json"
+
+
+class AnswerStore:
+    """
+    FAQ answers, stored once each and keyed by answer id.
+
+    Every paraphrase of an FAQ entry carries the same answer. ``intern``
+    moves it out of the node metadata into the store, so the docstore only
+    keeps the short answer id per node, and ``hydrate`` puts it back into
+    retrieved nodes. Answers are reference counted per node and dropped
+    with their last node. Nodes of indexes built before the store keep
+    their answer inline and are left as they are.
+    """
+
+    def __init__(self):
+        self._answers: Dict[str, str] = {}
+        self._refs: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def __contains__(self, answer_id: str) -> bool:
+        return answer_id in self._answers
+
+    def get(self, answer_id: str) -> Optional[str]:
+        return self._answers.get(answer_id)
+
+    def intern(self, nodes: Iterable[BaseNode]) -> None:
+        """Move the answer of each node into the store, leaving its answer id."""
+        for node in nodes:
+            answer = node.metadata.pop(ANSWER_KEY, None)
+            if answer is None:
+                continue
+            answer_id = node.metadata.setdefault(ANSWER_ID_KEY, answer_group_id(answer))
+            self._answers[answer_id] = answer
+            self._refs[answer_id] = self._refs.get(answer_id, 0) + 1
+            # The source document's metadata is copied here too, drop it
+            source = node.source_node
+            if source is not None:
+                source.metadata = {}
+
+    def release(self, nodes: Iterable[BaseNode]) -> None:
+        """Drop one reference per node, and the answers no node refers to any more."""
+        for node in nodes:
+            # Nodes that keep their answer inline were never interned
+            if ANSWER_KEY in node.metadata:
+                continue
+            answer_id = node.metadata.get(ANSWER_ID_KEY)
+            if answer_id not in self._refs:
+                continue
+            self._refs[answer_id] -= 1
+            if not self._refs[answer_id]:
+                del self._refs[answer_id]
+                del self._answers[answer_id]
+
+    def hydrate(self, nodes: Sequence[NodeWithScore]) -> Sequence[NodeWithScore]:
+        """Put the answer back into the metadata of retrieved nodes."""
+        for node in nodes:
+            metadata = node.node.metadata
+            if ANSWER_KEY not in metadata:
+                answer = self._answers.get(metadata.get(ANSWER_ID_KEY))
+                if answer is not None:
+                    metadata[ANSWER_KEY] = answer
+        return nodes
+
+    def persist(self, persist_dir: Path) -> None:
+        path = Path(persist_dir) / ANSWER_STORE_FNAME
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"answers": self._answers, "refs": self._refs}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: Path) -> "AnswerStore":
+        with open(Path(persist_dir) / ANSWER_STORE_FNAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        store = cls()
+        store._answers = data["answers"]
+        store._refs = data["refs"]
+        return store
+
+
+def load_or_create_answer_store(persist_dir: Path) -> AnswerStore:
+    """Load the persisted answer store; empty for indexes that keep answers inline."""
+    if (Path(persist_dir) / ANSWER_STORE_FNAME).exists():
+        return AnswerStore.from_persist_dir(persist_dir)
+    return AnswerStore()
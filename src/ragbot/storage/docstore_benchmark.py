@@ -0,0 +1,173 @@
+"""
+Size and load time of the docstore with answers inline and interned.
+
+Builds the docstore for the FAQ data, repeated ``--scale`` times with
+distinct answers, the way ingest did before and after answers moved into
+the ``AnswerStore``: with the full file metadata and the answer copied into
+every paraphrase node, and with only the file path and the answer id.
+Reports the bytes on disk, the time and memory to load them back, and the
+length of the text each node sends to the embedding model. Run with:
+
+    python -m ragbot.storage.docstore_benchmark --scale 100
+"""
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.schema import Document, MetadataMode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.utils import get_tokenizer
+
+from ragbot.node_parsers import build_sentence_splitter
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, DataFAQReader
+from ragbot.storage.answer_store import ANSWER_STORE_FNAME, AnswerStore, load_or_create_answer_store
+from ragbot.transformations import build_text_cleaner
+
+FAQ_DATA_PATH = "./data/faq_data.json"
+DOCSTORE_FNAME = "docstore.json"
+# File metadata ingest used to keep on every node, excluded from embedding
+LEGACY_EXCLUDED_FILE_METADATA_KEYS = [
+    "file_name",
+    "file_type",
+    "file_size",
+    "creation_date",
+    "last_modified_date",
+    "last_accessed_date",
+]
+
+
+@dataclass
+class DocstoreReport:
+    layout: str
+    num_nodes: int
+    docstore_bytes: int
+    answers_bytes: int
+    total_bytes: int
+    load_seconds: float
+    load_mb: float
+    mean_embed_chars: float
+    mean_embed_tokens: float
+
+
+def write_scaled_faq(path: str, scale: int, out_path: Path) -> None:
+    """The FAQ items ``scale`` times over, each copy with its own answers."""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    scaled = [
+        {
+            "questions": [f"{question} ({copy})" for question in item.get("questions", [])],
+            "answer": f"{item.get('answer', '')} ({copy})",
+        }
+        for copy in range(scale)
+        for item in items
+    ]
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(scaled, f)
+
+
+def legacy_documents(path: Path) -> Iterator[Document]:
+    for doc in DataFAQReader().lazy_load_data(path, extra_info=default_file_metadata_func(str(path))):
+        # As the reader and ingest did before: only these keys were left out
+        excluded = [ANSWER_ID_KEY, *LEGACY_EXCLUDED_FILE_METADATA_KEYS]
+        doc.excluded_embed_metadata_keys = list(excluded)
+        doc.excluded_llm_metadata_keys = list(excluded)
+        yield doc
+
+
+def compact_documents(path: Path) -> Iterator[Document]:
+    return DataFAQReader().lazy_load_data(path, extra_info={"file_path": str(path)})
+
+
+def build(layout: str, data_path: Path, persist_dir: Path) -> List[str]:
+    """Persist the docstore for ``layout``; returns the text each node is embedded with."""
+    documents = legacy_documents(data_path) if layout == "inline" else compact_documents(data_path)
+    nodes = run_transformations(list(documents), [build_sentence_splitter(), build_text_cleaner()])
+    if layout == "interned":
+        answer_store = AnswerStore()
+        answer_store.intern(nodes)
+        answer_store.persist(persist_dir)
+    docstore = SimpleDocumentStore()
+    docstore.add_documents(nodes)
+    docstore.persist(str(persist_dir / DOCSTORE_FNAME))
+    return [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+
+
+def load(persist_dir: Path):
+    return SimpleDocumentStore.from_persist_dir(str(persist_dir)), load_or_create_answer_store(persist_dir)
+
+
+def measure_load(persist_dir: Path):
+    """Seconds and MB of Python memory to load the docstore and answers of ``persist_dir``."""
+    gc.collect()
+    start = time.perf_counter()
+    loaded = load(persist_dir)
+    seconds = time.perf_counter() - start
+    del loaded
+    # Traced separately, tracing slows the load down
+    gc.collect()
+    tracemalloc.start()
+    loaded = load(persist_dir)
+    loaded_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return seconds, loaded_bytes / (1 << 20)
+
+
+def run(data_path: str, scale: int) -> List[DocstoreReport]:
+    tokenizer = get_tokenizer()
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp:
+        scaled_path = Path(tmp) / "faq_scaled.json"
+        write_scaled_faq(data_path, scale, scaled_path)
+        for layout in ("inline", "interned"):
+            persist_dir = Path(tmp) / layout
+            persist_dir.mkdir()
+            embed_texts = build(layout, scaled_path, persist_dir)
+            docstore_bytes = (persist_dir / DOCSTORE_FNAME).stat().st_size
+            answers_path = persist_dir / ANSWER_STORE_FNAME
+            answers_bytes = answers_path.stat().st_size if answers_path.exists() else 0
+            seconds, loaded_mb = measure_load(persist_dir)
+            reports.append(DocstoreReport(
+                layout=layout,
+                num_nodes=len(embed_texts),
+                docstore_bytes=docstore_bytes,
+                answers_bytes=answers_bytes,
+                total_bytes=docstore_bytes + answers_bytes,
+                load_seconds=seconds,
+                load_mb=loaded_mb,
+                mean_embed_chars=float(np.mean([len(text) for text in embed_texts])),
+                mean_embed_tokens=float(np.mean([len(tokenizer(text)) for text in embed_texts])),
+            ))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Docstore size and load time with answers inline and interned.")
+    parser.add_argument("--data", default=FAQ_DATA_PATH, help="FAQ JSON file.")
+    parser.add_argument("--scale", type=int, default=100, help="Copies of the FAQ entries to index.")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    reports = run(args.data, args.scale)
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+
+    print(f"{'layout':<10}{'nodes':>8}{'docstore MB':>13}{'answers MB':>12}{'load s':>9}{'load MB':>9}"
+          f"{'embed chars':>13}{'embed tokens':>14}")
+    for r in reports:
+        print(f"{r.layout:<10}{r.num_nodes:>8}{r.docstore_bytes / 1e6:>13.2f}{r.answers_bytes / 1e6:>12.2f}"
+              f"{r.load_seconds:>9.2f}{r.load_mb:>9.1f}{r.mean_embed_chars:>13.0f}{r.mean_embed_tokens:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryResult
+
+from ragbot.storage.numpy_vector_store import (
+    SCORE_BLOCK_ROWS,
+    NumpyVectorStore,
+    _normalize_rows,
+    top_k_indices,
+)
+
+IVF_SUFFIX = ".ivf.npz"
+
+# Inverted lists scanned per query. Higher is slower but closer to exact search.
+DEFAULT_NPROBE = 16
+# k-means is trained on a sample of this many rows per list
+TRAIN_ROWS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+
+def ivf_path_for(persist_path: str | Path) -> Path:
+    """Path of the IVF sidecar that belongs to a vector store persist path."""
+    return Path(persist_path).with_suffix(IVF_SUFFIX)
+
+
+def default_nlist(num_rows: int) -> int:
+    """Number of inverted lists for ``num_rows`` vectors, about 4 * sqrt(N)."""
+    return max(1, min(num_rows, int(4 * np.sqrt(num_rows))))
+
+
+def assign_to_centroids(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row, computed in blocks."""
+    out = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        out[start:start + SCORE_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(
+    matrix: np.ndarray,
+    nlist: int,
+    iterations: int = KMEANS_ITERATIONS,
+    seed: int = 0,
+) -> np.ndarray:
+    """Spherical k-means on a sample of the (L2-normalized) rows of ``matrix``."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(matrix.shape[0], nlist * TRAIN_ROWS_PER_LIST)
+    sample_rows = np.sort(rng.choice(matrix.shape[0], sample_size, replace=False))
+    sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_to_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        # Restart empty lists from random sample rows
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    ``NumpyVectorStore`` with an inverted-file (IVF) index for approximate search.
+
+    Rows are clustered around ``nlist`` k-means centroids. A query scores
+    the centroids, then scans only the rows of the ``nprobe`` closest lists.
+    Rows added later are assigned to the existing centroids; persisting a
+    store without centroids trains them. Queries restricted to ``node_ids``
+    and stores without an index use exact search.
+    """
+
+    nprobe: int = DEFAULT_NPROBE
+
+    _centroids: Optional[np.ndarray] = PrivateAttr(default=None)
+    _assignments: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0, dtype=np.int32))
+    _lists: Optional[Tuple[np.ndarray, np.ndarray]] = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "IVFVectorStore"
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self._centroids is None else self._centroids.shape[0]
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def train(self, nlist: Optional[int] = None, seed: int = 0) -> None:
+        """(Re)train the centroids and assign every row to a list."""
+        self._consolidate()
+        num_rows = len(self._node_ids)
+        if num_rows == 0:
+            return
+        self._centroids = train_centroids(self._embeddings, nlist or default_nlist(num_rows), seed=seed)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._sync_assignments()
+
+    def query(self, query: VectorStoreQuery, nprobe: Optional[int] = None, **kwargs: Any) -> VectorStoreQueryResult:
+        """Approximate top-k over the ``nprobe`` closest lists."""
+        if query.node_ids is not None or query.query_embedding is None:
+            return super().query(query, **kwargs)
+        self._consolidate()
+        if self._centroids is None or not self._node_ids:
+            return super().query(query, **kwargs)
+
+        query_embedding = _normalize_rows(np.asarray(query.query_embedding, dtype=np.float32))
+        order, offsets = self._inverted_lists()
+        probe = top_k_indices(self._centroids @ query_embedding, nprobe or self.nprobe)
+        # Sorted rows read the (memory-mapped) matrix front to back
+        rows = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe]))
+        if rows.size == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        scores = self.scores(query_embedding, rows)
+        top = top_k_indices(scores, query.similarity_top_k)
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(),
+            ids=[self._node_ids[row] for row in rows[top]],
+        )
+
+    def query_batch(self, queries: List[VectorStoreQuery]) -> List[VectorStoreQueryResult]:
+        """Each query probes its own lists, so a trained index answers them one by one."""
+        self._consolidate()
+        if self._centroids is None:
+            return super().query_batch(queries)
+        return [self.query(query) for query in queries]
+
+    def add_embeddings(self, *args: Any, **kwargs: Any) -> None:
+        super().add_embeddings(*args, **kwargs)
+        self._sync_assignments()
+
+    def clear(self) -> None:
+        super().clear()
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """Persist the matrix and id map, plus the centroids and list assignments."""
+        super().persist(persist_path, fs=fs)
+        if self._centroids is None:
+            self.train()
+        if self._centroids is None:
+            return
+        path = ivf_path_for(persist_path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self._centroids, assignments=self._assignments)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str | Path, mmap: bool = True) -> "IVFVectorStore":
+        """Load a persisted store and its IVF index, if it has one."""
+        store = super().from_persist_path(persist_path, mmap=mmap)
+        path = ivf_path_for(persist_path)
+        if path.exists():
+            with np.load(path) as data:
+                centroids, assignments = data["centroids"], data["assignments"]
+            # An index persisted for other rows is dropped and retrained on persist
+            if assignments.shape[0] == len(store._node_ids):
+                store._centroids = centroids
+                store._assignments = assignments
+        return store
+
+    def _consolidate(self) -> None:
+        had_pending = bool(self._pending_ids)
+        super()._consolidate()
+        if had_pending:
+            self._sync_assignments()
+
+    def _delete_rows(self, node_ids: set) -> None:
+        rows = [self._id_to_row[i] for i in node_ids if i in self._id_to_row]
+        super()._delete_rows(node_ids)
+        if rows and self._assignments.shape[0]:
+            mask = np.ones(self._assignments.shape[0], dtype=bool)
+            mask[rows] = False
+            self._assignments = self._assignments[mask]
+            self._lists = None
+
+    def _sync_assignments(self) -> None:
+        """Assign rows appended since the last call to their closest list."""
+        if self._centroids is None:
+            return
+        assigned = self._assignments.shape[0]
+        if assigned < len(self._node_ids):
+            new = assign_to_centroids(self._embeddings[assigned:], self._centroids)
+            self._assignments = np.concatenate([self._assignments, new])
+            self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows grouped by list, and the start offset of every list."""
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            counts = np.bincount(self._assignments, minlength=self.nlist)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            self._lists = (order, offsets)
+        return self._lists
@@ -0,0 +1,150 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.storage.docstore.types import BaseDocumentStore
+
+from ragbot.transformations import clean_text
+
+LEXICAL_INDEX_FNAME = "lexical_index.json"
+
+# BM25 term-frequency saturation and document-length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset(
+    """
+    a about am an and any are as at be been being but by can could do does
+    did for from had has have how i if in into is it its me my of on or our
+    should so than that the their them then there these they this to too us
+    was we were what when where which who whom why will with would you your
+    """.split()
+)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Word tokens of ``text`` after the same normalization ``TextCleaner`` applies."""
+    return _TOKEN.findall(clean_text(text))
+
+
+def content_terms(tokens: Iterable[str]) -> List[str]:
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over node text.
+
+    Only the per-node term counts are persisted; the postings lists are
+    rebuilt on load. Search results carry, besides the BM25 score, the share
+    of the query's IDF weight the node matches ("coverage", 0 to 1), which
+    is comparable across queries unlike raw BM25.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_lens: Dict[str, int] = {}
+        self._total_len = 0
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._doc_terms
+
+    @property
+    def num_docs(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, node_id: str, text: str) -> None:
+        if node_id in self._doc_terms:
+            self.delete([node_id])
+        self._index_terms(node_id, dict(Counter(content_terms(tokenize(text)))))
+
+    def _index_terms(self, node_id: str, terms: Dict[str, int]) -> None:
+        self._doc_terms[node_id] = terms
+        self._doc_lens[node_id] = sum(terms.values())
+        self._total_len += self._doc_lens[node_id]
+        for term, tf in terms.items():
+            self._postings[term][node_id] = tf
+
+    def add_nodes(self, nodes: Iterable[BaseNode]) -> None:
+        for node in nodes:
+            self.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE))
+
+    def delete(self, node_ids: Iterable[str]) -> None:
+        for node_id in node_ids:
+            terms = self._doc_terms.pop(node_id, None)
+            if terms is None:
+                continue
+            self._total_len -= self._doc_lens.pop(node_id)
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(node_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float, float]]:
+        """Return up to ``top_k`` ``(node_id, bm25_score, coverage)``, best first."""
+        terms = set(content_terms(tokenize(query)))
+        if not terms or not self._doc_terms:
+            return []
+        avg_len = self._total_len / self.num_docs or 1.0
+        idfs = {term: self.idf(term) for term in terms}
+        total_idf = sum(idfs.values())
+
+        scores: Dict[str, float] = defaultdict(float)
+        matched: Dict[str, float] = defaultdict(float)
+        for term, idf in idfs.items():
+            for node_id, tf in self._postings.get(term, {}).items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lens[node_id] / avg_len)
+                scores[node_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[node_id] += idf
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(node_id, score, matched[node_id] / total_idf) for node_id, score in best]
+
+    def persist(self, persist_dir: Path) -> None:
+        path = Path(persist_dir) / LEXICAL_INDEX_FNAME
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self._doc_terms}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: Path) -> "LexicalIndex":
+        with open(Path(persist_dir) / LEXICAL_INDEX_FNAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for node_id, terms in data["docs"].items():
+            index._index_terms(node_id, terms)
+        return index
+
+    @classmethod
+    def from_nodes(cls, nodes: Sequence[BaseNode]) -> "LexicalIndex":
+        index = cls()
+        index.add_nodes(nodes)
+        return index
+
+
+def load_or_create_lexical_index(
+    persist_dir: Path,
+    docstore: Optional[BaseDocumentStore] = None,
+) -> LexicalIndex:
+    """Load the persisted lexical index; build it from ``docstore`` for older indexes."""
+    if (Path(persist_dir) / LEXICAL_INDEX_FNAME).exists():
+        return LexicalIndex.from_persist_dir(persist_dir)
+    if docstore is not None:
+        return LexicalIndex.from_nodes(list(docstore.docs.values()))
+    return LexicalIndex()
@@ -0,0 +1,382 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+EMBEDDINGS_SUFFIX = ".npy"
+ID_MAP_SUFFIX = ".ids.json"
+
+# float16 matrices are upcast in blocks of this many rows when scoring,
+# numpy has no BLAS kernel for half precision.
+SCORE_BLOCK_ROWS = 65536
+
+
+def embeddings_path_for(persist_path: str | Path) -> Path:
+    """Path of the embedding matrix that belongs to a vector store persist path."""
+    return Path(persist_path).with_suffix(EMBEDDINGS_SUFFIX)
+
+
+def id_map_path_for(persist_path: str | Path) -> Path:
+    """Path of the sidecar id map that belongs to a vector store persist path."""
+    return Path(persist_path).with_suffix(ID_MAP_SUFFIX)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` largest scores, best first."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by a single contiguous NumPy matrix.
+
+    Embeddings are L2-normalized on insert, so a query is one
+    matrix-vector product followed by ``argpartition``. On disk the
+    matrix is a plain ``.npy`` file that is memory-mapped on load, with
+    node ids kept in a small JSON sidecar.
+    """
+
+    stores_text: bool = False
+    dtype: str = "float32"
+
+    _embeddings: np.ndarray = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _id_to_row: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _pending_ids: List[str] = PrivateAttr(default_factory=list)
+    _pending_ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _pending_embeddings: List[List[float]] = PrivateAttr(default_factory=list)
+    _query_batcher: Optional[Any] = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        embeddings: Optional[np.ndarray] = None,
+        node_ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[str]] = None,
+        dtype: str = "float32",
+        **kwargs: Any,
+    ) -> None:
+        if np.dtype(dtype) not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        super().__init__(dtype=np.dtype(dtype).name, **kwargs)
+        node_ids = node_ids or []
+        if embeddings is None:
+            embeddings = np.empty((0, 0), dtype=self.dtype)
+        if embeddings.shape[0] != len(node_ids):
+            raise ValueError("Number of embeddings does not match number of node ids.")
+        self._embeddings = embeddings
+        self._node_ids = list(node_ids)
+        self._ref_doc_ids = list(ref_doc_ids or ["None"] * len(node_ids))
+        self._id_to_row = {node_id: row for row, node_id in enumerate(self._node_ids)}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The (N, d) embedding matrix, including any pending additions."""
+        self._consolidate()
+        return self._embeddings
+
+    @property
+    def node_ids(self) -> List[str]:
+        self._consolidate()
+        return self._node_ids
+
+    def get(self, text_id: str) -> List[float]:
+        """Get embedding."""
+        self._consolidate()
+        return self._embeddings[self._id_to_row[text_id]].astype(np.float32).tolist()
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes to the store.
+
+        Rows are buffered and only stacked into the matrix on the next
+        query or persist, so adding in many small batches stays linear.
+        """
+        for node in nodes:
+            if node.node_id in self._id_to_row:
+                self._delete_rows({node.node_id})
+            self._pending_ids.append(node.node_id)
+            self._pending_ref_doc_ids.append(node.ref_doc_id or "None")
+            self._pending_embeddings.append(node.get_embedding())
+        return [node.node_id for node in nodes]
+
+    def add_embeddings(
+        self,
+        node_ids: List[str],
+        ref_doc_ids: List[str],
+        embeddings: np.ndarray,
+    ) -> None:
+        """Append already L2-normalized rows in bulk.
+
+        ``embeddings`` may be a memmap; it is used without a copy when it is
+        the first data in the store and already has the store's dtype.
+        """
+        if embeddings.shape[0] != len(node_ids):
+            raise ValueError("Number of embeddings does not match number of node ids.")
+        self._consolidate()
+        self._delete_rows(set(node_ids).intersection(self._id_to_row))
+        embeddings = embeddings.astype(self.dtype, copy=False)
+        if self._embeddings.shape[0] == 0:
+            self._embeddings = embeddings
+        else:
+            self._embeddings = np.concatenate([self._embeddings, embeddings])
+        for node_id in node_ids:
+            self._id_to_row[node_id] = len(self._node_ids)
+            self._node_ids.append(node_id)
+        self._ref_doc_ids.extend(ref_doc_ids)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete all nodes that came from the given ref doc."""
+        self._consolidate()
+        self._delete_rows(
+            {
+                node_id
+                for node_id, ref in zip(self._node_ids, self._ref_doc_ids)
+                if ref == ref_doc_id
+            }
+        )
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[Any] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        if filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        self._consolidate()
+        self._delete_rows(set(self._node_ids if node_ids is None else node_ids))
+
+    def clear(self) -> None:
+        self._pending_ids, self._pending_ref_doc_ids, self._pending_embeddings = [], [], []
+        self._embeddings = np.empty((0, 0), dtype=self.dtype)
+        self._node_ids, self._ref_doc_ids, self._id_to_row = [], [], {}
+
+    def scores(self, query_embedding: Sequence[float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the query against every (or the given) row."""
+        self._consolidate()
+        query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        matrix = self._embeddings if rows is None else self._embeddings[rows]
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        out = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            out[start:start + SCORE_BLOCK_ROWS] = block @ query
+        return out
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Return the top-k most similar node ids."""
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Unsupported query mode for NumpyVectorStore: {query.mode}")
+        if query.filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if query.query_embedding is None:
+            raise ValueError("Query embedding is required.")
+
+        self._consolidate()
+        if not self._node_ids:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        rows = None
+        if query.node_ids is not None:
+            rows = np.fromiter(
+                (self._id_to_row[i] for i in query.node_ids if i in self._id_to_row),
+                dtype=np.int64,
+            )
+            if rows.size == 0:
+                return VectorStoreQueryResult(similarities=[], ids=[])
+
+        scores = self.scores(query.query_embedding, rows)
+        top = top_k_indices(scores, query.similarity_top_k)
+        top_rows = top if rows is None else rows[top]
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(),
+            ids=[self._node_ids[row] for row in top_rows],
+        )
+
+    def query_batch(self, queries: List[VectorStoreQuery]) -> List[VectorStoreQueryResult]:
+        """
+        Answer several queries, scoring all plain top-k queries together.
+
+        The matrix is read once, in blocks, and multiplied by the stacked
+        query embeddings, instead of once per query. Queries restricted to
+        ``node_ids`` fall back to ``query``.
+        """
+        self._consolidate()
+        batchable = [
+            i for i, query in enumerate(queries)
+            if query.node_ids is None
+            and query.query_embedding is not None
+            and query.mode == VectorStoreQueryMode.DEFAULT
+            and query.filters is None
+        ]
+        results: List[Optional[VectorStoreQueryResult]] = [None] * len(queries)
+        if batchable and self._node_ids:
+            top_k = [queries[i].similarity_top_k for i in batchable]
+            stacked = _normalize_rows(
+                np.asarray([queries[i].query_embedding for i in batchable], dtype=np.float32)
+            )
+            for i, (rows, scores) in zip(batchable, self._batch_top_k(stacked, top_k)):
+                results[i] = VectorStoreQueryResult(
+                    similarities=scores.tolist(),
+                    ids=[self._node_ids[row] for row in rows],
+                )
+        return [
+            result if result is not None else self.query(query)
+            for query, result in zip(queries, results)
+        ]
+
+    def _batch_top_k(self, queries: np.ndarray, top_k: List[int]):
+        """Top rows and scores per query column of ``matrix @ queries.T``."""
+        matrix = self._embeddings
+        k_max = max(top_k)
+        block_rows, block_scores = [], []
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            scores = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32) @ queries.T
+            # Keep each block's candidates only, so memory stays O(k * queries)
+            k = min(k_max, scores.shape[0])
+            rows = np.argpartition(-scores, k - 1, axis=0)[:k]
+            block_rows.append(rows + start)
+            block_scores.append(np.take_along_axis(scores, rows, axis=0))
+        rows, scores = np.concatenate(block_rows), np.concatenate(block_scores)
+        for column, k in enumerate(top_k):
+            top = top_k_indices(scores[:, column], k)
+            yield rows[top, column], scores[top, column]
+
+    def set_query_batcher(self, batcher: Optional[Any]) -> None:
+        """Route ``aquery`` through a ``MicroBatcher`` over ``query_batch``, or stop with None."""
+        self._query_batcher = batcher
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if self._query_batcher is None or kwargs:
+            return self.query(query, **kwargs)
+        return await self._query_batcher.submit(query)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """Write the matrix as ``.npy`` and the id map as JSON next to ``persist_path``."""
+        self._consolidate()
+        embeddings_path = embeddings_path_for(persist_path)
+        id_map_path = id_map_path_for(persist_path)
+        embeddings_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to temp files and rename, so a reader never maps a partial file.
+        tmp_embeddings = embeddings_path.with_name(embeddings_path.name + ".tmp")
+        with open(tmp_embeddings, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._embeddings, dtype=self.dtype))
+        tmp_id_map = id_map_path.with_name(id_map_path.name + ".tmp")
+        with open(tmp_id_map, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dtype": self.dtype,
+                    "node_ids": self._node_ids,
+                    "ref_doc_ids": self._ref_doc_ids,
+                },
+                f,
+            )
+        os.replace(tmp_embeddings, embeddings_path)
+        os.replace(tmp_id_map, id_map_path)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str | Path, mmap: bool = True) -> "NumpyVectorStore":
+        """Load a persisted store; the matrix is memory-mapped read-only by default."""
+        with open(id_map_path_for(persist_path), "r", encoding="utf-8") as f:
+            id_map = json.load(f)
+        embeddings = np.load(
+            embeddings_path_for(persist_path),
+            mmap_mode="r" if mmap else None,
+        )
+        return cls(
+            embeddings=embeddings,
+            node_ids=id_map["node_ids"],
+            ref_doc_ids=id_map["ref_doc_ids"],
+            dtype=id_map.get("dtype", embeddings.dtype.name),
+        )
+
+    @classmethod
+    def from_embedding_dict(
+        cls,
+        embedding_dict: Dict[str, List[float]],
+        text_id_to_ref_doc_id: Optional[Dict[str, str]] = None,
+        dtype: str = "float32",
+    ) -> "NumpyVectorStore":
+        """Build a store from the ``SimpleVectorStore`` data layout."""
+        text_id_to_ref_doc_id = text_id_to_ref_doc_id or {}
+        node_ids = list(embedding_dict)
+        if node_ids:
+            embeddings = _normalize_rows(
+                np.asarray([embedding_dict[i] for i in node_ids], dtype=np.float32)
+            ).astype(dtype)
+        else:
+            embeddings = None
+        return cls(
+            embeddings=embeddings,
+            node_ids=node_ids,
+            ref_doc_ids=[text_id_to_ref_doc_id.get(i, "None") for i in node_ids],
+            dtype=dtype,
+        )
+
+    def _consolidate(self) -> None:
+        if not self._pending_ids:
+            return
+        # A node added twice before consolidation keeps its last embedding.
+        last = {node_id: i for i, node_id in enumerate(self._pending_ids)}
+        if len(last) != len(self._pending_ids):
+            keep = sorted(last.values())
+            self._pending_ids = [self._pending_ids[i] for i in keep]
+            self._pending_ref_doc_ids = [self._pending_ref_doc_ids[i] for i in keep]
+            self._pending_embeddings = [self._pending_embeddings[i] for i in keep]
+        pending = _normalize_rows(np.asarray(self._pending_embeddings, dtype=np.float32))
+        pending = pending.astype(self.dtype)
+        if self._embeddings.shape[0] == 0:
+            self._embeddings = pending
+        else:
+            self._embeddings = np.concatenate([self._embeddings, pending])
+        for node_id in self._pending_ids:
+            self._id_to_row[node_id] = len(self._node_ids)
+            self._node_ids.append(node_id)
+        self._ref_doc_ids.extend(self._pending_ref_doc_ids)
+        self._pending_ids, self._pending_ref_doc_ids, self._pending_embeddings = [], [], []
+
+    def _delete_rows(self, node_ids: set) -> None:
+        if self._pending_ids and node_ids.intersection(self._pending_ids):
+            keep = [i for i, node_id in enumerate(self._pending_ids) if node_id not in node_ids]
+            self._pending_ids = [self._pending_ids[i] for i in keep]
+            self._pending_ref_doc_ids = [self._pending_ref_doc_ids[i] for i in keep]
+            self._pending_embeddings = [self._pending_embeddings[i] for i in keep]
+
+        rows = [self._id_to_row[i] for i in node_ids if i in self._id_to_row]
+        if not rows:
+            return
+        mask = np.ones(len(self._node_ids), dtype=bool)
+        mask[rows] = False
+        self._embeddings = self._embeddings[mask]
+        self._node_ids = [n for n, keep in zip(self._node_ids, mask) if keep]
+        self._ref_doc_ids = [r for r, keep in zip(self._ref_doc_ids, mask) if keep]
+        self._id_to_row = {node_id: row for row, node_id in enumerate(self._node_ids)}
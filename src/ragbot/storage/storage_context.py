@@ -1,4 +1,6 @@
+import time
 from pathlib import Path
+from typing import Optional
 from llama_index.core.storage import StorageContext
 from llama_index.core.storage.docstore import SimpleDocumentStore
 from llama_index.core.storage.index_store import SimpleIndexStore
@@ -9,8 +11,25 @@ from llama_index.core.vector_stores.types import (
     DEFAULT_PERSIST_FNAME,
 )
 
+from ragbot.storage.ivf_vector_store import IVFVectorStore, DEFAULT_NPROBE
+from ragbot.storage.numpy_vector_store import NumpyVectorStore, embeddings_path_for
+
 PERSIST_DIR = Path("./storage")
 
+# Written by ingest after every successful persist; readers compare it
+# to decide whether their loaded index is stale.
+INDEX_VERSION_FNAME = "index_version"
+
+# Use "float16" to halve the size of the embedding matrix on disk and in RAM
+VECTOR_STORE_DTYPE = "float32"
+
+# "flat" scans every embedding per query; "ivf" builds an approximate
+# inverted-file index at ingest for large corpora (ragbot/storage/ivf_vector_store.py)
+VECTOR_INDEX_TYPE = "flat"
+# IVF lists scanned per query: the recall/latency trade-off, see
+# `python -m ragbot.storage.ann_benchmark`
+IVF_NPROBE = DEFAULT_NPROBE
+
 def load_or_create_docstore(persist_dir: Path):
     path = persist_dir / "docstore.json"
     if path.exists():
@@ -29,13 +48,47 @@ def load_or_create_graph_store(persist_dir: Path):
         return SimpleGraphStore.from_persist_dir(str(persist_dir))
     return SimpleGraphStore()
 
-def load_or_create_vector_store(persist_dir: Path):
-    # path = persist_dir / DEFAULT_PERSIST_FNAME
+def load_or_create_vector_store(
+    persist_dir: Path,
+    dtype: str = VECTOR_STORE_DTYPE,
+    index_type: str = VECTOR_INDEX_TYPE,
+):
+    if index_type not in ("flat", "ivf"):
+        raise ValueError(f"Unknown vector index type: {index_type}")
+    store_cls = IVFVectorStore if index_type == "ivf" else NumpyVectorStore
     persist_fname = f"{DEFAULT_VECTOR_STORE}{NAMESPACE_SEP}{DEFAULT_PERSIST_FNAME}"
     path = persist_dir / persist_fname
-    if path.exists():
-        return SimpleVectorStore.from_persist_dir(str(persist_dir))
-    return SimpleVectorStore()
+    if embeddings_path_for(path).exists():
+        vector_store = store_cls.from_persist_path(path)
+    elif path.exists():
+        # Index persisted as a SimpleVectorStore JSON by an older ingest run,
+        # convert once; the next persist writes the .npy layout.
+        legacy = SimpleVectorStore.from_persist_dir(str(persist_dir))
+        vector_store = store_cls.from_embedding_dict(
+            legacy.data.embedding_dict,
+            legacy.data.text_id_to_ref_doc_id,
+            dtype=dtype,
+        )
+    else:
+        vector_store = store_cls(dtype=dtype)
+    if isinstance(vector_store, IVFVectorStore):
+        vector_store.nprobe = IVF_NPROBE
+    return vector_store
+
+def write_index_version(persist_dir: Path = PERSIST_DIR) -> str:
+    """Publish a new index version marker for the given persist directory."""
+    version = str(time.time_ns())
+    tmp_path = persist_dir / f"{INDEX_VERSION_FNAME}.tmp"
+    tmp_path.write_text(version, encoding="utf-8")
+    tmp_path.replace(persist_dir / INDEX_VERSION_FNAME)
+    return version
+
+def read_index_version(persist_dir: Path = PERSIST_DIR) -> Optional[str]:
+    """Return the published index version, or None if nothing was published."""
+    path = persist_dir / INDEX_VERSION_FNAME
+    if not path.exists():
+        return None
+    return path.read_text(encoding="utf-8").strip()
 
 def build_storage_context(persist_dir: Path = PERSIST_DIR):
     persist_dir.mkdir(parents=True, exist_ok=True)
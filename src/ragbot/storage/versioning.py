@@ -0,0 +1,75 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+from ragbot.storage.storage_context import PERSIST_DIR, write_index_version
+
+STAGING_PREFIX = ".staging-"
+LEGACY_PREFIX = "legacy-"
+
+# Published versions kept on disk, including the live one. Older ones are
+# pruned; processes that already loaded them keep working because the
+# docstore is read into memory and unlinked memmaps stay valid on POSIX.
+KEEP_VERSIONS = 2
+
+
+def versions_dir(persist_dir: Path = PERSIST_DIR) -> Path:
+    """Directory holding every published version of ``persist_dir``."""
+    return persist_dir.parent / f"{persist_dir.name}_versions"
+
+
+def create_staging_dir(persist_dir: Path = PERSIST_DIR) -> Path:
+    """Create an empty directory to build the next index version in."""
+    staging_dir = versions_dir(persist_dir) / f"{STAGING_PREFIX}{time.time_ns()}"
+    staging_dir.mkdir(parents=True)
+    return staging_dir
+
+
+def publish_storage(
+    staging_dir: Path,
+    persist_dir: Path = PERSIST_DIR,
+    keep: int = KEEP_VERSIONS,
+) -> str:
+    """
+    Atomically make ``staging_dir`` the live index at ``persist_dir``.
+
+    ``persist_dir`` becomes a symlink to ``<persist_dir>_versions/<version>``
+    and is switched with a single ``os.replace``, so readers see either the
+    old or the new index, never a half-written one. Returns the new version.
+    """
+    version = write_index_version(staging_dir)
+    version_dir = versions_dir(persist_dir) / version
+    staging_dir.rename(version_dir)
+
+    if persist_dir.exists() and not persist_dir.is_symlink():
+        # One-time migration of a plain directory written by older ingests
+        persist_dir.rename(versions_dir(persist_dir) / f"{LEGACY_PREFIX}{time.time_ns()}")
+
+    tmp_link = persist_dir.with_name(f"{persist_dir.name}.tmp-link")
+    if tmp_link.is_symlink() or tmp_link.exists():
+        tmp_link.unlink()
+    tmp_link.symlink_to(
+        os.path.relpath(version_dir, persist_dir.parent),
+        target_is_directory=True,
+    )
+    os.replace(tmp_link, persist_dir)
+
+    prune_versions(persist_dir, keep=keep)
+    return version
+
+
+def prune_versions(persist_dir: Path = PERSIST_DIR, keep: int = KEEP_VERSIONS) -> None:
+    """Delete all but the ``keep`` newest versions; never the live one."""
+    live = persist_dir.resolve()
+    candidates = sorted(
+        (
+            path for path in versions_dir(persist_dir).iterdir()
+            if path.is_dir() and not path.name.startswith(STAGING_PREFIX)
+        ),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for path in candidates[keep:]:
+        if path.resolve() != live:
+            shutil.rmtree(path, ignore_errors=True)
@@ -1 +1 @@
-from ragbot.transformations.text_cleaner import build_text_cleaner
\ No newline at end of file
+from ragbot.transformations.text_cleaner import build_text_cleaner, clean_text
\ No newline at end of file
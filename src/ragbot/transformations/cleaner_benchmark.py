@@ -0,0 +1,108 @@
+"""
+Throughput of ``TextCleaner`` before and after the single-pass rework.
+
+Cleans ``--num-texts`` texts drawn from the FAQ questions and answers,
+with ``--non-ascii`` of them given accented characters, using the old
+four-pass cleaner, the new ``clean_text``, and ``TextCleaner`` on nodes
+with each ``--workers`` count. Checks that old and new agree. Run with:
+
+    python -m ragbot.transformations.cleaner_benchmark --num-texts 1000000 --workers 1 4 8
+"""
+import argparse
+import json
+import re
+import time
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Sequence
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from ragbot.transformations.text_cleaner import TextCleaner, clean_texts
+
+FAQ_DATA_PATH = "./data/faq_data.json"
+ACCENTS = str.maketrans("aeiou", "áéíóú")
+
+
+@dataclass
+class CleanerReport:
+    name: str
+    seconds: float
+    texts_per_second: float
+    speedup: float
+
+
+def legacy_clean_text(text: str) -> str:
+    """The cleaner as it was: four passes and an uncompiled pattern."""
+    text = unicodedata.normalize('NFKD', text)
+    text = text.strip()
+    text = text.lower()
+    text = re.sub(r'\s+', ' ', text)
+    return text
+
+
+def load_texts(path: str, num_texts: int, non_ascii: float, seed: int = 0) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    base = [text for item in items for text in [*item.get("questions", []), item.get("answer", "")] if text]
+    rng = np.random.default_rng(seed)
+    texts = [f"  {base[i]} \n" for i in rng.integers(len(base), size=num_texts)]
+    for i in np.flatnonzero(rng.random(num_texts) < non_ascii):
+        texts[i] = texts[i].translate(ACCENTS)
+    return texts
+
+
+def time_call(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(texts: Sequence[str], workers: Sequence[int]) -> List[CleanerReport]:
+    if [legacy_clean_text(t) for t in texts[:10000]] != clean_texts(texts[:10000]):
+        raise AssertionError("clean_text output differs from the legacy cleaner")
+
+    timings = [
+        ("legacy", time_call(lambda: [legacy_clean_text(t) for t in texts])),
+        ("clean_text", time_call(lambda: clean_texts(texts))),
+    ]
+    for num_workers in workers:
+        nodes = [TextNode(text=t) for t in texts]
+        cleaner = TextCleaner(num_workers=num_workers, parallel_min_nodes=1)
+        # Start the pool outside of the timing; it is reused across batches
+        cleaner([TextNode(text=t) for t in texts[:num_workers * 8]])
+        timings.append((f"TextCleaner workers={num_workers}", time_call(lambda: cleaner(nodes))))
+        cleaner.close()
+
+    baseline = timings[0][1]
+    return [
+        CleanerReport(name=name, seconds=seconds, texts_per_second=len(texts) / seconds, speedup=baseline / seconds)
+        for name, seconds in timings
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the text cleaner before and after.")
+    parser.add_argument("--data", default=FAQ_DATA_PATH, help="FAQ JSON file to draw texts from.")
+    parser.add_argument("--num-texts", type=int, default=200_000)
+    parser.add_argument("--non-ascii", type=float, default=0.1, help="Share of texts with accents.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+
+    texts = load_texts(args.data, args.num_texts, args.non_ascii)
+    reports = run(texts, args.workers)
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+        return
+
+    print(f"{len(texts)} texts, {args.non_ascii:.0%} non-ASCII")
+    print(f"{'cleaner':<28}{'seconds':>9}{'texts/s':>12}{'speedup':>9}")
+    for r in reports:
+        print(f"{r.name:<28}{r.seconds:>9.2f}{r.texts_per_second:>12.0f}{r.speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
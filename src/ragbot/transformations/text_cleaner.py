@@ -1,27 +1,83 @@
-import re
+import asyncio
+import multiprocessing
 import unicodedata
-from typing import Any, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.core.schema import BaseNode
 from llama_index.core.schema import TransformComponent
 
+# Below this many nodes a process pool costs more than it saves
+PARALLEL_MIN_NODES = 50_000
+# Texts sent to a worker per task
+PARALLEL_CHUNK_SIZE = 2048
+
+
+def clean_text(text: str) -> str:
+    """Normalize a piece of text the same way the ingest pipeline does."""
+    # NFKD leaves ASCII unchanged, so most FAQ text skips normalization
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+
+    # Lowercase and collapse whitespace runs to single spaces in one pass.
+    # str.split() splits on exactly the characters re's \s matches, and
+    # drops leading and trailing whitespace like strip().
+    # Can implement stemming or lemmatization here if needed
+    return " ".join(text.lower().split())
+
+
+def clean_texts(texts: Sequence[str]) -> List[str]:
+    return [clean_text(text) for text in texts]
+
 
 class TextCleaner(TransformComponent):
-    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any):
-        for node in nodes:
-            node.text= unicodedata.normalize('NFKD', node.text)
+    """
+    Normalizes node text: NFKD, lowercase, single spaces.
+
+    Batches of at least ``parallel_min_nodes`` are cleaned by a pool of
+    ``num_workers`` processes, started on first use and kept until
+    ``close``. ``acall`` cleans in a worker thread, so an async
+    ``IngestionPipeline`` can overlap it with embedding.
+    """
 
-            node.text = node.text.strip()
-            node.text = node.text.lower()
+    num_workers: int = 1
+    parallel_min_nodes: int = PARALLEL_MIN_NODES
 
-            # remove whitespace
-            node.text = re.sub(r'\s+', ' ', node.text)
+    _executor: Optional[ProcessPoolExecutor] = PrivateAttr(default=None)
 
-            # can implement stemming or lemmatization here if needed
-            # But for now, we will just apply basic cleaning
-        
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any):
+        texts = [node.text for node in nodes]
+        if self.num_workers > 1 and len(nodes) >= self.parallel_min_nodes:
+            cleaned = self._clean_parallel(texts)
+        else:
+            cleaned = clean_texts(texts)
+        for node, text, new_text in zip(nodes, texts, cleaned):
+            # Assignment is validated by pydantic, skip it when nothing changed
+            if new_text != text:
+                node.set_content(new_text)
         return nodes
 
+    async def acall(self, nodes: Sequence[BaseNode], **kwargs: Any):
+        return await asyncio.to_thread(self.__call__, nodes, **kwargs)
+
+    def close(self) -> None:
+        """Shut down the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _clean_parallel(self, texts: List[str]) -> List[str]:
+        if self._executor is None:
+            # Same start method as the embedding pool, safe with torch loaded
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        chunks = [texts[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(texts), PARALLEL_CHUNK_SIZE)]
+        return [text for chunk in self._executor.map(clean_texts, chunks) for text in chunk]
+
 
-def build_text_cleaner() -> TextCleaner:
+def build_text_cleaner(num_workers: int = 1) -> TextCleaner:
     """Build a text cleaner."""
-    return TextCleaner()
+    return TextCleaner(num_workers=num_workers)
@@ -0,0 +1,278 @@
+"""
+Retrieval quality and latency of ``RAGWorkflow`` on held-out FAQ paraphrases.
+
+The last ``--holdout`` paraphrases of every FAQ entry that has more than
+that many are held out as queries, with the entry's answer as ground
+truth. The rest are indexed in a temporary directory with the normal
+settings, and every query runs through ``RAGWorkflow`` with a
+deterministic streaming LLM stand-in, so no API key is needed and LLM
+time is fixed. Results are written as JSON for comparing runs:
+
+    python -m ragbot.workflows.rag_benchmark --concurrency 1 8 32
+    python -m ragbot.workflows.rag_benchmark --top-k 3 --cutoff 0.8 --output cutoff-0.8.json
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core import VectorStoreIndex
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.settings import Settings
+
+from ragbot.llms import build_mock_llm
+from ragbot.llms.mock_llm import MOCK_NUM_TOKENS, MOCK_TOKEN_DELAY_SECONDS, MOCK_TTFT_SECONDS
+from ragbot.observability import METRICS
+from ragbot.readers.data_faq_reader import DataFAQReader
+from ragbot.resources import SharedResources
+from ragbot.storage import AnswerStore, LexicalIndex, build_storage_context
+from ragbot.workflows.rag_workflow import DIRECT_ANSWER_THRESHOLD, RAGWorkflow
+
+FAQ_DATA_PATH = "./data/faq_data.json"
+RESULTS_DIR = Path("./benchmark_results")
+RECALL_AT = (1, 3, 5)
+WARMUP_QUERIES = 3
+
+# (held-out question, expected answer)
+Query = Tuple[str, str]
+
+
+@dataclass
+class QueryResult:
+    rank: Optional[int]  # 1-based rank of the expected answer in the sources
+    no_result: bool
+    seconds: float
+    ttft_seconds: Optional[float]
+
+
+@dataclass
+class BenchmarkReport:
+    concurrency: int
+    num_queries: int
+    recall: Dict[str, float]
+    mrr: float
+    no_result_rate: float
+    qps: float
+    peak_rss_mb: float
+    # {"end_to_end" | "ttft" | "stage:<name>" | "step:<name>": {"p50": ms, ...}}
+    latency_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # Mean tokens per LLM call: "context", "saved" by packing, "prompt"
+    mean_tokens: Dict[str, float] = field(default_factory=dict)
+
+
+def split_faq(items: Sequence[dict], holdout: int = 1) -> Tuple[List[dict], List[Query]]:
+    """Hold out the last ``holdout`` questions of entries that keep at least one."""
+    train, queries = [], []
+    for item in items:
+        questions = item.get("questions", [])
+        if len(questions) > holdout:
+            train.append({**item, "questions": questions[:-holdout]})
+            queries.extend((question, item["answer"]) for question in questions[-holdout:])
+        else:
+            train.append(item)
+    return train, queries
+
+
+def build_eval_index(items: Sequence[dict], persist_dir: Path) -> None:
+    """Index ``items`` into ``persist_dir`` the way ingest does, with the global settings."""
+    data_path = persist_dir / "faq_train.json"
+    with open(data_path, "w", encoding="utf-8") as f:
+        json.dump(list(items), f)
+    documents = DataFAQReader().load_data(data_path)
+    nodes = run_transformations(documents, Settings.transformations)
+    answer_store = AnswerStore()
+    answer_store.intern(nodes)
+    storage_context = build_storage_context(persist_dir)
+    VectorStoreIndex(nodes=nodes, storage_context=storage_context)
+    storage_context.persist(persist_dir=str(persist_dir))
+    LexicalIndex.from_nodes(nodes).persist(persist_dir)
+    answer_store.persist(persist_dir)
+
+
+def percentiles_ms(values: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "count": int(values.size),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_query(workflow: RAGWorkflow, question: str, answer: str) -> QueryResult:
+    start = time.perf_counter()
+    ttft = None
+    stream, sources = await workflow.run(question=question)
+    async for _ in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    rank = next(
+        (i for i, source in enumerate(sources, start=1) if source.metadata.get("answer") == answer),
+        None,
+    )
+    return QueryResult(rank=rank, no_result=not sources, seconds=time.perf_counter() - start, ttft_seconds=ttft)
+
+
+async def run_queries(workflow: RAGWorkflow, queries: Sequence[Query], concurrency: int) -> Tuple[List[QueryResult], float]:
+    """Run every query with at most ``concurrency`` in flight; returns results and wall time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(query: Query) -> QueryResult:
+        async with semaphore:
+            return await run_query(workflow, *query)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(bounded(query) for query in queries))
+    return list(results), time.perf_counter() - start
+
+
+def make_report(
+    results: Sequence[QueryResult],
+    wall_seconds: float,
+    concurrency: int,
+    samples: Dict[str, Dict[Optional[str], List[float]]],
+    top_k: int,
+) -> BenchmarkReport:
+    n = len(results)
+    latency = {
+        "end_to_end": percentiles_ms([r.seconds for r in results]),
+        "ttft": percentiles_ms([r.ttft_seconds for r in results if r.ttft_seconds is not None]),
+    }
+    for prefix, metric in (("stage", "ragbot_stage_seconds"), ("step", "ragbot_workflow_step_seconds")):
+        for label, values in sorted(samples.get(metric, {}).items(), key=lambda item: item[0] or ""):
+            latency[f"{prefix}:{label}"] = percentiles_ms(values)
+    return BenchmarkReport(
+        concurrency=concurrency,
+        num_queries=n,
+        recall={
+            f"@{k}": sum(r.rank is not None and r.rank <= k for r in results) / n
+            for k in RECALL_AT if k <= top_k
+        },
+        mrr=sum(1 / r.rank for r in results if r.rank is not None) / n,
+        no_result_rate=sum(r.no_result for r in results) / n,
+        qps=n / wall_seconds,
+        peak_rss_mb=peak_rss_mb(),
+        latency_ms=latency,
+        mean_tokens={
+            part: float(np.mean(values))
+            for part, values in samples.get("ragbot_context_tokens", {}).items()
+        },
+    )
+
+
+async def benchmark(
+    workflow: RAGWorkflow,
+    queries: Sequence[Query],
+    concurrencies: Sequence[int],
+) -> List[BenchmarkReport]:
+    # Load models and warm caches outside of the measured runs
+    await run_queries(workflow, queries[:WARMUP_QUERIES], 1)
+    reports = []
+    for concurrency in concurrencies:
+        with METRICS.record_samples() as samples:
+            results, wall_seconds = await run_queries(workflow, queries, concurrency)
+        reports.append(make_report(results, wall_seconds, concurrency, samples, workflow.similarity_top_k))
+    return reports
+
+
+def print_reports(reports: Sequence[BenchmarkReport]) -> None:
+    recall_keys = list(reports[0].recall) if reports else []
+    header = f"{'conc':>5}" + "".join(f"{'R' + k:>7}" for k in recall_keys)
+    print(header + f"{'MRR':>7}{'none':>7}{'QPS':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+    for r in reports:
+        e2e = r.latency_ms["end_to_end"]
+        print(
+            f"{r.concurrency:>5}"
+            + "".join(f"{r.recall[k]:>7.3f}" for k in recall_keys)
+            + f"{r.mrr:>7.3f}{r.no_result_rate:>7.3f}{r.qps:>8.1f}"
+            + f"{e2e['p50']:>9.1f}{e2e['p95']:>9.1f}{e2e['p99']:>9.1f}{r.peak_rss_mb:>9.0f}"
+        )
+    if reports:
+        print("\nStage latency (ms) at concurrency", reports[-1].concurrency)
+        for name, stats in reports[-1].latency_ms.items():
+            if stats:
+                print(f"  {name:<36}p50 {stats['p50']:>8.2f}  p95 {stats['p95']:>8.2f}  p99 {stats['p99']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, MRR and latency of RAGWorkflow on held-out FAQ paraphrases.")
+    parser.add_argument("--data", type=Path, default=Path(FAQ_DATA_PATH), help="FAQ JSON file.")
+    parser.add_argument("--holdout", type=int, default=1, help="Paraphrases held out per FAQ entry.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="Queries in flight.")
+    parser.add_argument("--top-k", type=int, help="Answer groups retrieved (workflow default if unset).")
+    parser.add_argument("--cutoff", type=float, help="Similarity cutoff (workflow default if unset).")
+    parser.add_argument("--no-direct-answer", action="store_true", help="Always call the LLM.")
+    parser.add_argument("--ttft", type=float, default=MOCK_TTFT_SECONDS, help="Mock LLM seconds to first token.")
+    parser.add_argument("--token-delay", type=float, default=MOCK_TOKEN_DELAY_SECONDS, help="Mock LLM seconds per token.")
+    parser.add_argument("--tokens", type=int, default=MOCK_NUM_TOKENS, help="Mock LLM tokens per answer.")
+    parser.add_argument("--output", type=Path, help="JSON results path; default under ./benchmark_results.")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        train, queries = split_faq(json.load(f), args.holdout)
+    if not queries:
+        parser.error(f"No FAQ entry in {args.data} has more than {args.holdout} questions")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        resources = SharedResources(persist_dir=Path(tmp))
+        resources.ensure_settings()
+        Settings.llm = build_mock_llm(args.ttft, args.token_delay, args.tokens)
+        start = time.perf_counter()
+        build_eval_index(train, Path(tmp))
+        print(f"Indexed {sum(len(item['questions']) for item in train)} questions in "
+              f"{time.perf_counter() - start:.1f}s; {len(queries)} held-out queries")
+
+        workflow = RAGWorkflow(
+            timeout=None,
+            verbose=False,
+            resources=resources,
+            use_cache=False,
+            direct_answer_threshold=None if args.no_direct_answer else DIRECT_ANSWER_THRESHOLD,
+        )
+        if args.top_k is not None:
+            workflow.similarity_top_k = args.top_k
+        if args.cutoff is not None:
+            workflow.postprocessor.similarity_cutoff = args.cutoff
+        reports = asyncio.run(benchmark(workflow, queries, args.concurrency))
+
+    print_reports(reports)
+    output = args.output or RESULTS_DIR / f"rag_benchmark-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "config": {
+                    **{key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+                    "similarity_top_k": workflow.similarity_top_k,
+                    "similarity_cutoff": workflow.postprocessor.similarity_cutoff,
+                    # Includes the backend for the cached model, e.g. "...:onnx-int8"
+                    "embed_model": getattr(Settings.embed_model, "model_id", Settings.embed_model.model_name),
+                },
+                "reports": [asdict(report) for report in reports],
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nWrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
-from typing import List
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
 
-from llama_index.core import load_indices_from_storage
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
 from llama_index.core.response_synthesizers import get_response_synthesizer
 from llama_index.core.settings import Settings
-from llama_index.core.schema import NodeWithScore
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.vector_stores.types import VectorStoreQuery
 from llama_index.core.workflow import (
     Workflow,
     StartEvent,
@@ -17,60 +21,331 @@ from llama_index.core.workflow import (
 
 
 from ragbot.prompts import (
+    CONVERSATION_SUMMARY_SECTION,
     DIABETES_FAQ_RAG_SYSTEM_PROMPT,
-    NO_FAQ_RESULT_SYSTEM_PROMPT
+    NO_FAQ_RESULT_SYSTEM_PROMPT,
+    ContextPacker,
 )
-from ragbot.storage import build_storage_context
+from ragbot.prompts.context_packer import CONTEXT_TOKEN_BUDGET
+from ragbot.cache.query_cache import replay_stream
+from ragbot.llms import LLMConcurrencyLimiter
+from ragbot.memory import ConversationMemory
+from ragbot.observability.metrics import (
+    CONTEXT_TOKENS,
+    METRICS,
+    STEP_SECONDS,
+    instrument_llm_stream,
+    timed,
+)
+from ragbot.resources import IndexRegistry, SharedResources, get_index_registry
+
+logger = logging.getLogger(__name__)
+
+# Every event carries the resources of the corpus the run started with, so
+# a run finishes on the same index even if it is evicted or reloaded meanwhile,
+# and the memory of the conversation, if any
 
 class RetrievedResultsEvent(Event):
     question: str
     results: List[NodeWithScore]
+    query_embedding: Optional[List[float]] = None
+    resources: SharedResources
+    memory: Optional[ConversationMemory] = None
 
 class PostProcessedResultsEvent(Event):
     question: str
     results: List[NodeWithScore]
+    query_embedding: Optional[List[float]] = None
+    resources: SharedResources
+    memory: Optional[ConversationMemory] = None
 
 class NoResultsRetrievedEvent(Event):
     question: str
+    resources: SharedResources
+    memory: Optional[ConversationMemory] = None
+
+class DirectAnswerEvent(Event):
+    question: str
+    result: NodeWithScore
+    memory: Optional[ConversationMemory] = None
+
+# Tokens kept free besides the prompt and the answer, for the chat template
+PROMPT_MARGIN_TOKENS = 64
+
+# Answer straight from the FAQ, without the LLM, when the best answer group's
+# cosine similarity is at least the threshold and leads the runner-up by the margin
+DIRECT_ANSWER_THRESHOLD = 0.95
+DIRECT_ANSWER_MARGIN = 0.05
+
+
+class BranchCounters:
+    """Process-wide count of how each question was answered."""
+
+    LLM_BRANCHES = ("llm", "no_results")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def increment(self, branch: str) -> None:
+        with self._lock:
+            self._counts[branch] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        llm_calls = sum(counts.get(branch, 0) for branch in self.LLM_BRANCHES)
+        return {
+            **counts,
+            "total": total,
+            "llm_calls": llm_calls,
+            "llm_avoided_rate": (total - llm_calls) / total if total else 0.0,
+        }
+
+
+BRANCH_COUNTERS = BranchCounters()
+METRICS.counter_callback(
+    "ragbot_answers_total",
+    "Questions answered, by how they were answered.",
+    "branch",
+    lambda: {
+        branch: count
+        for branch, count in BRANCH_COUNTERS.stats().items()
+        if branch not in ("total", "llm_calls", "llm_avoided_rate")
+    },
+)
+
+
+def count_tokens(text: str) -> int:
+    return len(Settings.tokenizer(text))
+
+
+def is_follow_up(memory: Optional[ConversationMemory]) -> bool:
+    return memory is not None and len(memory) > 0
+
+
+def log_messages(messages: List[ChatMessage]) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        for message in messages:
+            logger.debug("%s: %s", message.role, message.content)
 
 
 class RAGWorkflow(Workflow):
-    def __init__(self,timeout = 120, verbose = True,):
+    def __init__(
+        self,
+        timeout = 120,
+        verbose = True,
+        resources: Optional[SharedResources] = None,
+        use_cache: bool = True,
+        direct_answer_threshold: Optional[float] = DIRECT_ANSWER_THRESHOLD,
+        direct_answer_margin: float = DIRECT_ANSWER_MARGIN,
+        llm_limiter: Optional[LLMConcurrencyLimiter] = None,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        registry: Optional[IndexRegistry] = None,
+    ):
         super().__init__(timeout=timeout, verbose=verbose)
-   
-        index = load_indices_from_storage(
-            storage_context=build_storage_context(),
-        )[0]
+
+        # The index, retriever and models are shared process-wide, so
+        # creating a workflow per session is cheap. `run(question=...,
+        # corpus=...)` answers from another corpus of the registry;
+        # without a corpus, from `resources`. With `memory=...`, a
+        # ConversationMemory, the answer follows on from the conversation
+        # and the turn is added to it.
+        self.registry = registry or get_index_registry()
+        self.resources = resources or self.registry.default
+        self.similarity_top_k = 5
+        # "max" or "mean" similarity over the paraphrases of an answer
+        self.group_score_mode = "max"
+        self.use_cache = use_cache
+        # None disables the direct-answer fast path
+        self.direct_answer_threshold = direct_answer_threshold
+        self.direct_answer_margin = direct_answer_margin
+        self.branch_counters = BRANCH_COUNTERS
+        # Bounds concurrent LLM streams when one workflow serves many requests
+        self.llm_limiter = llm_limiter
 
         self.prompt = PromptTemplate(
             template=DIABETES_FAQ_RAG_SYSTEM_PROMPT)
         self.no_faq_prompt = PromptTemplate(
             template=NO_FAQ_RESULT_SYSTEM_PROMPT)
-        self.retriever = index.as_retriever(
-            similarity_top_k=5,)
         self.postprocessor = SimilarityPostprocessor(
             similarity_cutoff= 0.85
         )
+        self.context_packer = ContextPacker(budget=context_token_budget)
+        self._prompt_tokens: Optional[int] = None
 
     @step
-    async def start(self, ev: StartEvent) -> RetrievedResultsEvent | NoResultsRetrievedEvent:
-        results = await self.retriever.aretrieve(ev.question)
-        if not results:
-            return NoResultsRetrievedEvent(question=ev.question)
-        return RetrievedResultsEvent(results= results, question=ev.question)
+    async def start(
+        self,
+        ev: StartEvent
+    ) -> RetrievedResultsEvent | NoResultsRetrievedEvent | StopEvent:
+        with timed("start", STEP_SECONDS):
+            corpus = ev.get("corpus")
+            resources = self.resources if corpus is None else await self.registry.aget(corpus)
+            memory = ev.get("memory")
+            # Answers that follow on from a conversation are neither looked
+            # up nor cached by question alone
+            follow_up = is_follow_up(memory)
+            cache = resources.query_cache
+            query_bundle = QueryBundle(query_str=ev.question)
+            if self.use_cache and not follow_up:
+                with timed("exact_cache"):
+                    cached = cache.get(ev.question)
+                if cached:
+                    self.branch_counters.increment("exact_cache")
+                    return self.respond(ev.question, *cached.replay(), memory=memory)
+                # Embed up front, so a semantic hit also skips retrieval;
+                # the retriever reuses the embedding
+                with timed("embed"):
+                    query_bundle.embedding = await resources.embed_model.aget_query_embedding(ev.question)
+                with timed("semantic_cache"):
+                    cached = cache.get_semantic(query_bundle.embedding)
+                if cached:
+                    self.branch_counters.increment("semantic_cache")
+                    return self.respond(ev.question, *cached.replay(), memory=memory)
+
+            retriever = resources.get_grouped_retriever(
+                self.similarity_top_k,
+                score_mode=self.group_score_mode,
+            )
+            with timed("retrieve"):
+                results = await retriever.aretrieve(query_bundle)
+            logger.debug("Retrieved %d answer groups for %r", len(results), ev.question)
+            if follow_up and not self.postprocessor.postprocess_nodes(results):
+                # Nothing relevant by itself: retrieve again with the
+                # conversation's earlier questions in front
+                standalone = QueryBundle(query_str=memory.standalone_query(ev.question))
+                with timed("memory_retrieve"):
+                    standalone_results = await retriever.aretrieve(standalone)
+                logger.debug("Retrieved %d answer groups for %r", len(standalone_results), standalone.query_str)
+                if self.postprocessor.postprocess_nodes(standalone_results):
+                    results, query_bundle = standalone_results, standalone
+
+            # Set by the hybrid retriever if not already set above
+            query_embedding = query_bundle.embedding
+            if not results:
+                return NoResultsRetrievedEvent(question=ev.question, resources=resources, memory=memory)
+            return RetrievedResultsEvent(
+                results= results,
+                question=ev.question,
+                query_embedding=query_embedding,
+                resources=resources,
+                memory=memory,
+            )
     
     @step
     async def post_process(
         self, 
         ev: RetrievedResultsEvent
-    ) -> PostProcessedResultsEvent | NoResultsRetrievedEvent:
-        # Here you can add any post-processing logic
-        # For now, we just return the results as is
-        results = self.postprocessor.postprocess_nodes(ev.results)
-        if not results:
-            return NoResultsRetrievedEvent(question=ev.question)
-        return PostProcessedResultsEvent(results=results, question=ev.question)
+    ) -> PostProcessedResultsEvent | DirectAnswerEvent | NoResultsRetrievedEvent:
+        with timed("post_process", STEP_SECONDS):
+            with timed("postprocess"):
+                results = self.postprocessor.postprocess_nodes(ev.results)
+            if not results:
+                return NoResultsRetrievedEvent(question=ev.question, resources=ev.resources, memory=ev.memory)
+            with timed("direct_answer_check"):
+                direct = await self.select_direct_answer(results, ev.query_embedding, ev.resources)
+            if direct is not None:
+                return DirectAnswerEvent(question=ev.question, result=direct, memory=ev.memory)
+            return PostProcessedResultsEvent(
+                results=results,
+                question=ev.question,
+                query_embedding=ev.query_embedding,
+                resources=ev.resources,
+                memory=ev.memory,
+            )
     
+    async def select_direct_answer(
+        self,
+        results: List[NodeWithScore],
+        query_embedding: Optional[List[float]],
+        resources: Optional[SharedResources] = None,
+    ) -> Optional[NodeWithScore]:
+        """Return the result to answer with directly, if one is confident enough."""
+        if self.direct_answer_threshold is None or query_embedding is None:
+            return None
+        # Group scores may be means over paraphrases, so decide on the cosine
+        # similarity of each group's best paraphrase
+        query = VectorStoreQuery(
+            query_embedding=query_embedding,
+            similarity_top_k=2,
+            node_ids=[result.node.node_id for result in results],
+        )
+        top = await (resources or self.resources).index.vector_store.aquery(query)
+        if not top.ids or top.similarities[0] < self.direct_answer_threshold:
+            return None
+        runner_up = top.similarities[1] if len(top.similarities) > 1 else 0.0
+        if top.similarities[0] - runner_up < self.direct_answer_margin:
+            return None
+        best = next(result for result in results if result.node.node_id == top.ids[0])
+        if not best.metadata.get("answer"):
+            return None
+        return NodeWithScore(node=best.node, score=top.similarities[0])
+
+    def context_budget(self, question: str, history_tokens: int = 0) -> int:
+        """Context tokens that fit next to the prompt, conversation, question and answer in the LLM window."""
+        if self._prompt_tokens is None:
+            self._prompt_tokens = count_tokens(self.prompt.format(context_str=""))
+        metadata = Settings.llm.metadata
+        available = (
+            metadata.context_window
+            - metadata.num_output
+            - self._prompt_tokens
+            - count_tokens(question)
+            - history_tokens
+            - PROMPT_MARGIN_TOKENS
+        )
+        return max(0, available)
+
+    def build_messages(
+        self,
+        system_prompt: str,
+        question: str,
+        memory: Optional[ConversationMemory] = None,
+    ) -> List[ChatMessage]:
+        """The system prompt, the conversation so far, if any, and the question."""
+        turns = []
+        if is_follow_up(memory):
+            with timed("memory_messages"):
+                summary, turns = memory.summary, memory.messages()
+            CONTEXT_TOKENS.observe(memory.tokens, "memory")
+            if summary:
+                system_prompt += CONVERSATION_SUMMARY_SECTION.format(summary=summary)
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=system_prompt),
+            *turns,
+            ChatMessage(role=MessageRole.USER, content=question),
+        ]
+
+    def respond(
+        self,
+        question: str,
+        stream,
+        sources: List[NodeWithScore],
+        memory: Optional[ConversationMemory] = None,
+    ) -> StopEvent:
+        """The run's result; the turn is added to ``memory`` once the answer was streamed."""
+        if memory is not None:
+            stream = memory.record(question, stream)
+        return StopEvent((stream, sources))
+
+    async def astream_llm(self, messages: List[ChatMessage]):
+        started = time.perf_counter()
+        CONTEXT_TOKENS.observe(sum(count_tokens(m.content or "") for m in messages), "prompt")
+        gen = await Settings.llm.astream_chat(messages=messages)
+        if self.llm_limiter is not None:
+            gen = self.llm_limiter.wrap(gen)
+        # Time to first token includes any wait for an LLM slot
+        return instrument_llm_stream(gen, started, count_tokens)
+
+    @step
+    async def direct_answer(self, ev: DirectAnswerEvent) -> StopEvent:
+        with timed("direct_answer", STEP_SECONDS):
+            self.branch_counters.increment("direct_answer")
+            answer = ev.result.metadata["answer"]
+            return self.respond(ev.question, replay_stream((answer,)), [ev.result], memory=ev.memory)
+
     @step
     async def handle_no_retrieved_results(
         self, 
@@ -78,65 +353,57 @@ class RAGWorkflow(Workflow):
     ) -> StopEvent:
         # Handle the case where no results were retrieved
         # For now, we just return an empty response
+        with timed("handle_no_retrieved_results", STEP_SECONDS):
+            self.branch_counters.increment("no_results")
 
-        print(self.no_faq_prompt)
-        messages = [
-            ChatMessage(
-                role=MessageRole.SYSTEM,
-                content=self.no_faq_prompt.template
-            ),
-            ChatMessage(
-                role=MessageRole.USER,
-                content=ev.question,
-            ),
-        ]
+            messages = self.build_messages(self.no_faq_prompt.template, ev.question, ev.memory)
+            log_messages(messages)
 
-        for message in messages:
-            print(f"{message.role}: {message.content}")
-            print()
-
-        gen = await Settings.llm.astream_chat(
-            messages=messages,
-        )
+            gen = await self.astream_llm(messages)
+            if self.use_cache and not is_follow_up(ev.memory):
+                # Exact-match only: a fallback answer should not be reused for
+                # merely similar questions
+                gen = ev.resources.query_cache.record(ev.question, gen, sources=[])
 
-        return StopEvent((gen, []))
+            return self.respond(ev.question, gen, [], memory=ev.memory)
     
     @step
-    async def stop(self, ev: PostProcessedResultsEvent) -> StopEvent:
+    async def stop(self, ev: PostProcessedResultsEvent) -> StopEvent | NoResultsRetrievedEvent:
         # This is where you would handle the final output
         # For now, we just return the results
-
-        print(f"Type of results: {type(ev.results)}")
-        print(f"Type of results[0]: {type(ev.results[0])}")
-        print(f"Type of NodeWithScore: {type(ev.results[0].node)}")
-        context_str = [
-            f"Q{idx+1}. {result.text}\n A{idx+1}. {result.metadata.get("answer")}" 
-            for (idx, result) in enumerate(ev.results)
-        ]
-        context_str = "\n\n".join(context_str)
-        print(f"Context String: {context_str}")
-
-        messages = [
-            ChatMessage(
-                role= MessageRole.SYSTEM,
-                content= self.prompt.format(
-                    context_str = context_str,
+        with timed("stop", STEP_SECONDS):
+            with timed("prompt_build"):
+                history_tokens = ev.memory.tokens if ev.memory is not None else 0
+                packed = self.context_packer.pack(
+                    ev.results,
+                    budget=self.context_budget(ev.question, history_tokens),
                 )
-            ),
-            ChatMessage(
-                role= MessageRole.USER,
-                content= ev.question,
-            ),
-        ]
-
-        for message in messages:
-            print(f"{message.role}: {message.content}")
-            print()
+                logger.debug(
+                    "Packed %d answers in %d tokens, saved %d (%d truncated, %d dropped)",
+                    packed.entries, packed.tokens, packed.saved_tokens, packed.truncated, packed.dropped,
+                )
+                if not packed.entries:
+                    # No FAQ fits the context window: answer as if none was
+                    # found rather than without grounding
+                    return NoResultsRetrievedEvent(question=ev.question, resources=ev.resources, memory=ev.memory)
+                messages = self.build_messages(
+                    self.prompt.format(context_str=packed.text),
+                    ev.question,
+                    ev.memory,
+                )
+            CONTEXT_TOKENS.observe(packed.tokens, "context")
+            CONTEXT_TOKENS.observe(packed.saved_tokens, "saved")
+            log_messages(messages)
+            self.branch_counters.increment("llm")
 
-        gen = await Settings.llm.astream_chat(
-            messages= messages,
-        )
+            gen = await self.astream_llm(messages)
+            if self.use_cache and not is_follow_up(ev.memory):
+                gen = ev.resources.query_cache.record(
+                    ev.question,
+                    gen,
+                    sources=ev.results,
+                    query_embedding=ev.query_embedding,
+                )
 
-        
-        return StopEvent((gen, ev.results))
+            return self.respond(ev.question, gen, ev.results, memory=ev.memory)
 
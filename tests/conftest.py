@@ -0,0 +1,68 @@
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.settings import Settings
+
+import ragbot.resources.shared_resources as shared_resources
+from ragbot.llms import build_mock_llm
+from ragbot.node_parsers import build_sentence_splitter
+from ragbot.transformations import build_text_cleaner
+
+FAQ_ITEMS = [
+    {
+        "questions": ["What are good snacks for people with diabetes?", "Which snacks are healthy for diabetics?"],
+        "answer": "Greek yogurt, almonds, boiled eggs, and vegetables with hummus.",
+    },
+    {
+        "questions": ["How often should a person with diabetes eat?", "Should diabetics eat every few hours?"],
+        "answer": "Eat regular meals every 3 to 5 hours to keep blood sugar steady.",
+    },
+    {
+        "questions": ["Can people with diabetes eat fruit?", "Is fruit bad for diabetics?"],
+        "answer": "Yes, whole fruit in moderate portions is part of a healthy diet.",
+    },
+]
+
+
+def hash_embedding(text: str, dim: int = 256) -> list:
+    """Normalized bag of hashed words, so similar questions get similar vectors."""
+    vector = np.zeros(dim)
+    for word in re.findall(r"[a-z]+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dim] += 1
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic embedding model without model downloads."""
+
+    def _get_query_embedding(self, query: str) -> list:
+        return hash_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list:
+        return hash_embedding(text)
+
+    async def _aget_query_embedding(self, query: str) -> list:
+        return hash_embedding(query)
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Global settings with the hash embedding and a fast mock LLM, restored afterwards."""
+    monkeypatch.setattr(Settings, "_embed_model", HashEmbedding())
+    monkeypatch.setattr(Settings, "_llm", build_mock_llm(0.0, 0.0, 8))
+    monkeypatch.setattr(Settings, "_transformations", [build_sentence_splitter(), build_text_cleaner()])
+    monkeypatch.setattr(shared_resources, "_settings_built", True)
+    return Settings
+
+
+@pytest.fixture
+def faq_index_dir(settings, tmp_path) -> Path:
+    """Persist directory of an index of ``FAQ_ITEMS``, built the way ingest builds it."""
+    from ragbot.workflows.rag_benchmark import build_eval_index
+
+    build_eval_index(FAQ_ITEMS, tmp_path)
+    return tmp_path
@@ -0,0 +1,57 @@
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY
+from ragbot.retrievers import AnswerGroupRetriever
+from ragbot.retrievers.answer_group_retriever import group_by_answer
+
+
+def hit(node_id: str, answer_id: str, score: float) -> NodeWithScore:
+    return NodeWithScore(node=TextNode(id_=node_id, text=node_id, metadata={ANSWER_ID_KEY: answer_id}), score=score)
+
+
+# "a" has the single best paraphrase, "b" the best paraphrases on average
+HITS = [
+    hit("a1", "a", 0.95),
+    hit("b1", "b", 0.90),
+    hit("b2", "b", 0.88),
+    hit("a2", "a", 0.50),
+    hit("c1", "c", 0.70),
+    hit("d1", "d", 0.60),
+]
+
+
+class StaticRetriever(BaseRetriever):
+    def _retrieve(self, query_bundle):
+        return list(HITS)
+
+
+def test_one_node_per_answer_ranked_by_max():
+    grouped = group_by_answer(HITS, similarity_top_k=10)
+
+    assert [node.node.node_id for node in grouped] == ["a1", "b1", "c1", "d1"]
+    assert [node.score for node in grouped] == [0.95, 0.90, 0.70, 0.60]
+
+
+def test_mean_mode_ranks_consistent_groups_first():
+    grouped = group_by_answer(HITS, similarity_top_k=10, score_mode="mean")
+
+    # Each group is still represented by its best paraphrase
+    assert [node.node.node_id for node in grouped] == ["b1", "a1", "c1", "d1"]
+    assert grouped[0].score == (0.90 + 0.88) / 2
+
+
+def test_top_k_counts_groups_not_nodes():
+    assert [node.node.node_id for node in group_by_answer(HITS, similarity_top_k=2)] == ["a1", "b1"]
+
+
+def test_nodes_without_answer_id_are_their_own_group():
+    nodes = [NodeWithScore(node=TextNode(id_=node_id, text=node_id), score=0.5) for node_id in ("x", "y")]
+
+    assert len(group_by_answer(nodes, similarity_top_k=5)) == 2
+
+
+def test_retriever_honours_score_mode():
+    retriever = AnswerGroupRetriever(StaticRetriever(), similarity_top_k=1, score_mode="mean")
+
+    assert [node.node.node_id for node in retriever.retrieve("query")] == ["b1"]
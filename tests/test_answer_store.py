@@ -0,0 +1,63 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, ANSWER_KEY, answer_group_id
+from ragbot.storage import AnswerStore, load_or_create_answer_store
+
+ANSWER = "Drink water and see a doctor."
+
+
+def faq_node(question: str, answer: str = ANSWER) -> TextNode:
+    return TextNode(text=question, metadata={ANSWER_KEY: answer, ANSWER_ID_KEY: answer_group_id(answer)})
+
+
+def test_intern_moves_answer_into_store():
+    store = AnswerStore()
+    nodes = [faq_node("What helps?"), faq_node("What should I do?")]
+    store.intern(nodes)
+
+    answer_id = answer_group_id(ANSWER)
+    assert len(store) == 1
+    assert store.get(answer_id) == ANSWER
+    assert all(ANSWER_KEY not in node.metadata for node in nodes)
+    assert all(node.metadata[ANSWER_ID_KEY] == answer_id for node in nodes)
+
+
+def test_release_drops_answer_with_last_node():
+    store = AnswerStore()
+    first, second = faq_node("What helps?"), faq_node("What should I do?")
+    store.intern([first, second])
+
+    store.release([first])
+    assert answer_group_id(ANSWER) in store
+    store.release([second])
+    assert answer_group_id(ANSWER) not in store
+
+
+def test_release_ignores_legacy_nodes_with_inline_answer():
+    # An index built before the store keeps the answer on its nodes; an
+    # incremental ingest then adds interned paraphrases of the same answer
+    store = AnswerStore()
+    added = faq_node("What should I do?")
+    store.intern([added])
+
+    store.release([faq_node("What helps?")])
+
+    assert store.get(answer_group_id(ANSWER)) == ANSWER
+    hydrated = store.hydrate([NodeWithScore(node=added, score=1.0)])
+    assert hydrated[0].node.metadata[ANSWER_KEY] == ANSWER
+
+
+def test_persist_round_trip(tmp_path):
+    store = AnswerStore()
+    node = faq_node("What helps?")
+    store.intern([node])
+    store.persist(tmp_path)
+
+    loaded = load_or_create_answer_store(tmp_path)
+    assert loaded.get(answer_group_id(ANSWER)) == ANSWER
+    loaded.release([node])
+    assert len(loaded) == 0
+
+
+def test_load_or_create_without_store_is_empty(tmp_path):
+    assert len(load_or_create_answer_store(tmp_path)) == 0
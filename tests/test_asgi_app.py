@@ -0,0 +1,33 @@
+import asyncio
+
+from llama_index.core.settings import Settings
+
+import ragbot.resources.shared_resources as shared_resources
+from ragbot.llms import build_hedged_llm, build_mock_llm
+from ragbot.resources import SharedResources
+from ragbot.server.asgi_app import RAGBotASGIApp
+
+
+def test_startup_builds_llm_once_on_pooled_client(faq_index_dir, monkeypatch):
+    clients = []
+
+    def build_settings(llm_http_client=None):
+        clients.append(llm_http_client)
+        Settings.llm = build_hedged_llm([build_mock_llm(0.0, 0.0, 4)])
+
+    monkeypatch.setattr(shared_resources, "build_settings", build_settings)
+    monkeypatch.setattr(shared_resources, "_settings_built", False)
+    app = RAGBotASGIApp(resources=SharedResources(persist_dir=faq_index_dir), query_batching=False)
+
+    async def main():
+        await app.startup()
+        await app.startup()
+        try:
+            return app._http_client, app.llm
+        finally:
+            await app.shutdown()
+
+    http_client, llm = asyncio.run(main())
+
+    assert clients == [http_client]
+    assert llm is Settings.llm
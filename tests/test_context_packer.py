@@ -0,0 +1,67 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from ragbot.prompts import ContextPacker
+from ragbot.readers.data_faq_reader import ANSWER_ID_KEY, ANSWER_KEY, answer_group_id
+
+
+def words(text: str) -> list:
+    return text.split()
+
+
+def result(question: str, answer: str, score: float = 1.0) -> NodeWithScore:
+    metadata = {ANSWER_KEY: answer, ANSWER_ID_KEY: answer_group_id(answer)}
+    return NodeWithScore(node=TextNode(text=question, metadata=metadata), score=score)
+
+
+LONG_ANSWER = " ".join(f"Sentence number {i} about diet." for i in range(10))
+
+
+def test_everything_fits():
+    packer = ContextPacker(budget=1000, tokenizer=words)
+    packed = packer.pack([result("What is A?", "A is a letter."), result("What is B?", "B is too.")])
+
+    assert packed.text == "Q1. What is A?\n A1. A is a letter.\n\nQ2. What is B?\n A2. B is too."
+    assert packed.entries == 2
+    assert packed.truncated == packed.dropped == 0
+    assert packed.tokens == packed.unpacked_tokens == len(words(packed.text))
+
+
+def test_duplicate_answers_are_packed_once():
+    packer = ContextPacker(budget=1000, tokenizer=words)
+    packed = packer.pack([result("What is A?", "A is a letter."), result("Define A", "A is a letter.")])
+
+    assert packed.entries == 1
+    assert "Define A" not in packed.text
+
+
+def test_answer_is_cut_at_a_sentence_boundary():
+    packer = ContextPacker(budget=30, tokenizer=words, min_answer_tokens=4)
+    packed = packer.pack([result("Long question?", LONG_ANSWER)])
+
+    assert packed.truncated == 1
+    assert packed.tokens <= 30
+    assert packed.text.endswith("diet.")
+    assert packed.saved_tokens > 0
+
+
+def test_entry_that_cannot_keep_enough_answer_is_dropped_for_a_shorter_one():
+    packer = ContextPacker(budget=14, tokenizer=words, min_answer_tokens=8)
+    packed = packer.pack([
+        result("First question?", "Short answer."),
+        result("Long question?", LONG_ANSWER),
+        result("Third question?", "Tiny."),
+    ])
+
+    assert packed.dropped == 1
+    assert packed.entries == 2
+    assert "Long question?" not in packed.text
+    # Entries are numbered as packed
+    assert "Q2. Third question?" in packed.text
+    assert packed.tokens <= 14
+
+
+def test_budget_argument_only_lowers_the_budget():
+    packer = ContextPacker(budget=10, tokenizer=words)
+    packed = packer.pack([result("What is A?", "A is a letter.")], budget=1000)
+
+    assert packed.tokens <= 10
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from typing import Any, List
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import CustomLLM
+
+from ragbot.cache.query_cache import replay_stream
+from ragbot.memory import ConversationMemory
+
+
+def words(text: str) -> list:
+    return text.split()
+
+
+class SummaryLLM(CustomLLM):
+    """Answers every prompt with a numbered summary, after ``release`` is set."""
+
+    fail: bool = False
+    _prompts: List[str] = PrivateAttr(default_factory=list)
+    _release: threading.Event = PrivateAttr(default_factory=threading.Event)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        self._release.wait(5)
+        self._prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("LLM down")
+        return CompletionResponse(text=f"summary {len(self._prompts)}")
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        raise NotImplementedError
+
+
+def build_memory(token_limit=10, fail=False):
+    llm = SummaryLLM(fail=fail)
+    return ConversationMemory(token_limit=token_limit, llm=llm, tokenizer=words), llm
+
+
+def test_recent_turns_are_kept_verbatim():
+    memory, llm = build_memory(token_limit=100)
+    memory.put("What is A?", "A is a letter.")
+
+    assert [m.role for m in memory.messages()] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert memory.messages()[1].content == "A is a letter."
+    assert memory.tokens == 7
+    assert memory.summary == ""
+    assert not llm._prompts
+
+
+def test_old_turns_are_summarized_in_the_background():
+    memory, llm = build_memory(token_limit=10)
+    memory.put("first question here", "first answer here")
+    # Over the limit: the first turn waits for the summarizer, which is
+    # blocked, but the caller isn't
+    memory.put("second question here", "second answer here")
+
+    assert memory.summary == ""
+    assert [m.content for m in memory.messages()][0] == "first question here"
+    assert not memory.wait_for_summary(timeout=0.05)
+
+    llm._release.set()
+    assert memory.wait_for_summary(timeout=5)
+    assert memory.summary == "summary 1"
+    assert memory.summarized_turns == 1
+    assert [m.content for m in memory.messages()] == ["second question here", "second answer here"]
+    assert memory.tokens == 2 + 6
+    assert "first answer here" in llm._prompts[0]
+    assert len(memory) == 2
+
+
+def test_summary_is_updated_with_later_turns():
+    memory, llm = build_memory(token_limit=10)
+    llm._release.set()
+    for i in range(3):
+        memory.put(f"question {i} here", f"answer {i} here")
+        memory.wait_for_summary(timeout=5)
+
+    assert memory.summary == "summary 2"
+    assert "summary 1" in llm._prompts[1]
+    assert "answer 1 here" in llm._prompts[1]
+    assert memory.summarized_turns == 2
+
+
+def test_latest_turn_is_kept_even_over_the_limit():
+    memory, llm = build_memory(token_limit=2)
+    llm._release.set()
+    memory.put("a long question that is over the limit", "and a long answer")
+    memory.wait_for_summary(timeout=5)
+
+    assert len(memory.messages()) == 2
+    assert not llm._prompts
+
+
+def test_failed_summary_drops_turns():
+    memory, llm = build_memory(token_limit=10, fail=True)
+    llm._release.set()
+    memory.put("first question here", "first answer here")
+    memory.put("second question here", "second answer here")
+    assert memory.wait_for_summary(timeout=5)
+
+    assert memory.summary == ""
+    assert memory.summarized_turns == 1
+    assert len(memory.messages()) == 2
+
+
+def test_without_limit_nothing_is_summarized():
+    memory, llm = build_memory(token_limit=None)
+    for i in range(20):
+        memory.put(f"question {i}", f"answer {i}")
+
+    assert len(memory.messages()) == 40
+    assert not llm._prompts
+
+
+def test_record_adds_turn_once_stream_is_consumed():
+    memory, _ = build_memory(token_limit=100)
+    stream = memory.record("What is A?", replay_stream(["A is ", "a letter."]))
+    assert len(memory) == 0
+
+    async def consume():
+        return "".join([chunk.delta async for chunk in stream])
+
+    assert asyncio.run(consume()) == "A is a letter."
+    assert memory.messages()[1].content == "A is a letter."
+
+
+def test_standalone_query_prepends_latest_questions():
+    memory = ConversationMemory(token_limit=None, tokenizer=words, query_context_tokens=6)
+    memory.put("snacks for diabetics", "Nuts.")
+    memory.put("low sugar ones", "Almonds.")
+
+    assert memory.standalone_query("what about fruit?") == "snacks for diabetics low sugar ones what about fruit?"
+    memory.put("more", "More.")
+    # Only as many earlier questions as fit in query_context_tokens
+    assert memory.standalone_query("and?") == "low sugar ones more and?"
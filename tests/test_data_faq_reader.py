@@ -0,0 +1,94 @@
+import io
+import json
+
+import pytest
+
+from ragbot.readers.data_faq_reader import (
+    ANSWER_ID_KEY,
+    ANSWER_KEY,
+    DataFAQReader,
+    answer_group_id,
+    iter_json_array,
+)
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 16]
+
+VALID = [
+    "[]",
+    "  [ ]  ",
+    "[1]",
+    "[1, -2.5e+10, 0.125, 1E3]",
+    '["a,b", "[]{}", "quote \\" and backslash \\\\", "\\u00e9", ""]',
+    '[{"questions": ["q1", "q2"], "answer": "a"}, {"questions": [], "answer": "b, c"}]',
+    "[[1, [2, [3]]], {\"a\": {\"b\": [true, false, null]}}]",
+    '\n[\n  {"a": 1} ,\n  {"b": 2}\n]\n',
+]
+
+INVALID = [
+    "",
+    "{}",
+    "[",
+    "[1",
+    "[1,",
+    "[1,]",
+    "[,1]",
+    "[1,,2]",
+    "[1 2]",
+    '["unterminated]',
+    "[{\"a\": 1]",
+    "[1] 2",
+]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", VALID)
+def test_items_match_json_loads(text, chunk_size):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", INVALID)
+def test_invalid_json_raises(text, chunk_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.chars_read = 0
+
+    def read(self, size: int = -1) -> str:
+        chunk = super().read(size)
+        self.chars_read += len(chunk)
+        return chunk
+
+
+def test_syntax_error_raised_without_reading_rest_of_file():
+    items = ['{"answer": "%d"}' % i for i in range(1000)]
+    items[10] = '{"answer": oops}'
+    f = CountingReader("[" + ",".join(items) + "]")
+
+    with pytest.raises(ValueError, match="item 10"):
+        list(iter_json_array(f, chunk_size=64))
+
+    assert f.chars_read < 64 * 20
+
+
+def test_items_are_yielded_before_the_file_is_read():
+    f = CountingReader("[" + ",".join(["1"] * 10_000) + "]")
+
+    items = iter_json_array(f, chunk_size=64)
+    assert next(items) == 1
+    assert f.chars_read == 64
+
+
+def test_reader_yields_one_document_per_question(tmp_path):
+    path = tmp_path / "faq.json"
+    path.write_text(json.dumps([{"questions": ["What is A?", "Define A"], "answer": "A is a letter."}]))
+
+    documents = DataFAQReader().load_data(path)
+
+    assert [doc.text for doc in documents] == ["What is A?", "Define A"]
+    assert all(doc.metadata[ANSWER_KEY] == "A is a letter." for doc in documents)
+    assert all(doc.metadata[ANSWER_ID_KEY] == answer_group_id("A is a letter.") for doc in documents)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from ragbot.resources import SharedResources
+from ragbot.workflows.rag_workflow import RAGWorkflow
+
+from tests.conftest import FAQ_ITEMS
+
+FRUIT = FAQ_ITEMS[2]
+
+
+@pytest.fixture
+def workflow(faq_index_dir) -> RAGWorkflow:
+    workflow = RAGWorkflow(
+        timeout=None,
+        verbose=False,
+        resources=SharedResources(persist_dir=faq_index_dir),
+        use_cache=False,
+    )
+    workflow.llm_calls = 0
+    astream_llm = workflow.astream_llm
+
+    async def counting_astream_llm(messages):
+        workflow.llm_calls += 1
+        return await astream_llm(messages)
+
+    workflow.astream_llm = counting_astream_llm
+    return workflow
+
+
+def run(workflow: RAGWorkflow, question: str):
+    async def main():
+        stream, sources = await workflow.run(question=question)
+        return "".join([chunk.delta async for chunk in stream]), sources
+
+    return asyncio.run(main())
+
+
+def test_near_verbatim_question_gets_stored_answer_without_llm(workflow):
+    before = workflow.branch_counters.stats().get("direct_answer", 0)
+
+    answer, sources = run(workflow, "can people with diabetes eat fruit")
+
+    assert answer == FRUIT["answer"]
+    assert [source.metadata["answer"] for source in sources] == [FRUIT["answer"]]
+    assert sources[0].score >= workflow.direct_answer_threshold
+    assert workflow.llm_calls == 0
+    assert workflow.branch_counters.stats()["direct_answer"] == before + 1
+
+
+def test_question_below_threshold_is_synthesized(workflow):
+    # Relevant enough for the similarity cutoff, not for a direct answer
+    question = "Can people with diabetes eat fresh fruit?"
+    results = workflow.resources.get_grouped_retriever(workflow.similarity_top_k).retrieve(question)
+    assert 0.85 <= results[0].score < workflow.direct_answer_threshold
+
+    answer, sources = run(workflow, question)
+
+    assert answer != FRUIT["answer"]
+    assert sources
+    assert workflow.llm_calls == 1
+
+
+def test_disabled_threshold_always_synthesizes(workflow):
+    workflow.direct_answer_threshold = None
+
+    answer, _ = run(workflow, FRUIT["questions"][0])
+
+    assert answer != FRUIT["answer"]
+    assert workflow.llm_calls == 1
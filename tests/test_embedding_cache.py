@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ragbot.embeddings.embedding_cache import (
+    EVICT_TO_FRACTION,
+    TOUCH_FLUSH_SIZE,
+    CachedEmbedding,
+    EmbeddingStore,
+)
+
+from tests.conftest import HashEmbedding, hash_embedding
+
+
+def key(i: int) -> bytes:
+    return i.to_bytes(8, "big")
+
+
+def traced(store: EmbeddingStore) -> list:
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_put_and_get_round_trip(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    store.put_many({key(1): [0.5, 0.25], key(2): [1.0, 0.0]})
+
+    assert store.get_many([key(1), key(3)]) == {key(1): [0.5, 0.25]}
+    assert len(store) == 2
+
+
+def test_puts_under_the_limit_do_not_count_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"), max_entries=100)
+    statements = traced(store)
+
+    for i in range(50):
+        store.put_many({key(i): [float(i)]})
+
+    assert not [s for s in statements if "COUNT" in s]
+
+
+def test_hits_are_written_in_batches(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    store.put_many({key(i): [float(i)] for i in range(TOUCH_FLUSH_SIZE)})
+    statements = traced(store)
+
+    for i in range(TOUCH_FLUSH_SIZE - 1):
+        store.get_many([key(i)])
+    assert not [s for s in statements if s.startswith("UPDATE")]
+
+    store.get_many([key(TOUCH_FLUSH_SIZE - 1)])
+    assert len([s for s in statements if s.startswith("UPDATE")]) == TOUCH_FLUSH_SIZE
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"), max_entries=10)
+    for i in range(10):
+        store.put_many({key(i): [float(i)]})
+    # Used again, so kept; the hit is written with the next put
+    store.get_many([key(0)])
+
+    store.put_many({key(10): [10.0]})
+
+    assert len(store) == int(10 * EVICT_TO_FRACTION)
+    remaining = store.get_many([key(i) for i in range(11)])
+    assert key(0) in remaining and key(10) in remaining
+
+
+def test_eviction_counts_rows_of_an_existing_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingStore(path).put_many({key(i): [float(i)] for i in range(10)})
+
+    store = EmbeddingStore(path, max_entries=10)
+    store.put_many({key(10): [10.0]})
+
+    assert len(store) == int(10 * EVICT_TO_FRACTION)
+
+
+def test_cached_embedding_serves_repeats_from_store(tmp_path):
+    cached = CachedEmbedding(HashEmbedding(), EmbeddingStore(str(tmp_path / "cache.sqlite")), model_id="hash")
+
+    first = cached.get_query_embedding("What helps  with diabetes?")
+    again = cached.get_query_embedding("What helps with diabetes?")
+
+    assert first == again
+    assert cached.stats()["hits"] == 1 and cached.stats()["misses"] == 1
+    assert first == np.asarray(hash_embedding("What helps with diabetes?"), dtype=np.float32).tolist()
+
+
+def test_async_lookups_run_off_the_event_loop(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    cached = CachedEmbedding(HashEmbedding(), store, model_id="hash")
+    threads = []
+    get_many, put_many = store.get_many, store.put_many
+
+    def record_thread(method):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return method(*args)
+        return wrapper
+
+    store.get_many, store.put_many = record_thread(get_many), record_thread(put_many)
+
+    async def main():
+        first = await cached.aget_query_embedding("What helps with diabetes?")
+        again = await cached.aget_query_embedding("What helps with diabetes?")
+        return first, again, threading.get_ident()
+
+    first, again, loop_thread = asyncio.run(main())
+
+    assert first == again
+    # Lookup and write of the miss, then lookup of the hit
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+def test_hit_and_miss_counts_are_exact_across_threads(tmp_path):
+    cached = CachedEmbedding(HashEmbedding(), EmbeddingStore(str(tmp_path / "cache.sqlite")), model_id="hash")
+    queries = [f"question {i % 10}" for i in range(400)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(cached.get_query_embedding, queries))
+
+    stats = cached.stats()
+    assert stats["hits"] + stats["misses"] == len(queries)
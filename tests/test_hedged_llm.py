@@ -0,0 +1,207 @@
+import asyncio
+
+import httpx
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from ragbot.llms import HedgedLLM, LLMUnavailableError
+from ragbot.llms.fake_llm_server import FakeLLMServer, FakeModel
+from ragbot.llms.hedged_llm import CircuitBreaker
+from ragbot.llms.openrouter_llm import build_openrouter_llm
+
+PRIMARY = "fake/primary"
+FALLBACK = "fake/fallback"
+FAST = FakeModel(ttft_seconds=0.01, token_delay_seconds=0.0, num_tokens=4)
+SLOW = FakeModel(ttft_seconds=5.0, token_delay_seconds=0.0, num_tokens=4)
+FAILING = FakeModel(token_delay_seconds=0.0, num_tokens=4, error_rate=1.0)
+MESSAGES = [ChatMessage(role=MessageRole.USER, content="what helps with diabetes")]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def openrouter_env(monkeypatch):
+    # The fake server takes any key
+    monkeypatch.setenv("OPENROUTER_API_KEY", "fake")
+
+
+def run_against(models, calls, **hedge_kwargs):
+    """Start a fake server with ``models``, then await ``calls(llm, server)`` with a HedgedLLM over them."""
+
+    async def main():
+        async with FakeLLMServer(models=models) as server, httpx.AsyncClient() as http_client:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                monkeypatch.setenv("OPENROUTER_API_BASE", server.base_url)
+                llms = [build_openrouter_llm(http_client, model=model, max_retries=0) for model in models]
+            llm = HedgedLLM(llms, **hedge_kwargs)
+            return await calls(llm, server)
+
+    return asyncio.run(main())
+
+
+async def answer(llm: HedgedLLM) -> str:
+    return "".join([chunk.delta async for chunk in await llm.astream_chat(MESSAGES)])
+
+
+async def wait_for_outcome(server: FakeLLMServer, outcome: str, count: int = 1) -> None:
+    for _ in range(100):
+        if server.outcomes[outcome] >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_hedge_to_fallback_wins_and_cancels_slow_request():
+    async def calls(llm, server):
+        text = await asyncio.wait_for(answer(llm), timeout=2.0)
+        await wait_for_outcome(server, "disconnected")
+        return text, server
+
+    text, server = run_against({PRIMARY: SLOW, FALLBACK: FAST}, calls, hedge_after=0.1)
+
+    assert text.split() == ["what", "helps", "with", "diabetes"]
+    assert server.requests == {PRIMARY: 1, FALLBACK: 1}
+    # The losing request's connection is closed before its first token
+    assert server.outcomes["disconnected"] == 1
+
+
+def test_hedge_stats():
+    async def calls(llm, server):
+        await answer(llm)
+        return llm.stats()
+
+    stats = run_against({PRIMARY: SLOW, FALLBACK: FAST}, calls, hedge_after=0.1)
+
+    assert stats["events"]["hedge"] == 1
+    assert stats["events"]["won_by_hedge"] == 1
+    assert stats["events"]["cancelled"] == 1
+    assert stats["models"][PRIMARY]["failures"] == 0
+
+
+def test_failed_request_is_retried_on_fallback():
+    async def calls(llm, server):
+        return await answer(llm), llm.stats(), server
+
+    text, stats, server = run_against({PRIMARY: FAILING, FALLBACK: FAST}, calls, hedge_after=10.0)
+
+    assert text
+    assert server.requests == {PRIMARY: 1, FALLBACK: 1}
+    assert stats["events"]["failed"] == 1
+    assert stats["events"]["won_by_retry"] == 1
+    assert stats["models"][PRIMARY]["failures"] == 1
+
+
+def test_first_token_timeout():
+    async def calls(llm, server):
+        with pytest.raises(TimeoutError):
+            await answer(llm)
+        await wait_for_outcome(server, "disconnected")
+        return llm.stats(), server
+
+    stats, server = run_against({PRIMARY: SLOW}, calls, hedge_after=10.0, first_token_timeout=0.2, max_attempts=1)
+
+    assert stats["events"]["timeout"] == 1
+    assert server.outcomes["disconnected"] == 1
+
+
+def test_max_attempts_bounds_requests():
+    async def calls(llm, server):
+        with pytest.raises(Exception):
+            await answer(llm)
+        return server
+
+    server = run_against(
+        {PRIMARY: FAILING, FALLBACK: FAILING},
+        calls,
+        hedge_after=10.0,
+        max_attempts=3,
+        failure_threshold=10,
+    )
+
+    assert sum(server.requests.values()) == 3
+
+
+def test_open_circuit_skips_model_until_reset():
+    clock = FakeClock()
+
+    async def calls(llm, server):
+        await answer(llm)
+        # The primary's circuit is open: straight to the fallback
+        await answer(llm)
+        assert server.requests == {PRIMARY: 1, FALLBACK: 2}
+        assert llm.stats()["models"][PRIMARY]["state"] == CircuitBreaker.OPEN
+
+        # After the reset time one trial request goes to the primary again
+        clock.now = 31.0
+        await answer(llm)
+        assert server.requests == {PRIMARY: 2, FALLBACK: 3}
+        return llm.stats()
+
+    stats = run_against(
+        {PRIMARY: FAILING, FALLBACK: FAST},
+        calls,
+        hedge_after=10.0,
+        failure_threshold=1,
+        reset_seconds=30.0,
+        clock=clock,
+    )
+
+    assert stats["models"][PRIMARY]["opens"] == 2
+
+
+def test_all_circuits_open_raises_unavailable():
+    async def calls(llm, server):
+        with pytest.raises(Exception):
+            await answer(llm)
+        with pytest.raises(LLMUnavailableError):
+            await answer(llm)
+        return server
+
+    server = run_against({PRIMARY: FAILING}, calls, hedge_after=10.0, max_attempts=1, failure_threshold=1)
+
+    assert server.requests == {PRIMARY: 1}
+
+
+def test_circuit_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10.0, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # One trial at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breaker_reopens_after_failed_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10.0, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.opens == 2
+
+    # A cancelled trial lets the next request try
+    clock.now = 20.0
+    assert breaker.allow()
+    breaker.record_cancel()
+    assert breaker.allow()
@@ -0,0 +1,96 @@
+import asyncio
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from ragbot.resources import SharedResources
+from ragbot.retrievers import BM25Retriever
+from ragbot.retrievers.hybrid_retriever import is_keyword_query, reciprocal_rank_fusion
+from ragbot.storage.lexical_index import LexicalIndex
+
+from tests.conftest import hash_embedding
+
+TEXTS = {
+    "fruit": "Can people with diabetes eat fruit?",
+    "fruit-juice": "Is fruit juice bad for diabetes?",
+    "snacks": "What are good snacks for people with diabetes?",
+}
+
+
+def bm25_retriever(similarity_top_k: int = 5) -> BM25Retriever:
+    nodes = [TextNode(id_=node_id, text=text) for node_id, text in TEXTS.items()]
+    docstore = SimpleDocumentStore()
+    docstore.add_documents(nodes)
+    return BM25Retriever(LexicalIndex.from_nodes(nodes), docstore, similarity_top_k=similarity_top_k)
+
+
+def scored(*node_ids_and_scores) -> list:
+    return [NodeWithScore(node=TextNode(id_=node_id, text=node_id), score=score) for node_id, score in node_ids_and_scores]
+
+
+def cosine(resources: SharedResources, node: NodeWithScore, query: str) -> float:
+    vector = np.asarray(resources.storage_context.vector_store.get(node.node.node_id))
+    return float(vector @ np.asarray(hash_embedding(query)))
+
+
+def test_bm25_ranks_rare_terms_higher_and_scores_coverage():
+    # "juice" is in one document, "diabetes" in all of them
+    results = bm25_retriever().retrieve("fruit juice diabetes")
+
+    assert [node.node.node_id for node in results] == ["fruit-juice", "fruit", "snacks"]
+    assert results[0].score == pytest.approx(1.0)
+    assert 0.0 < results[2].score < results[1].score < 1.0
+
+
+def test_bm25_ignores_stopwords_and_unknown_terms():
+    assert bm25_retriever().retrieve("what is the") == []
+    assert bm25_retriever().retrieve("insulin") == []
+
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    dense = scored(("a", 0.9), ("b", 0.8), ("c", 0.7))
+    lexical = scored(("c", 1.0), ("b", 1.0), ("d", 1.0))
+
+    fused = reciprocal_rank_fusion([dense, lexical])
+
+    # Nodes in both lists beat a node ranked first in one; ranks (3, 1) beat (2, 2)
+    assert [node.node.node_id for node in fused] == ["c", "b", "a", "d"]
+    # Scores come from the first list that ranked the node
+    assert [node.score for node in fused] == [0.7, 0.8, 0.9, 1.0]
+
+
+def test_keyword_query_detection():
+    assert is_keyword_query("fruit")
+    assert is_keyword_query("metformin dose")
+    assert not is_keyword_query("can people with diabetes eat fruit")
+    assert not is_keyword_query("what is the")
+
+
+def test_lexical_only_shortcut_keeps_dense_scores(faq_index_dir):
+    resources = SharedResources(persist_dir=faq_index_dir)
+    retriever = resources.get_hybrid_retriever(similarity_top_k=5)
+
+    results = retriever.retrieve("fruit")
+
+    assert retriever.stats() == {"lexical_only": 1, "hybrid": 0}
+    assert results and all("fruit" in node.node.get_content().lower() for node in results)
+    # Every FAQ mentioning the word covers the query fully, but its score is
+    # the cosine, which stays below the 0.85 relevance cutoff
+    for node in results:
+        assert node.score == pytest.approx(cosine(resources, node, "fruit"), abs=1e-5)
+        assert node.score < 0.85
+
+
+def test_hybrid_results_are_scored_by_cosine(faq_index_dir):
+    resources = SharedResources(persist_dir=faq_index_dir)
+    retriever = resources.get_hybrid_retriever(similarity_top_k=2)
+    query = "which snacks are healthy for people with diabetes"
+
+    results = asyncio.run(retriever.aretrieve(QueryBundle(query)))
+
+    assert retriever.stats() == {"lexical_only": 0, "hybrid": 1}
+    assert len(results) == 2
+    for node in results:
+        assert node.score == pytest.approx(cosine(resources, node, query), abs=1e-5)
@@ -0,0 +1,80 @@
+import pytest
+
+from ragbot.resources import DEFAULT_CORPUS, IndexRegistry, SharedResources, UnknownCorpusError
+from ragbot.resources.index_registry import corpus_dir, estimate_index_bytes
+from ragbot.workflows.rag_benchmark import build_eval_index
+
+from tests.conftest import FAQ_ITEMS
+
+
+@pytest.fixture
+def corpora_dir(settings, tmp_path):
+    corpora = tmp_path / "corpora"
+    for name in ("de", "fr", "es"):
+        (corpora / name).mkdir(parents=True)
+        build_eval_index(FAQ_ITEMS, corpora / name)
+    return corpora
+
+
+def build_registry(corpora_dir, indexes_loaded: int) -> IndexRegistry:
+    size = estimate_index_bytes(corpora_dir / "de")
+    return IndexRegistry(
+        default=SharedResources(persist_dir=corpora_dir / "de"),
+        corpora_dir=corpora_dir,
+        max_loaded_bytes=size * indexes_loaded,
+    )
+
+
+@pytest.mark.parametrize("name", ["../secrets", "..", ".hidden", "a/b", "de_versions", "", "de/../fr"])
+def test_corpus_names_cannot_escape_the_corpora_directory(tmp_path, name):
+    with pytest.raises(UnknownCorpusError):
+        corpus_dir(name, tmp_path)
+
+
+def test_unknown_corpus_raises(corpora_dir):
+    registry = build_registry(corpora_dir, indexes_loaded=2)
+
+    with pytest.raises(UnknownCorpusError):
+        registry.get("it")
+    with pytest.raises(UnknownCorpusError):
+        registry.get("../corpora/de")
+
+
+def test_lists_default_and_indexed_corpora(corpora_dir):
+    registry = build_registry(corpora_dir, indexes_loaded=2)
+
+    assert registry.corpora() == [DEFAULT_CORPUS, "de", "es", "fr"]
+
+
+def test_loaded_corpus_is_reused(corpora_dir):
+    registry = build_registry(corpora_dir, indexes_loaded=2)
+
+    assert registry.get("de") is registry.get("de")
+    assert registry.get() is registry.default
+    assert registry.stats()["loads"] == 1
+    assert registry.stats()["hits"] == 1
+
+
+def test_least_recently_used_corpus_is_unloaded(corpora_dir):
+    registry = build_registry(corpora_dir, indexes_loaded=2)
+    de = registry.get("de")
+    registry.get("fr")
+    # Used again, so fr is now the least recently used
+    registry.get("de")
+
+    registry.get("es")
+
+    assert registry.loaded() == [DEFAULT_CORPUS, "de", "es"]
+    assert registry.stats()["evictions"] == 1
+    assert registry.get("de") is de
+    assert registry.get("fr") is not None
+    assert registry.stats()["loads"] == 4
+
+
+def test_registered_corpus_is_served_from_its_directory(corpora_dir):
+    registry = build_registry(corpora_dir, indexes_loaded=2)
+    registry.register("custom", corpora_dir / "fr")
+
+    assert registry.get("custom").persist_dir == corpora_dir / "fr"
+    with pytest.raises(ValueError):
+        registry.register(DEFAULT_CORPUS, corpora_dir / "fr")
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from ingest import build_index, iter_documents, update_index
+from ragbot.readers.data_faq_reader import ANSWER_KEY, question_doc_id
+from ragbot.resources import SharedResources
+from ragbot.storage.versioning import create_staging_dir, publish_storage
+
+from tests.conftest import FAQ_ITEMS
+
+SNACKS, MEALS, FRUIT = FAQ_ITEMS
+NEW_SNACKS_ANSWER = "Nuts, seeds and plain yogurt."
+
+
+def write_faq(data_dir, items) -> None:
+    data_dir.mkdir(exist_ok=True)
+    (data_dir / "faq.json").write_text(json.dumps(items))
+
+
+def doc_ids(items) -> set:
+    return {question_doc_id(question, item["answer"]) for item in items for question in item["questions"]}
+
+
+def ingest(data_dir, persist_dir, full: bool = False) -> bool:
+    """One ingest run the way ``ingest.main`` does it; returns whether a version was published."""
+    staging_dir = create_staging_dir(persist_dir)
+    if full:
+        build_index(iter_documents(data_dir), persist_dir=staging_dir)
+    elif not update_index(iter_documents(data_dir), source_dir=persist_dir, persist_dir=staging_dir):
+        return False
+    publish_storage(staging_dir, persist_dir)
+    return True
+
+
+def top_answer(persist_dir, question: str) -> str:
+    retriever = SharedResources(persist_dir=persist_dir).get_grouped_retriever(similarity_top_k=1)
+    return retriever.retrieve(question)[0].metadata[ANSWER_KEY]
+
+
+@pytest.fixture
+def dirs(settings, tmp_path):
+    return tmp_path / "data", tmp_path / "storage"
+
+
+def test_update_adds_changes_and_removes_by_content_hash(dirs):
+    data_dir, persist_dir = dirs
+    write_faq(data_dir, [SNACKS, MEALS])
+    ingest(data_dir, persist_dir, full=True)
+
+    changed = {**SNACKS, "answer": NEW_SNACKS_ANSWER}
+    write_faq(data_dir, [changed, FRUIT])
+    assert ingest(data_dir, persist_dir)
+
+    resources = SharedResources(persist_dir=persist_dir)
+    docstore = resources.storage_context.docstore
+    assert set(docstore.get_all_ref_doc_info()) == doc_ids([changed, FRUIT])
+    node_ids = set(docstore.docs)
+    assert set(resources.storage_context.vector_store.node_ids) == node_ids
+    assert resources.lexical_index.num_docs == len(node_ids)
+    # The old snacks answer and the meals answer were released
+    assert len(resources.answer_store) == 2
+
+    assert top_answer(persist_dir, SNACKS["questions"][0]) == NEW_SNACKS_ANSWER
+    assert top_answer(persist_dir, FRUIT["questions"][0]) == FRUIT["answer"]
+
+
+def test_unchanged_data_publishes_nothing(dirs):
+    data_dir, persist_dir = dirs
+    write_faq(data_dir, [SNACKS, MEALS])
+    ingest(data_dir, persist_dir, full=True)
+    version = persist_dir.resolve()
+
+    assert not ingest(data_dir, persist_dir)
+    assert persist_dir.resolve() == version
+
+
+def test_update_matches_full_rebuild(dirs, tmp_path):
+    data_dir, persist_dir = dirs
+    write_faq(data_dir, [SNACKS])
+    ingest(data_dir, persist_dir, full=True)
+    write_faq(data_dir, [SNACKS, MEALS, FRUIT])
+    ingest(data_dir, persist_dir)
+
+    rebuilt_dir = tmp_path / "rebuilt"
+    ingest(data_dir, rebuilt_dir, full=True)
+
+    for question in (SNACKS["questions"][1], MEALS["questions"][0], FRUIT["questions"][1]):
+        assert top_answer(persist_dir, question) == top_answer(rebuilt_dir, question)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from ragbot.storage import IVFVectorStore, NumpyVectorStore
+from ragbot.storage.ivf_vector_store import ivf_path_for
+
+PERSIST_FNAME = "default__vector_store.json"
+DIM = 32
+
+
+def clustered(num_rows: int, num_clusters: int = 20, seed: int = 0) -> np.ndarray:
+    """L2-normalized rows scattered around random cluster centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, DIM))
+    rows = centers[rng.integers(num_clusters, size=num_rows)] + 0.3 * rng.normal(size=(num_rows, DIM))
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def fill(store, embeddings: np.ndarray, prefix: str = "n") -> None:
+    ids = [f"{prefix}{i}" for i in range(embeddings.shape[0])]
+    store.add_embeddings(ids, ["doc"] * len(ids), embeddings)
+
+
+def top_ids(store, embedding, k: int = 10, **kwargs):
+    return store.query(VectorStoreQuery(query_embedding=embedding.tolist(), similarity_top_k=k), **kwargs).ids
+
+
+@pytest.fixture
+def embeddings() -> np.ndarray:
+    return clustered(2000)
+
+
+def test_recall_against_exact_search(embeddings):
+    exact, ivf = NumpyVectorStore(), IVFVectorStore()
+    fill(exact, embeddings)
+    fill(ivf, embeddings)
+    ivf.train(nlist=40)
+    queries = clustered(50, seed=1)
+
+    found = sum(
+        len(set(top_ids(ivf, query, nprobe=8)) & set(top_ids(exact, query)))
+        for query in queries
+    )
+
+    assert found / (10 * len(queries)) >= 0.9
+    # Probing every list is exact search
+    assert all(top_ids(ivf, query, nprobe=40) == top_ids(exact, query) for query in queries[:5])
+
+
+def test_untrained_store_searches_exactly(embeddings):
+    exact, ivf = NumpyVectorStore(), IVFVectorStore()
+    fill(exact, embeddings[:100])
+    fill(ivf, embeddings[:100])
+
+    assert not ivf.is_trained
+    assert top_ids(ivf, embeddings[0]) == top_ids(exact, embeddings[0])
+
+
+def test_persisted_index_stays_in_sync_after_add_and_delete(embeddings, tmp_path):
+    path = tmp_path / PERSIST_FNAME
+    store = IVFVectorStore(nprobe=1)
+    fill(store, embeddings[:1000])
+    # Persisting an untrained store trains it
+    store.persist(str(path))
+    assert ivf_path_for(path).exists()
+
+    loaded = IVFVectorStore.from_persist_path(path)
+    loaded.nprobe = 1
+    nlist = loaded.nlist
+    fill(loaded, embeddings[1000:1100], prefix="new")
+    loaded.delete_nodes([f"n{i}" for i in range(100)])
+    loaded.persist(str(path))
+
+    reloaded = IVFVectorStore.from_persist_path(path)
+    reloaded.nprobe = 1
+    with np.load(ivf_path_for(path)) as data:
+        assert data["assignments"].shape[0] == len(reloaded.node_ids) == 1000
+    # Added rows went into the existing lists, without retraining
+    assert reloaded.nlist == nlist
+    # A row sits in the list of its closest centroid, so one probe finds it
+    assert top_ids(reloaded, embeddings[1050], k=1) == ["new50"]
+    assert "n0" not in top_ids(reloaded, embeddings[0], k=5)
+
+
+def test_index_for_other_rows_is_dropped_on_load(embeddings, tmp_path):
+    path = tmp_path / PERSIST_FNAME
+    store = IVFVectorStore()
+    fill(store, embeddings[:500])
+    store.persist(str(path))
+
+    # Rows changed by a writer that does not update the IVF sidecar
+    plain = NumpyVectorStore.from_persist_path(path)
+    fill(plain, embeddings[500:510], prefix="new")
+    plain.persist(str(path))
+
+    loaded = IVFVectorStore.from_persist_path(path)
+    assert not loaded.is_trained
+    assert top_ids(loaded, embeddings[505], k=1) == ["new5"]
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from ragbot.batching import BatchQueueFullError, MicroBatcher
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [2 * item for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_batches_are_capped_at_max_size():
+    sizes = []
+
+    def identity(items):
+        sizes.append(len(items))
+        return list(items)
+
+    batcher = MicroBatcher(identity, max_batch_size=3, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+
+    assert asyncio.run(main()) == list(range(7))
+    assert max(sizes) == 3
+    assert sum(sizes) == 7
+
+
+def test_batch_error_fails_every_request_of_the_batch():
+    def fail(items):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(fail, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["errors"] == 1
+
+
+def test_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher(lambda items: [], max_wait_ms=0)
+
+    with pytest.raises(RuntimeError, match="0 results for 1 items"):
+        asyncio.run(batcher.submit(1))
+
+
+def test_full_queue_rejects_new_requests():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(5)
+        return list(items)
+
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+
+    async def main():
+        running = asyncio.ensure_future(batcher.submit(0))
+        # Let the worker take the first request into its batch
+        await asyncio.sleep(0.05)
+        queued = [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2)]
+        await asyncio.sleep(0)
+        with pytest.raises(BatchQueueFullError):
+            await batcher.submit(3)
+        release.set()
+        return await asyncio.gather(running, *queued)
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert batcher.stats()["rejected"] == 1
+
+
+def test_batcher_works_across_event_loops():
+    batcher = MicroBatcher(lambda items: list(items), max_wait_ms=0)
+
+    assert asyncio.run(batcher.submit(1)) == 1
+    # A new loop starts a new queue and worker
+    assert asyncio.run(batcher.submit(2)) == 2
+
+
+def test_aclose_cancels_running_and_queued_requests():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(5)
+        return list(items)
+
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=0)
+
+    async def main():
+        running = asyncio.ensure_future(batcher.submit(0))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0)
+        await batcher.aclose()
+        release.set()
+        return running, queued
+
+    running, queued = asyncio.run(main())
+    assert running.cancelled()
+    assert queued.cancelled()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from ragbot.storage import NumpyVectorStore
+from ragbot.storage.numpy_vector_store import embeddings_path_for, id_map_path_for
+from ragbot.storage.storage_context import load_or_create_vector_store
+
+PERSIST_FNAME = "default__vector_store.json"
+
+
+def node(node_id: str, embedding, ref_doc_id: str = "doc") -> TextNode:
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=list(embedding),
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)},
+    )
+
+
+def top(store: NumpyVectorStore, embedding, k: int = 3, node_ids=None):
+    result = store.query(VectorStoreQuery(query_embedding=list(embedding), similarity_top_k=k, node_ids=node_ids))
+    return result.ids, result.similarities
+
+
+@pytest.fixture
+def store() -> NumpyVectorStore:
+    store = NumpyVectorStore()
+    store.add([
+        node("x", [2.0, 0.0, 0.0], "doc-a"),
+        node("y", [0.0, 3.0, 0.0], "doc-a"),
+        node("xy", [1.0, 1.0, 0.0], "doc-b"),
+    ])
+    return store
+
+
+def test_query_ranks_by_cosine(store):
+    ids, similarities = top(store, [1.0, 0.1, 0.0])
+
+    assert ids == ["x", "xy", "y"]
+    assert similarities[0] == pytest.approx(1.0 / np.sqrt(1.01), abs=1e-6)
+    # Stored rows are normalized on insert
+    assert store.get("y") == [0.0, 1.0, 0.0]
+
+
+def test_query_restricted_to_node_ids(store):
+    ids, _ = top(store, [1.0, 0.0, 0.0], node_ids=["y", "xy", "unknown"])
+
+    assert ids == ["xy", "y"]
+
+
+def test_query_batch_matches_single_queries(store):
+    queries = [
+        VectorStoreQuery(query_embedding=embedding, similarity_top_k=2)
+        for embedding in ([1.0, 0.0, 0.0], [0.0, 1.0, 0.1])
+    ]
+
+    batched = store.query_batch(queries)
+
+    assert [result.ids for result in batched] == [store.query(query).ids for query in queries]
+
+
+def test_re_adding_a_node_replaces_its_embedding(store):
+    store.add([node("x", [0.0, 0.0, 1.0], "doc-a")])
+
+    assert store.get("x") == [0.0, 0.0, 1.0]
+    assert sorted(store.node_ids) == ["x", "xy", "y"]
+
+
+def test_delete_by_ref_doc_and_by_node_id(store):
+    store.delete("doc-a")
+    assert store.node_ids == ["xy"]
+
+    store.delete_nodes(["xy"])
+    assert top(store, [1.0, 0.0, 0.0]) == ([], [])
+
+
+def test_persist_and_reload_memory_mapped(store, tmp_path):
+    path = tmp_path / PERSIST_FNAME
+    store.persist(str(path))
+
+    assert embeddings_path_for(path).exists() and id_map_path_for(path).exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    loaded = NumpyVectorStore.from_persist_path(path)
+    assert isinstance(loaded._embeddings, np.memmap)
+    assert top(loaded, [1.0, 0.1, 0.0]) == top(store, [1.0, 0.1, 0.0])
+
+    # A loaded store still takes changes, and the ref doc ids survived the round trip
+    loaded.delete("doc-b")
+    loaded.add([node("z", [0.0, 0.0, 1.0])])
+    assert sorted(loaded.node_ids) == ["x", "y", "z"]
+
+
+def test_float16_store_round_trip(tmp_path):
+    store = NumpyVectorStore(dtype="float16")
+    store.add([node("x", [1.0, 0.0]), node("y", [0.0, 1.0])])
+    path = tmp_path / PERSIST_FNAME
+    store.persist(str(path))
+
+    loaded = NumpyVectorStore.from_persist_path(path)
+
+    assert loaded.dtype == "float16"
+    assert np.load(embeddings_path_for(path)).dtype == np.float16
+    assert top(loaded, [0.9, 0.1], k=1)[0] == ["x"]
+
+
+def test_legacy_simple_vector_store_is_converted(tmp_path):
+    legacy = SimpleVectorStore()
+    legacy.add([node("x", [2.0, 0.0], "doc-a"), node("y", [0.0, 1.0], "doc-b")])
+    legacy.persist(str(tmp_path / PERSIST_FNAME))
+
+    store = load_or_create_vector_store(tmp_path)
+
+    assert isinstance(store, NumpyVectorStore)
+    assert top(store, [1.0, 0.0], k=1) == (["x"], [pytest.approx(1.0)])
+    store.delete("doc-a")
+    assert store.node_ids == ["y"]
+
+    # The next persist writes the .npy layout, which is then loaded instead
+    store.persist(str(tmp_path / PERSIST_FNAME))
+    assert load_or_create_vector_store(tmp_path).node_ids == ["y"]
@@ -0,0 +1,70 @@
+import asyncio
+
+from ragbot.cache.query_cache import CachedResponse, QueryCache, replay_stream
+
+
+def response(text: str) -> CachedResponse:
+    return CachedResponse(deltas=tuple(text.split(" ")), sources=[])
+
+
+async def consume(stream) -> str:
+    return "".join([chunk.delta async for chunk in stream])
+
+
+def test_exact_hit_on_normalized_question():
+    cache = QueryCache()
+    cache.put("What is  diabetes?", response("a b"))
+
+    assert cache.get("what is diabetes?") is not None
+    assert cache.get("Something else?") is None
+
+
+def test_semantic_hit_within_distance():
+    cache = QueryCache(semantic_max_distance=0.05)
+    cache.put("What is diabetes?", response("a"), query_embedding=[1.0, 0.0])
+
+    assert cache.get_semantic([0.99, 0.01]) is not None
+    assert cache.get_semantic([0.0, 1.0]) is None
+    assert cache.stats()["semantic_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_drops_embedding_too():
+    cache = QueryCache(max_size=2)
+    cache.put("q1", response("a"), query_embedding=[1.0, 0.0])
+    cache.put("q2", response("b"), query_embedding=[0.0, 1.0])
+    # Used again, so q2 is the least recently used
+    cache.get("q1")
+    cache.put("q3", response("c"))
+
+    assert cache.get("q2") is None
+    assert cache.get("q1") is not None
+    assert cache.get_semantic([0.0, 1.0]) is None
+
+
+def test_expired_entries_are_dropped():
+    cache = QueryCache(ttl_seconds=0.0)
+    cache.put("q", response("a"), query_embedding=[1.0])
+
+    assert cache.get("q") is None
+    assert cache.get_semantic([1.0]) is None
+
+
+def test_record_caches_fully_consumed_stream():
+    cache = QueryCache()
+    stream = cache.record("q", replay_stream(["a", "b"]), sources=[], query_embedding=[1.0])
+
+    assert asyncio.run(consume(stream)) == "ab"
+    cached = cache.get("q")
+    assert cached.text == "ab"
+    assert asyncio.run(consume(cached.replay()[0])) == "ab"
+
+
+def test_answers_started_before_clear_are_not_cached():
+    cache = QueryCache()
+    stream = cache.record("q", replay_stream(["a"]), sources=[])
+    cache.clear()
+
+    asyncio.run(consume(stream))
+
+    assert cache.get("q") is None
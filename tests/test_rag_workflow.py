@@ -0,0 +1,96 @@
+import asyncio
+
+from ragbot.cache.query_cache import CachedResponse
+from ragbot.memory import ConversationMemory
+from ragbot.resources import SharedResources
+from ragbot.retrievers import CANDIDATES_PER_GROUP
+from ragbot.workflows.rag_workflow import RAGWorkflow
+
+CACHED_ANSWER = "cached answer"
+
+
+def build_workflow(persist_dir) -> RAGWorkflow:
+    return RAGWorkflow(
+        timeout=None,
+        verbose=False,
+        resources=SharedResources(persist_dir=persist_dir),
+        direct_answer_threshold=None,
+    )
+
+
+async def ask(workflow: RAGWorkflow, question: str, memory=None) -> str:
+    stream, _ = await workflow.run(question=question, memory=memory)
+    return "".join([chunk.delta async for chunk in stream])
+
+
+def cache_everything(workflow: RAGWorkflow) -> None:
+    """Make every query embedding a semantic cache hit of one unrelated answer."""
+    cache = workflow.resources.query_cache
+    cache.semantic_max_distance = 2.0
+    cache.put("Is coffee allowed?", CachedResponse(deltas=(CACHED_ANSWER,), sources=[]), query_embedding=[1.0] * 256)
+
+
+def test_semantic_cache_answers_one_off_question(faq_index_dir):
+    workflow = build_workflow(faq_index_dir)
+    cache_everything(workflow)
+
+    assert asyncio.run(ask(workflow, "Can people with diabetes eat fruit?")) == CACHED_ANSWER
+
+
+def test_semantic_hit_skips_retrieval(faq_index_dir):
+    workflow = build_workflow(faq_index_dir)
+    cache_everything(workflow)
+    hybrid = workflow.resources.get_hybrid_retriever(workflow.similarity_top_k * CANDIDATES_PER_GROUP)
+
+    assert asyncio.run(ask(workflow, "fruit")) == CACHED_ANSWER
+    assert hybrid.stats() == {"lexical_only": 0, "hybrid": 0}
+
+
+def test_each_lookup_missing_both_tiers_counts_one_miss(faq_index_dir):
+    workflow = build_workflow(faq_index_dir)
+    cache = workflow.resources.query_cache
+
+    # A keyword query, answered by the lexical shortcut
+    asyncio.run(ask(workflow, "fruit"))
+    assert cache.stats()["misses"] == 1
+
+    asyncio.run(ask(workflow, "fruit"))
+    asyncio.run(ask(workflow, "How often should a person with diabetes eat?"))
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 0, 2)
+
+
+def test_follow_up_skips_semantic_cache(faq_index_dir):
+    workflow = build_workflow(faq_index_dir)
+    cache_everything(workflow)
+    memory = ConversationMemory(token_limit=None)
+    memory.put("What are good snacks for people with diabetes?", "Almonds.")
+
+    # Retrieves nothing by itself, so it is retried with the earlier question
+    answer = asyncio.run(ask(workflow, "and which ones are low in sugar?", memory))
+
+    assert answer != CACHED_ANSWER
+    assert workflow.resources.query_cache.stats()["semantic_hits"] == 0
+
+
+def test_context_without_room_for_any_faq_falls_back_to_no_results(faq_index_dir):
+    workflow = RAGWorkflow(
+        timeout=None,
+        verbose=False,
+        resources=SharedResources(persist_dir=faq_index_dir),
+        use_cache=False,
+        direct_answer_threshold=None,
+        context_token_budget=0,
+    )
+    before = workflow.branch_counters.stats()
+
+    async def main():
+        stream, sources = await workflow.run(question="Can people with diabetes eat fruit?")
+        return "".join([chunk.delta async for chunk in stream]), sources
+
+    answer, sources = asyncio.run(main())
+
+    after = workflow.branch_counters.stats()
+    assert answer and sources == []
+    assert after.get("no_results", 0) == before.get("no_results", 0) + 1
+    assert after.get("llm", 0) == before.get("llm", 0)
@@ -0,0 +1,60 @@
+from ragbot.storage.storage_context import read_index_version
+from ragbot.storage.versioning import LEGACY_PREFIX, create_staging_dir, publish_storage, versions_dir
+
+
+def stage(persist_dir, content: str):
+    staging_dir = create_staging_dir(persist_dir)
+    (staging_dir / "index.txt").write_text(content)
+    return staging_dir
+
+
+def published(persist_dir) -> list:
+    return sorted(path.name for path in versions_dir(persist_dir).iterdir())
+
+
+def test_publish_swaps_symlink_to_new_version(tmp_path):
+    persist_dir = tmp_path / "storage"
+
+    first = publish_storage(stage(persist_dir, "v1"), persist_dir)
+    assert persist_dir.is_symlink()
+    assert (persist_dir / "index.txt").read_text() == "v1"
+    assert read_index_version(persist_dir) == first
+
+    second = publish_storage(stage(persist_dir, "v2"), persist_dir)
+    assert (persist_dir / "index.txt").read_text() == "v2"
+    assert read_index_version(persist_dir) == second
+    assert persist_dir.resolve() == versions_dir(persist_dir) / second
+    # No staging directory or temporary link is left behind
+    assert published(persist_dir) == sorted([first, second])
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith("storage.")] == []
+
+
+def test_only_the_newest_versions_are_kept(tmp_path):
+    persist_dir = tmp_path / "storage"
+    versions = [publish_storage(stage(persist_dir, f"v{i}"), persist_dir) for i in range(4)]
+
+    assert published(persist_dir) == versions[-2:]
+    assert (persist_dir / "index.txt").read_text() == "v3"
+
+
+def test_staging_dirs_in_progress_are_not_pruned(tmp_path):
+    persist_dir = tmp_path / "storage"
+    in_progress = stage(persist_dir, "building")
+
+    for i in range(3):
+        publish_storage(stage(persist_dir, f"v{i}"), persist_dir)
+
+    assert in_progress.exists()
+
+
+def test_plain_persist_dir_is_migrated(tmp_path):
+    persist_dir = tmp_path / "storage"
+    persist_dir.mkdir()
+    (persist_dir / "index.txt").write_text("old")
+
+    publish_storage(stage(persist_dir, "new"), persist_dir)
+
+    assert persist_dir.is_symlink()
+    assert (persist_dir / "index.txt").read_text() == "new"
+    legacy = [path for path in versions_dir(persist_dir).iterdir() if path.name.startswith(LEGACY_PREFIX)]
+    assert [(path / "index.txt").read_text() for path in legacy] == ["old"]